@@ -1,55 +1,426 @@
-from board import Board, BoardState, BoardResult, BoardSolver, BoardGenerationSettings
-from typing import List
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-import timeit
-import functools
+from board import (
+    Board,
+    BoardPool,
+    BoardResult,
+    BoardSolver,
+    BoardGenerationSettings,
+    DEFAULT_SOLVER_CONFIG,
+    import_backend,
+)
+from results import ResultAggregator, ResultSink, load_reproducers
+
+if TYPE_CHECKING:
+    from move_trace import TraceDumper
+    from profiler import BoardProfiler
+
+import argparse
+import collections
+import time
+import gc
+import itertools
 import sys
 import os
 import random
 
+# Only the modules needed by a run are imported, numpy and the backend of the
+# solver before the first timed board, the corpus, trace, cache, profiler and
+# pool modules when used.
+# Boards are reused between benchmark runs to avoid reallocating the grids
+board_pool = BoardPool()
+
+# Opened on the first run, see toggle_output
+devnull = None
+
+# Boards per task of a worker process in run_benchmark_parallel
+PARALLEL_CHUNK_SIZE = 50
+
+OUTPUT_FORMATS = ["text", "csv", "json"]
+
 
 def main():
-    global devnull
-    devnull = open(os.devnull, "w")
-
-    # For benchmarking and timing specific methods of the solving procedure
-    # benchmark_methods()
-
-    # For debugging a specific solver with fixed seed
-    # debug(BoardSolver.ScipySparseLinalgLsqr)
-    # exit()
-
-    # For benchmarking specific board setups
-    # run_benchmark(
-    #    benchmark_custom(26, 13, 84),
-    #    1000,
-    #    solver=BoardSolver.ScipyLinalgLstsq,
-    #    seeds=None,
-    # )
-
-    # Note: 10k expert boards reserves roughly 1GB of memory
-    # if garbage collect is not enabled
-    run_benchmark(benchmark_expert, 1000, enable_gc=True)
-    print()
-    print()
-    benchmark_all_solvers(repeats=100, shared_seeds=True, random_seed=123)
+    parser = argparse.ArgumentParser(
+        description="Benchmark the solvers on preset, custom or corpus boards"
+    )
+    parser.add_argument(
+        "setups",
+        nargs="*",
+        default=["expert"],
+        help="Presets (easy, medium, expert), WIDTHxHEIGHTxMINES or a corpus file",
+    )
+    parser.add_argument(
+        "--solvers",
+        nargs="+",
+        default=None,
+        choices=[solver.name for solver in BoardSolver] + ["all"],
+        help="ScipyLinalgLstsq by default, with --debug the recorded solver",
+    )
+    parser.add_argument("--repeats", type=int, default=1000)
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=None,
+        help="Boards solved before timing in every process, 0 by default "
+        "and 1 with --profile",
+    )
+    seed_group = parser.add_mutually_exclusive_group()
+    seed_group.add_argument(
+        "--random-seed",
+        type=int,
+        default=None,
+        help="Every run solves the same boards generated from this seed, "
+        "a random seed shared by all runs by default",
+    )
+    seed_group.add_argument(
+        "--seed-file", default=None, help="File with one board seed per line"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Solve the boards of each run in this many processes",
+    )
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="text")
+    parser.add_argument(
+        "--output", default=None, help="File for the csv or json summary"
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="Seconds per run, with --workers 1",
+    )
+    parser.add_argument(
+        "--target-win-rate-ci",
+        type=float,
+        default=None,
+        help="Stop a run once the confidence interval of the win rate is "
+        "narrower than this, with --workers 1",
+    )
+    parser.add_argument(
+        "--target-latency-ci",
+        type=float,
+        default=None,
+        help="Stop a run once the confidence interval of the mean time is "
+        "narrower than this fraction of the mean, with --workers 1",
+    )
+    parser.add_argument(
+        "--min-repeats",
+        type=int,
+        default=100,
+        help="Boards solved before a run can stop at a target",
+    )
+    parser.add_argument(
+        "--cache", default=None, help="Result cache file, with --workers 1"
+    )
+    parser.add_argument(
+        "--trace-dir",
+        default=None,
+        help="Write the move traces of lost and slow boards to this directory, "
+        "see move_trace.py, with --workers 1",
+    )
+    parser.add_argument(
+        "--trace-latency",
+        type=float,
+        default=None,
+        help="Seconds above which a board counts as slow for --trace-dir",
+    )
+    parser.add_argument(
+        "--reproducers",
+        default=None,
+        metavar="PREFIX",
+        help="Write the slowest boards of each run to PREFIX_<setup>_<solver>.json "
+        "for --debug",
+    )
+    parser.add_argument(
+        "--sink",
+        default=None,
+        metavar="PREFIX",
+        help="Write a record of every board of each run to "
+        "PREFIX_<setup>_<solver>.csv",
+    )
+    parser.add_argument(
+        "--opening-book",
+        default=None,
+        help="Opening book file, see opening_book.py. Boards start from the "
+        "best ranked position of the book, if it has one for the board size",
+    )
+    parser.add_argument(
+        "--endgame",
+        action="store_true",
+        help="Solve the end of the game exactly, see endgame.py",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        metavar="PREFIX",
+        help="Profile the boards with cProfile and write PREFIX_<setup>_<solver> "
+        ".pstats, .collapsed (flame graph stacks) and .txt (phases, backends and "
+        "hottest functions)",
+    )
+    parser.add_argument(
+        "--profile-boards",
+        default="0:",
+        metavar="START:STOP[:STEP]",
+        help="Indices of the profiled boards, all by default",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=20,
+        help="Functions in the table of the hottest functions",
+    )
+    parser.add_argument(
+        "--methods",
+        action="store_true",
+        help="Time the hot-path methods instead, see micro_benchmark.py",
+    )
+    parser.add_argument(
+        "--debug",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="REPRODUCERS",
+        help="Solve a fixed board, or the first board of a reproducer file, "
+        "with debug output",
+    )
+    args = parser.parse_args()
+
+    if args.methods:
+        benchmark_methods()
+        return
+
+    if args.debug is not None:
+        # The solver of a reproducer is only overridden when given explicitly
+        solver = None
+        if args.solvers is not None and "all" not in args.solvers:
+            solver = BoardSolver[args.solvers[0]]
+        debug(solver, args.debug or None)
+        return
+
+    # The first solves fill the caches of numpy and scipy, which would
+    # otherwise be in the profile of the first board of every process
+    if args.warmup is None:
+        args.warmup = 1 if args.profile is not None else 0
+
+    if args.workers > 1 and args.time_budget is not None:
+        parser.error("--time-budget requires --workers 1")
+    if args.workers > 1 and args.cache is not None:
+        parser.error("--cache requires --workers 1")
+    if args.workers > 1 and (
+        args.target_win_rate_ci is not None or args.target_latency_ci is not None
+    ):
+        parser.error("--target-win-rate-ci and --target-latency-ci require --workers 1")
+    if args.workers > 1 and args.trace_dir is not None:
+        parser.error("--trace-dir requires --workers 1")
+    if args.trace_latency is not None and args.trace_dir is None:
+        parser.error("--trace-latency requires --trace-dir")
+    # Traced boards have to be solved, and the start position of the book and
+    # the endgame solver are not part of the cache key
+    for option, value in [
+        ("--trace-dir", args.trace_dir),
+        ("--opening-book", args.opening_book),
+        ("--endgame", args.endgame or None),
+    ]:
+        if args.cache is not None and value is not None:
+            parser.error("--cache cannot be combined with " + option)
+
+    if args.solvers is None:
+        args.solvers = [BoardSolver.ScipyLinalgLstsq.name]
+    solvers = (
+        list(BoardSolver)
+        if "all" in args.solvers
+        else [BoardSolver[name] for name in args.solvers]
+    )
+    seeds = None
+    if args.seed_file is not None:
+        with open(args.seed_file) as f:
+            seeds = [int(line) for line in f if line.strip()]
+        args.repeats = min(args.repeats, len(seeds))
+    else:
+        # Runs of different solvers compare the same boards unless a seed file
+        # is given. The drawn seed is printed so that a run can be repeated
+        if args.random_seed is None:
+            args.random_seed = random.randrange(sys.maxsize)
+            if args.format == "text":
+                print("Random seed", args.random_seed)
+        seeds = list(seed_sequence(args.random_seed, args.repeats))
+
+    if args.opening_book is not None:
+        load_opening_book(args.opening_book)
+    if args.endgame:
+        enable_endgame()
+    if args.profile is not None:
+        # Create the directory before the run, not when the profile is written
+        os.makedirs(os.path.dirname(args.profile) or ".", exist_ok=True)
+
+    verbose = args.format == "text"
+    summaries = []
+    for setup_name in args.setups:
+        board_setup = get_board_setup(setup_name)
+        # Corpus boards are solved in record order, seeds do not apply
+        run_seeds = None if hasattr(board_setup, "corpus_size") else seeds
+        for solver in solvers:
+            profiler = None
+            if args.profile is not None:
+                from profiler import BoardProfiler, parse_board_range
+
+                profiler = BoardProfiler(parse_board_range(args.profile_boards))
+
+            # Every run writes its own files, named like the profiles
+            run_name = "{0}_{1}".format(os.path.basename(setup_name), solver.name)
+            sink_path = (
+                args.sink + "_" + run_name + ".csv" if args.sink is not None else None
+            )
+            reproducer_path = (
+                args.reproducers + "_" + run_name + ".json"
+                if args.reproducers is not None
+                else None
+            )
+
+            start_time = time.perf_counter()
+            if args.workers > 1:
+                aggregator = run_benchmark_parallel(
+                    setup_name,
+                    args.repeats,
+                    solver,
+                    run_seeds,
+                    args.workers,
+                    warmup=args.warmup,
+                    opening_book_path=args.opening_book,
+                    endgame=args.endgame,
+                    sink_path=sink_path,
+                    reproducer_path=reproducer_path,
+                    profiler=profiler,
+                    verbose=verbose,
+                )
+            else:
+                aggregator = run_benchmark(
+                    board_setup,
+                    args.repeats,
+                    solver,
+                    iter(run_seeds) if run_seeds is not None else None,
+                    sink_path=sink_path,
+                    warmup=args.warmup,
+                    target_win_rate_ci_width=args.target_win_rate_ci,
+                    target_latency_ci_width=args.target_latency_ci,
+                    time_budget=args.time_budget,
+                    min_repeats=args.min_repeats,
+                    trace_dir=args.trace_dir,
+                    trace_latency=args.trace_latency,
+                    reproducer_path=reproducer_path,
+                    cache_path=args.cache,
+                    profiler=profiler,
+                    verbose=verbose,
+                )
+            summaries.append(
+                summarize(
+                    setup_name, solver, aggregator, time.perf_counter() - start_time
+                )
+            )
+
+            if profiler is not None:
+                paths = profiler.write(
+                    args.profile + "_" + run_name, args.profile_top
+                )
+                if verbose:
+                    profiler.display_report(args.profile_top)
+                    print("Profile written to", ", ".join(paths))
+                    print("-" * 50)
+
+        close_board_setup(board_setup)
+
+    if not verbose:
+        write_summaries(summaries, args.format, args.output)
 
 
-def benchmark_all_solvers(repeats=1000, shared_seeds=False, random_seed=None):
+PRESETS = {
+    "easy": (9, 9, 10),
+    "medium": (16, 16, 40),
+    "expert": (30, 16, 99),
+}
+
+
+def load_opening_book(path) -> None:
+    """
+        Gives the opening book at path to every board of the benchmark
+    """
+    from opening_book import OpeningBook
+
+    board_pool.opening_book = OpeningBook(path)
+
+
+def enable_endgame() -> None:
+    """
+        Gives an exact endgame solver with the default limits to every board of
+        the benchmark
+    """
+    from endgame import EndgameSolver
+
+    board_pool.endgame = EndgameSolver()
+
+
+def get_board_setup(name: str):
     """
-        Runs basic benchmark on all basic board setups and solvers
+        Board setup of a preset name, a WIDTHxHEIGHTxMINES size or a corpus file
+    """
+    if name in PRESETS:
+        return globals()["benchmark_" + name]
+    size = name.split("x")
+    if len(size) == 3 and all(value.isdigit() for value in size):
+        return benchmark_custom(*(int(value) for value in size))
+    if os.path.exists(name):
+        return benchmark_corpus(name)
+    raise ValueError("Unknown board setup: " + name)
+
+
+def benchmark_all_solvers(
+    repeats=1000,
+    shared_seeds=True,
+    random_seed=None,
+    warmup=0,
+    target_win_rate_ci_width=None,
+    target_latency_ci_width=None,
+    time_budget=None,
+    min_repeats=100,
+):
+    """
+        Runs basic benchmark on all basic board setups and solvers.  
+        With shared_seeds every run solves the same boards, generated from
+        random_seed or from a random seed if it is None.  
+        With a target CI width or a time budget, every run stops adaptively
+        and repeats is the maximum number of boards per run
     """
     random.seed(random_seed)
-    seeds = None
-    if shared_seeds:
-        seeds = [random.randrange(sys.maxsize) for i in range(repeats)]
+    if shared_seeds and random_seed is None:
+        random_seed = random.randrange(sys.maxsize)
 
-    board_setups = [benchmark_easy, benchmark_medium, benchmark_expert]
-    board_solvers = [enum for enum in BoardSolver]
+    for setup_name in PRESETS:
+        for solver in BoardSolver:
+            # Every run gets the same sequence of seeds
+            seeds = seed_sequence(random_seed, repeats) if shared_seeds else None
+            run_benchmark(
+                get_board_setup(setup_name),
+                repeats,
+                solver,
+                seeds,
+                warmup=warmup,
+                target_win_rate_ci_width=target_win_rate_ci_width,
+                target_latency_ci_width=target_latency_ci_width,
+                time_budget=time_budget,
+                min_repeats=min_repeats,
+            )
 
-    for setup in board_setups:
-        for solver in board_solvers:
-            run_benchmark(setup, repeats, solver, seeds)
+
+def seed_sequence(random_seed, count):
+    """
+        Generates count board seeds deterministically from random_seed
+    """
+    rng = random.Random(random_seed)
+    for i in range(count):
+        yield rng.randrange(sys.maxsize)
 
 
 def run_benchmark(
@@ -58,117 +429,683 @@ def run_benchmark(
     solver=BoardSolver.ScipyLinalgLstsq,
     seeds=None,
     enable_gc=False,
+    sink_path=None,
+    sink_chunk_size=10000,
+    warmup=0,
+    confidence=0.95,
+    target_win_rate_ci_width=None,
+    target_latency_ci_width=None,
+    time_budget=None,
+    min_repeats=100,
+    trace_dir=None,
+    trace_latency=None,
+    slowest_count=10,
+    reproducer_path=None,
+    cache_path=None,
+    cache_max_entries=1000000,
+    profiler: BoardProfiler = None,
+    verbose=True,
 ):
     """
-        Main benchmark for a board setup with configurable repeats, solver and seeds
+        Main benchmark for a board setup with configurable repeats, solver and seeds.  
+        Results are aggregated online. If sink_path is given, per-board records
+        are written to that file in chunks of sink_chunk_size.  
+        The first warmup boards are solved with random seeds and excluded from the results.
+
+        Adaptive stopping: if target_win_rate_ci_width (absolute) or
+        target_latency_ci_width (relative to the mean latency) is given, the run
+        stops once every given confidence interval is narrower than its target,
+        but not before min_repeats boards. If time_budget (seconds) is given, the
+        run stops when it is exceeded. repeats is then the maximum number of boards.  
+        If trace_dir is given, the moves of every board are recorded and the
+        traces of lost boards and boards slower than trace_latency (seconds)
+        are written to trace_dir. Replay them with move_trace.py.  
+        The slowest_count slowest boards are listed with the results and, if
+        reproducer_path is given, written to it for debug(reproducer_path=...).  
+        If cache_path is given, boards of the given seeds are looked up in the
+        result cache at that path before solving and stored after solving.
+        Cached boards count with their recorded time. Setups without
+        board_parameters (corpus boards), traced runs and runs with an opening book,
+        the endgame solver or a changed solver configuration are not cached,
+        which is reported on stderr.  
+        If profiler is given, it profiles the boards of its board indices.  
+        With verbose=False nothing is printed.  
+        Returns the aggregator with the results
     """
 
-    print("Running", board_setup.__name__)
-    print("Repeats", repeats)
-    print("Solver", solver)
-    print("-" * 25)
+    if verbose:
+        print("Running", board_setup.__name__)
+        print("Repeats", repeats)
+        print("Solver", solver)
+        print("-" * 25)
+
+    warmup_aggregator = ResultAggregator()
 
-    board_results = []
+    sink = ResultSink(sink_path, sink_chunk_size) if sink_path is not None else None
+    aggregator = ResultAggregator(sink, slowest_count)
 
-    # TODO: functools causes some delays
+    tracer = None
+    if trace_dir is not None:
+        from move_trace import TraceDumper
+
+        tracer = TraceDumper(trace_dir, trace_latency)
+
+    board_parameters = getattr(board_setup, "board_parameters", None)
+    cache = None
+    if cache_path is not None:
+        # Traced boards have to be solved to record their moves. Start
+        # positions from an opening book, the endgame solver and the solver
+        # configuration are not part of the cache key
+        disabled_by = None
+        if board_parameters is None:
+            disabled_by = "a board setup without board_parameters"
+        elif tracer is not None:
+            disabled_by = "the move tracer"
+        elif board_pool.opening_book is not None:
+            disabled_by = "the opening book"
+        elif board_pool.endgame is not None:
+            disabled_by = "the endgame solver"
+        elif board_pool.config != DEFAULT_SOLVER_CONFIG:
+            disabled_by = "a non-default solver configuration"
+
+        if disabled_by is None:
+            from result_cache import CachingAggregator, ResultCache
+
+            cache = ResultCache(cache_path, cache_max_entries)
+            caching_aggregator = CachingAggregator(aggregator, cache)
+        else:
+            print("Result cache disabled by", disabled_by, file=sys.stderr)
 
     # Disable stdout prints (scipy)
     toggle_output(False)
 
-    copy_seeds = seeds[:] if seeds is not None else None
+    copy_seeds = iter(seeds) if seeds is not None else None
 
-    t = timeit.Timer(
-        functools.partial(board_setup, board_results, True, solver, copy_seeds),
-        "gc.enable()" if enable_gc else "",
-    )
-    timeit_result = t.timeit(number=repeats)
+    # Like timeit, keep the garbage collector disabled during timing by default
+    gc_enabled = gc.isenabled()
+    if enable_gc:
+        gc.enable()
+    else:
+        gc.disable()
+
+    try:
+        # The backends are imported lazily, import them before the first
+        # timed board even without warmup boards
+        import_backend(solver)
+        for i in range(warmup):
+            board_setup(warmup_aggregator, True, solver, None)
+
+        adaptive = (
+            target_win_rate_ci_width is not None or target_latency_ci_width is not None
+        )
+        stop_reason = "repeats"
+
+        start_time = time.perf_counter()
+        for i in range(repeats):
+            solve_board = (
+                board_setup if profiler is None else profiler.wrap(board_setup, i)
+            )
+            if cache is None:
+                solve_board(aggregator, True, solver, copy_seeds, tracer)
+            else:
+                seed = get_next_seed(copy_seeds)
+                cached = (
+                    cache.get(*board_parameters, True, seed, solver)
+                    if seed is not None
+                    else None
+                )
+                if cached is not None:
+                    aggregator.add(*cached)
+                else:
+                    solve_board(caching_aggregator, True, solver, iter([seed]), tracer)
+
+            if (
+                adaptive
+                and aggregator.boards >= min_repeats
+                and target_reached(
+                    aggregator,
+                    target_win_rate_ci_width,
+                    target_latency_ci_width,
+                    confidence,
+                )
+            ):
+                stop_reason = "target confidence interval"
+                break
+
+            if (
+                time_budget is not None
+                and time.perf_counter() - start_time >= time_budget
+            ):
+                stop_reason = "time budget"
+                break
+        total_time = time.perf_counter() - start_time
+    finally:
+        if gc_enabled:
+            gc.enable()
+        else:
+            gc.disable()
+
+        # Enable stdout prints again
+        toggle_output(True)
 
-    # Enable stdout prints again
-    toggle_output(True)
+        if sink is not None:
+            sink.close()
 
-    display_results(repeats, board_results, timeit_result)
+        if cache is not None:
+            cache.close()
 
-    print("-" * 50)
+    if reproducer_path is not None:
+        aggregator.slowest.write_reproducers(reproducer_path)
 
+    if verbose:
+        display_results(
+            repeats, aggregator, total_time, warmup, confidence, stop_reason
+        )
+        if tracer is not None:
+            print("Traces written", tracer.dumped, "to", trace_dir)
+        if cache is not None:
+            print("Cached boards", cache.hits, "solved", aggregator.boards - cache.hits)
+        if reproducer_path is not None:
+            print("Slowest boards written to", reproducer_path)
+        print("-" * 50)
+
+    return aggregator
+
+
+class BoardRecorder:
+    """
+        Collects the result and time of each board solved in a worker process
+    """
 
-def display_results(repeats, board_results: List[BoardResult], timeit_result):
-    win_rate = sum(
-        map(lambda board: board.state == BoardState.Won, board_results)
-    ) / float(len(board_results))
+    boards: List[Tuple[BoardResult, float]]
+
+    def __init__(self):
+        self.boards = []
+
+    def add(self, result: BoardResult, elapsed: float) -> None:
+        self.boards.append((result, elapsed))
+
+
+def solve_seed_chunk(
+    setup_name: str,
+    solver: BoardSolver,
+    seeds: List[int],
+    start_index=0,
+    profile_boards: Optional[range] = None,
+) -> Tuple[List[Tuple[BoardResult, float]], Optional[Tuple[Dict, int]]]:
+    """
+        Solves the boards of the seeds in a worker process of
+        run_benchmark_parallel. The first board has the index start_index in
+        the run, boards with an index in profile_boards are profiled.
+        Returns the result and time of each board and, if profiled, the pstats
+        data and the number of profiled boards
+    """
+    board_setup = get_board_setup(setup_name)
+    recorder = BoardRecorder()
+    profiler = None
+    if profile_boards is not None:
+        from profiler import BoardProfiler
 
-    ex_board = board_results[0]
-    print("Board", ex_board.width, ex_board.height, ex_board.mines)
+        profiler = BoardProfiler(profile_boards)
+
+    toggle_output(False)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        seed_iterator = iter(seeds)
+        for i in range(start_index, start_index + len(seeds)):
+            solve_board = (
+                board_setup if profiler is None else profiler.wrap(board_setup, i)
+            )
+            solve_board(recorder, True, solver, seed_iterator)
+    finally:
+        if gc_enabled:
+            gc.enable()
+        toggle_output(True)
+        close_board_setup(board_setup)
+
+    if profiler is None or profiler.profiled_boards == 0:
+        return recorder.boards, None
+    return recorder.boards, (profiler.stats, profiler.profiled_boards)
+
+
+def warm_up_worker(
+    setup_name: str,
+    solver: BoardSolver,
+    warmup: int,
+    opening_book_path=None,
+    endgame=False,
+) -> None:
+    # Imports the solver and solves boards with random seeds before the
+    # first chunk, so that neither the imports nor the first solves are timed
+    import_backend(solver)
+    if opening_book_path is not None:
+        load_opening_book(opening_book_path)
+    if endgame:
+        enable_endgame()
+    board_setup = get_board_setup(setup_name)
+    toggle_output(False)
+    try:
+        for i in range(warmup):
+            board_setup(BoardRecorder(), True, solver, None)
+    finally:
+        toggle_output(True)
+        close_board_setup(board_setup)
+
+
+def run_benchmark_parallel(
+    setup_name: str,
+    repeats,
+    solver=BoardSolver.ScipyLinalgLstsq,
+    seeds: Optional[List[int]] = None,
+    workers=None,
+    warmup=0,
+    confidence=0.95,
+    slowest_count=10,
+    opening_book_path=None,
+    endgame=False,
+    sink_path=None,
+    sink_chunk_size=10000,
+    reproducer_path=None,
+    profiler: BoardProfiler = None,
+    verbose=True,
+) -> ResultAggregator:
+    """
+        Solves the boards of a run in chunks across a process pool and
+        aggregates the results in the order of the seeds. The boards need
+        fixed seeds, a random seed sequence is drawn if none are given.
+        Corpus setups solve the first repeats records.
+        Every worker solves warmup boards before its first chunk.
+        With endgame, the workers use the exact endgame solver.
+        If sink_path is given, per-board records are written to that file in
+        the order of the seeds. If reproducer_path is given, the slowest boards
+        are written to it like in run_benchmark.
+        If profiler is given, the workers profile the boards of its board
+        indices and their profiles are merged into it.
+        Board times are measured in the workers, the total runtime is wall time
+    """
+    import concurrent.futures
+
+    if seeds is None:
+        board_setup = get_board_setup(setup_name)
+        if hasattr(board_setup, "corpus_size"):
+            seeds = [i % board_setup.corpus_size for i in range(repeats)]
+        else:
+            seeds = list(seed_sequence(random.randrange(sys.maxsize), repeats))
+        close_board_setup(board_setup)
+    seeds = seeds[:repeats]
+
+    if verbose:
+        print("Running", setup_name, "in", workers, "processes")
+        print("Repeats", repeats)
+        print("Solver", solver)
+        print("-" * 25)
+
+    sink = ResultSink(sink_path, sink_chunk_size) if sink_path is not None else None
+    aggregator = ResultAggregator(sink, slowest_count)
+    start_time = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(
+        workers,
+        initializer=warm_up_worker,
+        initargs=(
+            setup_name,
+            solver,
+            warmup,
+            opening_book_path,
+            endgame,
+        ),
+    ) as executor:
+        profile_boards = profiler.boards if profiler is not None else None
+
+        def add_chunk(future):
+            boards, profile = future.result()
+            for board in boards:
+                aggregator.add(*board)
+            if profile is not None:
+                profiler.merge(*profile)
+
+        pending = collections.deque()
+        try:
+            for start in range(0, len(seeds), PARALLEL_CHUNK_SIZE):
+                pending.append(
+                    executor.submit(
+                        solve_seed_chunk,
+                        setup_name,
+                        solver,
+                        seeds[start : start + PARALLEL_CHUNK_SIZE],
+                        start,
+                        profile_boards,
+                    )
+                )
+                if len(pending) >= 2 * workers:
+                    add_chunk(pending.popleft())
+
+            for future in pending:
+                add_chunk(future)
+        finally:
+            if sink is not None:
+                sink.close()
+        total_time = time.perf_counter() - start_time
+
+    if reproducer_path is not None:
+        aggregator.slowest.write_reproducers(reproducer_path)
+
+    if verbose:
+        display_results(repeats, aggregator, total_time, warmup, confidence)
+        if reproducer_path is not None:
+            print("Slowest boards written to", reproducer_path)
+        print("-" * 50)
+
+    return aggregator
+
+
+def summarize(
+    setup_name: str,
+    solver: BoardSolver,
+    aggregator: ResultAggregator,
+    total_time: float,
+    confidence=0.95,
+) -> Dict:
+    """
+        Summary of a run for the csv and json output of main
+    """
+    mean_low, mean_high = aggregator.mean_time_interval(confidence)
+    win_low, win_high = aggregator.win_rate_interval(confidence)
+    return {
+        "setup": setup_name,
+        "solver": solver.name,
+        "width": aggregator.width,
+        "height": aggregator.height,
+        "mines": aggregator.mines,
+        "boards": aggregator.boards,
+        "wins": aggregator.wins,
+        "win_rate": aggregator.win_rate(),
+        "win_rate_low": win_low,
+        "win_rate_high": win_high,
+        "mean_ms": 1000 * aggregator.mean_time(),
+        "mean_ms_low": 1000 * mean_low,
+        "mean_ms_high": 1000 * mean_high,
+        "p50_ms": 1000 * aggregator.latencies.percentile(50),
+        "p90_ms": 1000 * aggregator.latencies.percentile(90),
+        "p99_ms": 1000 * aggregator.latencies.percentile(99),
+        "max_ms": 1000 * aggregator.time_max,
+        "total_seconds": total_time,
+    }
+
+
+def write_summaries(summaries: List[Dict], output_format: str, path=None) -> None:
+    f = open(path, "w", newline="") if path is not None else sys.stdout
+    try:
+        if output_format == "json":
+            import json
+
+            json.dump(summaries, f, indent=4)
+            f.write("\n")
+        elif output_format == "csv":
+            import csv
+
+            writer = csv.DictWriter(
+                f, fieldnames=list(summaries[0]) if summaries else []
+            )
+            writer.writeheader()
+            writer.writerows(summaries)
+    finally:
+        if path is not None:
+            f.close()
+
+
+def target_reached(
+    aggregator: ResultAggregator,
+    target_win_rate_ci_width,
+    target_latency_ci_width,
+    confidence=0.95,
+):
+    """
+        Tests whether all given confidence interval width targets are met
+    """
+    if target_win_rate_ci_width is not None:
+        low, high = aggregator.win_rate_interval(confidence)
+        if high - low > target_win_rate_ci_width:
+            return False
+
+    if target_latency_ci_width is not None:
+        low, high = aggregator.mean_time_interval(confidence)
+        if high - low > target_latency_ci_width * aggregator.mean_time():
+            return False
+
+    return True
+
+
+def display_results(
+    repeats,
+    aggregator: ResultAggregator,
+    total_time,
+    warmup=0,
+    confidence=0.95,
+    stop_reason=None,
+):
+    latencies = aggregator.latencies
+    mean_low, mean_high = aggregator.mean_time_interval(confidence)
+    win_low, win_high = aggregator.win_rate_interval(confidence)
+    confidence_label = "{0:g}% CI".format(100 * confidence)
+
+    print("Board", aggregator.width, aggregator.height, aggregator.mines)
     print("Repeats", repeats)
-    print("Total runtime", timeit_result, "seconds")
-    print("Average per board", 1000 * timeit_result / len(board_results), "ms")
-    print("Win rate", win_rate)
+    print("Boards solved", aggregator.boards)
+    if stop_reason is not None:
+        print("Stopped by", stop_reason)
+    print("Warmup boards excluded", warmup)
+    print("Total runtime", total_time, "seconds")
+    print("Average per board", 1000 * aggregator.mean_time(), "ms")
+    print(
+        "Average per board",
+        confidence_label,
+        "[{0:.3f}, {1:.3f}] ms".format(1000 * mean_low, 1000 * mean_high),
+    )
+    print(
+        "Latency p50 {0:.3f} ms, p90 {1:.3f} ms, p99 {2:.3f} ms, max {3:.3f} ms".format(
+            1000 * latencies.percentile(50),
+            1000 * latencies.percentile(90),
+            1000 * latencies.percentile(99),
+            1000 * aggregator.time_max,
+        )
+    )
+    print("Win rate", aggregator.win_rate())
+    print("Win rate", confidence_label, "[{0:.4f}, {1:.4f}]".format(win_low, win_high))
+
+    slowest = aggregator.slowest.boards()
+    if slowest:
+        print("Slowest boards")
+        print(
+            "{0:>12}{1:>8}{2:>14}{3:>12}  {4}".format(
+                "Time (ms)", "State", "Second-order", "Largest A", "Seed"
+            )
+        )
+        for elapsed, result in slowest:
+            print(
+                "{0:>12.3f}{1:>8}{2:>14}{3:>12}  {4}".format(
+                    1000 * elapsed,
+                    result.state.name,
+                    result.second_order_calls,
+                    "{0}x{1}".format(*result.largest_system),
+                    result.seed,
+                )
+            )
 
 
 def benchmark_custom(width, height, mines):
     def benchmark_board(
-        board_results,
+        aggregator: ResultAggregator,
         force_start_area=True,
         solver=BoardSolver.ScipyLinalgLstsq,
         seeds=None,
+        tracer: TraceDumper = None,
     ):
         current_seed = get_next_seed(seeds)
 
-        board = Board()
+        board = board_pool.acquire(width, height)
+        if tracer is not None:
+            tracer.attach(board)
+        start_time = time.perf_counter()
         board.configure_and_solve(
             width,
             height,
             BoardGenerationSettings(mines, current_seed, None, force_start_area),
             solver,
         )
-        board_results.append(board.get_result())
+        elapsed = time.perf_counter() - start_time
+        aggregator.add(board.get_result(), elapsed)
+        if tracer is not None:
+            tracer.finish(board, elapsed)
+        board_pool.release(board)
 
+    # Lets run_benchmark look up boards in the result cache without solving them
+    benchmark_board.board_parameters = (width, height, mines)
     return benchmark_board
 
 
+def benchmark_corpus(path):
+    """
+        Board setup that solves the pregenerated boards of a corpus file in order,
+        wrapping around at the end. If seeds are given, they are record indices.
+        Release the file with close_board_setup after the last board
+    """
+    from corpus import BoardCorpus
+
+    corpus = BoardCorpus(path)
+    next_index = itertools.count()
+
+    def benchmark_corpus_board(
+        aggregator: ResultAggregator,
+        force_start_area=True,
+        solver=BoardSolver.ScipyLinalgLstsq,
+        seeds=None,
+        tracer: TraceDumper = None,
+    ):
+        index = get_next_seed(seeds)
+        if index is None:
+            index = next(next_index) % len(corpus)
+
+        board = board_pool.acquire(corpus.width, corpus.height)
+        if tracer is not None:
+            tracer.attach(board)
+        start_time = time.perf_counter()
+        start_position = corpus.configure_board(board, index, solver)
+        board.solve(start_position)
+        elapsed = time.perf_counter() - start_time
+        aggregator.add(board.get_result(), elapsed)
+        if tracer is not None:
+            tracer.finish(board, elapsed)
+        board_pool.release(board)
+
+    benchmark_corpus_board.corpus_size = len(corpus)
+    benchmark_corpus_board.close = corpus.close
+    return benchmark_corpus_board
+
+
+def close_board_setup(board_setup) -> None:
+    """
+        Releases the corpus file of a corpus setup, nothing for other setups
+    """
+    close = getattr(board_setup, "close", None)
+    if close is not None:
+        close()
+
+
 def benchmark_easy(
-    board_results,
+    aggregator,
     force_start_area=True,
     solver=BoardSolver.ScipyLinalgLstsq,
     seeds=None,
+    tracer=None,
 ):
-    benchmark_custom(9, 9, 10)(board_results, force_start_area, solver, seeds)
+    benchmark_custom(9, 9, 10)(aggregator, force_start_area, solver, seeds, tracer)
 
 
 def benchmark_medium(
-    board_results,
+    aggregator,
     force_start_area=True,
     solver=BoardSolver.ScipyLinalgLstsq,
     seeds=None,
+    tracer=None,
 ):
-    benchmark_custom(16, 16, 40)(board_results, force_start_area, solver, seeds)
+    benchmark_custom(16, 16, 40)(aggregator, force_start_area, solver, seeds, tracer)
 
 
 def benchmark_expert(
-    board_results,
+    aggregator,
     force_start_area=True,
     solver=BoardSolver.ScipyLinalgLstsq,
     seeds=None,
+    tracer=None,
 ):
-    benchmark_custom(30, 16, 99)(board_results, force_start_area, solver, seeds)
+    benchmark_custom(30, 16, 99)(aggregator, force_start_area, solver, seeds, tracer)
+
+
+benchmark_easy.board_parameters = (9, 9, 10)
+benchmark_medium.board_parameters = (16, 16, 40)
+benchmark_expert.board_parameters = (30, 16, 99)
 
 
 def get_next_seed(seeds):
-    if seeds is not None and len(seeds) > 0:
-        return seeds.pop(0)
+    if seeds is not None:
+        return next(seeds, None)
     return None
 
 
 def toggle_output(on):
     global devnull
+    if devnull is None:
+        devnull = open(os.devnull, "w")
     sys.stdout = sys.__stdout__ if on else devnull
 
 
-def debug(solver=BoardSolver.ScipyLinalgLstsq):
-    board = Board()
+def debug(solver=None, reproducer_path=None, index=0):
+    """
+        Solves a fixed board with debug output. If reproducer_path is given,
+        solves the board at index of a reproducer file written by run_benchmark
+        instead, with its recorded solver unless solver is given. Corpus boards
+        are loaded from their corpus file and boards with a fixed start position
+        start from it
+    """
+    width, height, mines = 30, 16, 99
     seed = 3283476030983952662
-    position = board.configure(
-        30, 16, BoardGenerationSettings(99, seed, None, True), solver, True
-    )
+    force_start_area = True
+    start_position = None
+    corpus_path = None
+    if reproducer_path is not None:
+        reproducer = load_reproducers(reproducer_path)[index]
+        width = reproducer["width"]
+        height = reproducer["height"]
+        mines = reproducer["mines"]
+        seed = reproducer["seed"]
+        force_start_area = reproducer["force_start_area"]
+        if reproducer.get("start_position") is not None:
+            start_position = tuple(reproducer["start_position"])
+        corpus_path = reproducer.get("corpus_path")
+        if solver is None and reproducer["solver"] is not None:
+            solver = BoardSolver[reproducer["solver"]]
+        print("Recorded", reproducer["state"], "in", 1000 * reproducer["time"], "ms")
+
+    if solver is None:
+        solver = BoardSolver.ScipyLinalgLstsq
+
+    board = Board()
+    if corpus_path is not None:
+        from corpus import BoardCorpus
+
+        with BoardCorpus(corpus_path) as corpus:
+            position = corpus.configure_board(
+                board, reproducer["corpus_index"], solver, True
+            )
+    else:
+        position = board.configure(
+            width,
+            height,
+            BoardGenerationSettings(mines, seed, start_position, force_start_area),
+            solver,
+            True,
+        )
 
     print(board.width, board.height, board.generated_mines)
 
@@ -180,48 +1117,13 @@ def debug(solver=BoardSolver.ScipyLinalgLstsq):
 
 
 def benchmark_methods():
-    print(
-        "benchmark_board_link_neighbors",
-        timeit.timeit(
-            stmt="benchmark_board_link_neighbors(board)",
-            setup="""\
-from __main__ import setup_expert_board, benchmark_board_link_neighbors
-board = setup_expert_board()
-                """,
-            number=1000,
-        ),
-    )
-
-    print(
-        "benchmark_board_reset_cells",
-        timeit.timeit(
-            stmt="benchmark_board_reset_cells(board)",
-            setup="""\
-from __main__ import setup_expert_board, benchmark_board_reset_cells
-board = setup_expert_board()
-                """,
-            number=1000,
-        ),
-    )
-
-
-def setup_expert_board():
-    board = Board()
-    board.configure(30, 16, BoardGenerationSettings(99, None, None, True))
-    return board
-
-
-def benchmark_board_link_neighbors(board: Board):
-    # Manually unlink neighbors
-    for row in board.grid:
-        for cell in row:
-            cell.neighbors.clear()
-
-    board.link_neighbors()
-
+    """
+        Times the hot-path methods of the solver on fixed board snapshots.
+        See micro_benchmark.py for the stored regression thresholds
+    """
+    import micro_benchmark
 
-def benchmark_board_reset_cells(board: Board):
-    board.reset_cells()
+    micro_benchmark.run_micro_benchmarks()
 
 
 if __name__ == "__main__":
@@ -1,13 +1,20 @@
 from __future__ import annotations
-from typing import List, Callable, Optional, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple, Dict
 from dataclasses import dataclass
-from enum import Enum
+from enum import Enum, IntEnum
+
+if TYPE_CHECKING:
+    import concurrent.futures
+    import numpy as np
+    from endgame import EndgameSolver
+    from opening_book import OpeningBook
+
+import os
 import random
 import sys
-import numpy as np
-import numpy.linalg
-import scipy.optimize, scipy.linalg
+import itertools
 import math
+import struct
 
 
 class BoardSolver(Enum):
@@ -27,6 +34,33 @@ class BoardSolver(Enum):
     # Similar performance and speed to ScipySparseLinalgLsqr
     ScipySparseLinalgLsmr = 3
 
+    # Races PORTFOLIO_FAST_SOLVERS in a thread pool and accepts the first
+    # result with a certain move, otherwise uses PORTFOLIO_GUESS_SOLVER
+    # Win rate of ScipyOptimizeLsqLinear at roughly half of its run time
+    Portfolio = 4
+
+    # Picks a backend per system from its size and density and whether a guess
+    # is needed, using the cost model calibrated by dispatch.py
+    Auto = 5
+
+    # Close to the results of ScipyLinalgLstsq without depending on scipy, but
+    # some boards differ since the LAPACK driver and rcond are not the same
+    # Imports faster for short-lived processes
+    NumpyLinalgLstsq = 6
+
+
+PORTFOLIO_FAST_SOLVERS = [
+    BoardSolver.ScipyLinalgLstsq,
+    BoardSolver.ScipySparseLinalgLsqr,
+]
+PORTFOLIO_GUESS_SOLVER = BoardSolver.ScipyOptimizeLsqLinear
+
+# Shared by all boards, created on first use of BoardSolver.Portfolio
+portfolio_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+portfolio_race_guess_solver = False
+# Slow backend task of the last race, it keeps a worker busy until it finishes
+portfolio_guess_future: Optional[concurrent.futures.Future] = None
+
 
 class BoardState(Enum):
     Undefined = 0
@@ -34,13 +68,62 @@ class BoardState(Enum):
     Lost = 2
 
 
-class CellState(Enum):
+class CellState(IntEnum):
     Closed = 0
     Opened = 1
     Flagged = 2
 
 
-class CellDiscoveryState(Enum):
+# Cell states as plain ints for comparisons with NumPy arrays, which would
+# look up the enum members on every comparison
+CELL_CLOSED = int(CellState.Closed)
+CELL_OPENED = int(CellState.Opened)
+CELL_FLAGGED = int(CellState.Flagged)
+
+# First-order passes over at most this many unsatisfied opened cells evaluate
+# the rules cell by cell, the fixed cost of the array operations is larger
+SCALAR_FIRST_ORDER_CELLS = 32
+# Vectorized passes with at most this many cells to open or flag around apply
+# them cell by cell instead of building target masks
+SCALAR_FIRST_ORDER_SOURCES = 16
+
+
+class MoveAction(IntEnum):
+    Open = 0
+    Flag = 1
+    Guess = 2
+
+
+class MovePhase(IntEnum):
+    """
+        The part of the solver that decided a move
+    """
+
+    Start = 0
+    FirstOrder = 1
+    SecondOrderActive = 2
+    SecondOrderTotal = 3
+    Endgame = 4
+
+
+# Values of the arrays accepted by Board.from_array, opened cells are 0-8
+CLOSED_VALUE = -1
+FLAGGED_VALUE = -2
+OPENED_MINE_VALUE = -3
+
+# Glyphs of Board.str_revealed and their ASCII alternatives for Board.from_string
+REVEALED_GLYPHS = {
+    "█": CLOSED_VALUE,
+    "#": CLOSED_VALUE,
+    "■": FLAGGED_VALUE,
+    "F": FLAGGED_VALUE,
+    "x": OPENED_MINE_VALUE,
+    " ": 0,
+}
+REVEALED_GLYPHS.update((str(count), count) for count in range(9))
+
+
+class CellDiscoveryState(IntEnum):
     """
         Defines the discovery status of a cell.  
         Undefined: no additional information is known about the cell  
@@ -53,6 +136,28 @@ class CellDiscoveryState(Enum):
     Cleared = 2
 
 
+def clean_solution(X_vector, threshold=0.0001):
+    """
+        Snaps values of X that are closer than threshold to 0 or 1 to exactly 0 or 1
+    """
+    for index, value in enumerate(X_vector):
+        # If the value is close to 0 or truly negative
+        if abs(value) < threshold:
+            X_vector[index] = 0
+
+        if abs(value - 1) < threshold:
+            X_vector[index] = 1
+
+    return X_vector
+
+
+def has_certain_value(X_vector):
+    for value in X_vector:
+        if value == 0 or value == 1:
+            return True
+    return False
+
+
 class BoardGenerationSettings:
     mines: int
     seed: Optional[int]
@@ -66,91 +171,147 @@ class BoardGenerationSettings:
         self.force_start_area = force_start_area
 
 
-@dataclass
-class Cell:
-    __slots__ = [
-        "x",
-        "y",
-        "mine",
-        "neighbor_mine_count",
-        "neighbor_flag_count",
-        "neighbor_opened_count",
-        "neighbor_count",
-        "neighbors",
-        "state",
-        "discovery_state",
-        "satisfied",
-    ]
-    x: int
-    y: int
-    mine: bool
-    neighbor_mine_count: int
-    neighbor_flag_count: int
-    neighbor_opened_count: int
-    neighbor_count: int
-    neighbors: List[Cell]
-    state: CellState
-    discovery_state: CellDiscoveryState
-    satisfied: bool
-
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.neighbors = []
-        self.reset()
+@dataclass(frozen=True)
+class SolverConfig:
+    """
+        Tuning constants of the second-order solve. The defaults are the
+        values the solver was tuned with, see tune.py for sweeping them
+    """
 
-    def reset(self):
-        self.mine = False
-        self.neighbor_mine_count = 0
-        self.neighbor_flag_count = 0
-        self.neighbor_opened_count = 0
-        self.state = CellState.Closed
-        self.discovery_state = CellDiscoveryState.Undefined
-        self.satisfied = False
+    # Solution values closer than this to 0 or 1 are taken as certain
+    snap_threshold: float = 0.0001
 
-    def update_satisfied(self):
-        """
-            Updates the cell as satisfied if the conditions for it are met
-        """
-        if self.satisfied:
-            return
+    # scipy.optimize.lsq_linear of BoardSolver.ScipyOptimizeLsqLinear
+    lsq_linear_method: str = "trf"
+    lsq_linear_solver: str = "lsmr"
 
-        if (
-            self.state == CellState.Flagged
-            or self.neighbor_mine_count == self.neighbor_flag_count
-            or (
-                self.neighbor_mine_count
-                == self.neighbor_count - self.neighbor_opened_count
-            )
-        ):
-            self.satisfied = True
+    # Stopping tolerances of scipy.sparse.linalg.lsqr and lsmr
+    lsqr_atol: float = 1e-6
+    lsqr_btol: float = 1e-6
+    lsmr_atol: float = 1e-6
+    lsmr_btol: float = 1e-6
 
-    def str_real(self):
-        return (
-            "█"
-            if self.mine
-            else (
-                " " if self.neighbor_mine_count == 0 else str(self.neighbor_mine_count)
+    def __post_init__(self):
+        # Above 0.5 the ranges snapped to 0 and to 1 overlap
+        if not 0 < self.snap_threshold < 0.5:
+            raise ValueError(
+                "snap_threshold must be in (0, 0.5): " + str(self.snap_threshold)
             )
-        )
-
-    def str_revealed(self, hide=False):
-        if self.mine and self.state == CellState.Opened:
-            return "x"
-        elif self.state == CellState.Flagged:
-            return "■"
-        elif self.satisfied and hide:
-            return " "
-        elif self.state == CellState.Closed:
-            return "█"
-        elif self.state == CellState.Opened:
-            return (
-                " " if self.neighbor_mine_count == 0 else str(self.neighbor_mine_count)
+        if self.lsq_linear_method not in ("trf", "bvls"):
+            raise ValueError(
+                "lsq_linear_method must be trf or bvls: " + self.lsq_linear_method
+            )
+        if self.lsq_linear_solver not in ("exact", "lsmr"):
+            raise ValueError(
+                "lsq_linear_solver must be exact or lsmr: " + self.lsq_linear_solver
             )
+        for name in ("lsqr_atol", "lsqr_btol", "lsmr_atol", "lsmr_btol"):
+            if not 0 <= getattr(self, name) < 1:
+                raise ValueError(
+                    "%s must be in [0, 1): %s" % (name, getattr(self, name))
+                )
+
+
+DEFAULT_SOLVER_CONFIG = SolverConfig()
+
+# Modules each backend imports on its first solve, besides numpy
+BACKEND_MODULES = {
+    BoardSolver.ScipyLinalgLstsq: ["scipy.linalg"],
+    BoardSolver.ScipyOptimizeLsqLinear: ["scipy.optimize"],
+    BoardSolver.ScipySparseLinalgLsqr: ["scipy.sparse.linalg"],
+    BoardSolver.ScipySparseLinalgLsmr: ["scipy.sparse.linalg"],
+    BoardSolver.Portfolio: [
+        "concurrent.futures",
+        "scipy.linalg",
+        "scipy.optimize",
+        "scipy.sparse.linalg",
+    ],
+    BoardSolver.Auto: [
+        "dispatch",
+        "numpy.linalg",
+        "scipy.linalg",
+        "scipy.optimize",
+        "scipy.sparse.linalg",
+    ],
+    BoardSolver.NumpyLinalgLstsq: ["numpy.linalg"],
+}
+
+
+def import_backend(solver: BoardSolver) -> None:
+    """
+        Imports numpy and the modules of the backend ahead of the first solve,
+        so that benchmarks do not time the lazy imports
+    """
+    import importlib
+
+    importlib.import_module("numpy")
+    for module in BACKEND_MODULES.get(solver, []):
+        importlib.import_module(module)
+    if solver == BoardSolver.Auto:
+        import dispatch
+
+        dispatch.get_cost_model()
+
+
+# Neighbor tables are immutable and shared by every board of the same size
+neighbor_tables: Dict[Tuple[int, int], Tuple[Tuple[int, ...], ...]] = {}
+
+# Neighbor tables as (cells, 8) NumPy arrays padded with -1, see get_neighbor_array
+neighbor_arrays: Dict[Tuple[int, int], np.ndarray] = {}
+
+
+def build_neighbor_table(width: int, height: int) -> Tuple[Tuple[int, ...], ...]:
+    """
+        Builds the indices of the neighbors of each cell in row-major order.  
+        Cells refer to each other only by index, so boards contain no reference
+        cycles and are freed by reference counting alone
+    """
+    table = []
+    for y in range(height):
+        for x in range(width):
+            index = y * width + x
+            neighbors = []
+            if y > 0:
+                neighbors.append(index - width)
+                if x > 0:
+                    neighbors.append(index - width - 1)
+                if x < width - 1:
+                    neighbors.append(index - width + 1)
+            if x > 0:
+                neighbors.append(index - 1)
+            if x < width - 1:
+                neighbors.append(index + 1)
+            if y < height - 1:
+                neighbors.append(index + width)
+                if x > 0:
+                    neighbors.append(index + width - 1)
+                if x < width - 1:
+                    neighbors.append(index + width + 1)
+            table.append(tuple(neighbors))
+    return tuple(table)
+
+
+def get_neighbor_array(width: int, height: int) -> np.ndarray:
+    """
+        Returns the neighbor table of the size as a read-only (cells, 8) NumPy
+        array, rows of cells with fewer neighbors are padded with -1
+    """
+    array = neighbor_arrays.get((width, height))
+    if array is None:
+        import numpy as np
+
+        table = neighbor_tables.get((width, height))
+        if table is None:
+            table = build_neighbor_table(width, height)
+        array = np.full((width * height, 8), -1, dtype=np.intp)
+        for cell, neighbors in enumerate(table):
+            array[cell, : len(neighbors)] = neighbors
+        array.flags.writeable = False
+        neighbor_arrays[(width, height)] = array
+    return array
 
 
 class Board:
-    grid: List[List[Cell]]
     width: int
     height: int
     state: BoardState
@@ -158,16 +319,62 @@ class Board:
     flagged_cells: int
     generated_mines: int
     settings: BoardGenerationSettings
-    unknown_cell_lookup: dict
     debug: bool
     solver: BoardSolver
 
+    # Cells are identified by their row-major index y * width + x
+    neighbors: Tuple[Tuple[int, ...], ...]
+    neighbor_count: bytes
+
+    # Per-cell state, indexed by cell index
+    mine: bytearray
+    neighbor_mine_count: bytearray
+    neighbor_flag_count: bytearray
+    neighbor_opened_count: bytearray
+    cell_state: bytearray
+    discovery_state: bytearray
+    satisfied: bytearray
+    unknown_index: List[int]
+    system_nonzeros: int
+
+    # Cost of the last solve: second-order solves and the largest Ax = b (rows, columns)
+    second_order_calls: int
+    largest_system: Tuple[int, int]
+
+    state_views: Optional[BoardStateViews]
+
+    # Result of probability_map, cleared whenever a cell is opened or flagged
+    probability_cache: Optional[np.ndarray]
+    # Solver and configuration the cached result was solved with
+    probability_cache_key: Optional[Tuple[BoardSolver, SolverConfig]]
+
+    # Records the moves of the solver if set, see move_trace.py
+    trace: Optional[MoveTrace]
+
+    # Start position rankings if set, see opening_book.py
+    opening_book: Optional[OpeningBook]
+
+    # Exact solver for the end of the game if set, see endgame.py
+    endgame: Optional[EndgameSolver]
+    # Tuning constants of the second-order solve
+    config: SolverConfig
+    # Time spent in the endgame solver on the current board, in seconds
+    endgame_time: float
+
+    # Start position of the current board if it was not drawn from the seed
+    fixed_start_position: Optional[Tuple[int, int]]
+    # Corpus file path and record index of the current board, see corpus.py
+    corpus_record: Optional[Tuple[str, int]]
+
     # The board is intended to be reused, no constructor required
     def __init__(self):
-        self.grid = None
-
         self.width = 0
         self.height = 0
+        self.trace = None
+        self.opening_book = None
+        self.endgame = None
+        self.config = DEFAULT_SOLVER_CONFIG
+        self.allocate(0, 0)
         self.reset()
 
     def reset(self):
@@ -176,8 +383,39 @@ class Board:
         self.flagged_cells = 0
         self.generated_mines = 0
         self.settings = None
-        self.unknown_cell_lookup = {}
         self.solver = None
+        self.second_order_calls = 0
+        self.largest_system = (0, 0)
+        self.probability_cache = None
+        self.probability_cache_key = None
+        self.endgame_time = 0.0
+        self.fixed_start_position = None
+        self.corpus_record = None
+
+    def allocate(self, width: int, height: int) -> None:
+        """
+            Allocates the per-cell state arrays for the given size.  
+            Only required when the size of the board changes
+        """
+        self.width = width
+        self.height = height
+
+        size = width * height
+        self.link_neighbors()
+
+        # Zeroed template used to reset the state arrays with a single copy
+        self.blank_state = bytes(size)
+
+        self.mine = bytearray(size)
+        self.neighbor_mine_count = bytearray(size)
+        self.neighbor_flag_count = bytearray(size)
+        self.neighbor_opened_count = bytearray(size)
+        self.cell_state = bytearray(size)
+        self.discovery_state = bytearray(size)
+        self.satisfied = bytearray(size)
+        self.unknown_index = [0] * size
+        self.system_nonzeros = 0
+        self.state_views = None
 
     def configure_and_solve(
         self,
@@ -207,118 +445,453 @@ class Board:
             Returns the starting position as a Tuple[int, int]
         """
         self.reset()
-        self.width = width
-        self.height = height
         self.settings = settings
         self.debug = debug
         self.solver = solver
 
-        reconfigure = (
-            self.grid is None or len(self.grid) != height or len(self.grid[0]) != width
-        )
+        if debug and self.trace is None:
+            self.trace = MoveTrace()
+        if self.trace is not None:
+            self.trace.clear()
 
         # Reset the grid data if needed
-        if reconfigure:
-            self.grid = [[Cell(i, j) for i in range(width)] for j in range(height)]
-            self.link_neighbors()
+        if width != self.width or height != self.height:
+            self.allocate(width, height)
+
+        # Start from the best ranked position of the opening book, if any.
+        # The settings are left as given, they may be reused for other boards
+        start_position = settings.start_position
+        if start_position is None and self.opening_book is not None:
+            start_position = self.opening_book.start_position(
+                width, height, settings.mines
+            )
+        self.fixed_start_position = start_position
 
         self.reset_cells()
-        start_position = self.generate_mines(settings)
-        return start_position
+        return self.generate_mines(settings, start_position)
 
-    def solve(self, start_position):
+    def configure_mines(
+        self,
+        width: int,
+        height: int,
+        mines: bytes,
+        settings: BoardGenerationSettings,
+        solver=BoardSolver.ScipyLinalgLstsq,
+        debug=False,
+    ):
         """
-            Solves the board from its current state using the given start position that will be opened.
+            Configures the board with pregenerated mines instead of generating them.  
+            mines has one byte (0 or 1) per cell in row-major order and
+            settings.start_position must be set. Returns the starting position
         """
-        if self.debug:
-            print("Solving with seed", self.settings.seed)
+        self.reset()
+        self.settings = settings
+        self.debug = debug
+        self.solver = solver
 
-        non_mine_cell_count = self.width * self.height - self.generated_mines
+        if debug and self.trace is None:
+            self.trace = MoveTrace()
+        if self.trace is not None:
+            self.trace.clear()
 
-        # Keep track of remaining unsatisfied/solved cells
-        remaining_cells: List[Cell] = [cell for row in self.grid for cell in row]
+        if width != self.width or height != self.height:
+            self.allocate(width, height)
 
-        # Keep track of active cells and perform first-order solving
-        # A cell is active if one of it's neighbors has been opened
-        # or if the cell itself has been opened
-        active_cells: List[Cell] = []
+        self.reset_cells()
+        self.place_mines(mines)
+        self.fixed_start_position = settings.start_position
+        return settings.start_position
 
-        # Build a lookup (x, y) -> (cell, index) for unknown cells
-        # The index will be updated manually and when cells are flagged or opened, they
-        # are removed from the lookup
-        self.unknown_cell_lookup = {}
-        for cell in remaining_cells:
-            self.unknown_cell_lookup[(cell.x, cell.y)] = [cell, 0]
+    def replace_mines(self, mines: bytes) -> None:
+        """
+            Replaces the mines of a board that is being solved. Only valid if none
+            of the cells whose mine or neighboring mine count changes is revealed
+        """
+        self.neighbor_mine_count[:] = self.blank_state
+        self.generated_mines = 0
+        self.place_mines(mines)
+
+    def place_mines(self, mines: bytes) -> None:
+        """
+            Sets the mines of the board from one byte (0 or 1) per cell
+        """
+        self.mine[:] = mines
+
+        neighbors = self.neighbors
+        neighbor_mine_count = self.neighbor_mine_count
+        cell = mines.find(1)
+        while cell != -1:
+            self.generated_mines += 1
+            for neighbor in neighbors[cell]:
+                neighbor_mine_count[neighbor] += 1
+            cell = mines.find(1, cell + 1)
+
+    @staticmethod
+    def from_string(text: str, mines: int, solver=BoardSolver.ScipyLinalgLstsq):
+        """
+            Builds a partially revealed board from the output of str_revealed, one
+            line per row. # and F are accepted for closed and flagged cells and
+            0 for opened cells without neighboring mines
+        """
+        rows = [
+            [REVEALED_GLYPHS[glyph] for glyph in line]
+            for line in text.strip("\n").splitlines()
+        ]
+        return Board.from_array(rows, mines, solver)
+
+    @staticmethod
+    def from_array(values, mines: int, solver=BoardSolver.ScipyLinalgLstsq):
+        """
+            Builds a partially revealed board from rows of cell values:
+            the neighboring mine count (0-8) of opened cells, CLOSED_VALUE,
+            FLAGGED_VALUE or OPENED_MINE_VALUE. mines is the total mine count.  
+            The mines under closed cells are unknown, so the board is meant for
+            queries like probability_map rather than for playing on
+        """
+        board = Board()
+        board.load_revealed([[int(value) for value in row] for row in values], mines)
+        board.solver = solver
+        return board
+
+    def load_revealed(self, rows: List[List[int]], mines: int) -> None:
+        """
+            Sets the state of the board from rows of cell values, see from_array
+        """
+        height = len(rows)
+        width = len(rows[0]) if height > 0 else 0
+        if any(len(row) != width for row in rows):
+            raise ValueError("All rows must have the same number of cells")
+
+        self.reset()
+        self.settings = BoardGenerationSettings(mines)
+        self.debug = False
+        if width != self.width or height != self.height:
+            self.allocate(width, height)
+        self.reset_cells()
+        self.generated_mines = mines
+
+        neighbors = self.neighbors
+        cell_state = self.cell_state
+        neighbor_flag_count = self.neighbor_flag_count
+        neighbor_opened_count = self.neighbor_opened_count
+        revealed = []
+        for cell, value in enumerate(itertools.chain.from_iterable(rows)):
+            if value == CLOSED_VALUE:
+                continue
+
+            revealed.append(cell)
+            if value == FLAGGED_VALUE:
+                cell_state[cell] = CellState.Flagged
+                for neighbor in neighbors[cell]:
+                    neighbor_flag_count[neighbor] += 1
+                continue
+
+            cell_state[cell] = CellState.Opened
+            for neighbor in neighbors[cell]:
+                neighbor_opened_count[neighbor] += 1
+
+            if value == OPENED_MINE_VALUE:
+                self.mine[cell] = True
+                self.state = BoardState.Lost
+            else:
+                self.neighbor_mine_count[cell] = value
+
+        self.flagged_cells = cell_state.count(CellState.Flagged)
+        self.opened_cells = len(revealed) - self.flagged_cells
+
+        for cell in revealed:
+            self.update_satisfied(cell)
+
+    def solve(self, start_position, guess=True):
+        """
+            Solves the board from its current state using the given start position that will be opened.  
+            If guess is False, solving stops at the first position that would need
+            a guess and the state of the board stays Undefined
+        """
+        if self.debug:
+            print("Solving with seed", self.settings.seed)
 
         # Open the start position
+        if self.trace is not None:
+            self.trace.start_position = start_position
+            self.record_move(
+                MoveAction.Open,
+                MovePhase.Start,
+                start_position[1] * self.width + start_position[0],
+            )
         self.open_at(start_position[0], start_position[1])
 
         # Main loop
 
         while self.state == BoardState.Undefined:
-            # Test win condition
-            if self.opened_cells == non_mine_cell_count:
-                self.state = BoardState.Won
+            if not self.solve_step(guess):
                 break
 
-            # Update remaining and active cells
-            remaining_cells = [cell for cell in remaining_cells if not cell.satisfied]
+        if self.debug:
+            print(self.state.name, "after", self.trace.count, "moves")
+            for move in self.trace.moves():
+                print(move)
+            print()
+            print(self.str_revealed())
+            print()
+
+    def solve_step(self, guess=True) -> bool:
+        """
+            Performs one iteration of the main solving loop.  
+            Returns False if the board could not be changed without a guess
+        """
+        import numpy as np
 
-            active_cells = [
-                cell
-                for cell in remaining_cells
-                if cell.neighbor_opened_count > 0 or cell.state == CellState.Opened
-            ]
+        # Test win condition
+        if self.opened_cells == self.width * self.height - self.generated_mines:
+            self.state = BoardState.Won
+            return True
 
-            # Loop through active cells and attempt first-order solving
-            # If no cells were changed, perform second-order solving
-            # for active cells only.
-            # If no cells were changed after second-order solving for
-            # active cells, attempt second-order solving for all cells
-            # and perform epsilon tests and find least probable cell to
-            # contain a mine for a random guess if needed
+        # Perform first-order solving for the whole board until nothing changes
+        # If no cells were changed, perform second-order solving
+        # for active cells only.
+        # If no cells were changed after second-order solving for
+        # active cells, attempt second-order solving for all cells
+        # and perform epsilon tests and find least probable cell to
+        # contain a mine for a random guess if needed
 
-            solved_active = False
-            # print(len(active_cells))
+        if self.solve_first_order():
+            return True
 
-            for cell in active_cells:
-                cell_flag_satisfied = (
-                    cell.neighbor_mine_count == cell.neighbor_flag_count
-                )
-                cell_flag_remaining = (
-                    cell.neighbor_mine_count
-                    == cell.neighbor_count - cell.neighbor_opened_count
-                )
+        # Keep track of remaining unsatisfied/solved cells and active cells
+        # A cell is active if one of it's neighbors has been opened
+        # or if the cell itself has been opened
+        views = self.state_views
+        remaining = views.satisfied == 0
+        remaining_cells: List[int] = np.flatnonzero(remaining).tolist()
+        active_cells: List[int] = np.flatnonzero(
+            remaining
+            & (
+                (views.neighbor_opened_count > 0)
+                | (views.cell_state == CellState.Opened)
+            )
+        ).tolist()
 
-                # If an opened cell has been satisfied, open remaining neighboring unflagged cells
-                if cell_flag_satisfied and cell.state == CellState.Opened:
-                    solved_active = True
-                    for neighbor in cell.neighbors:
-                        if neighbor.state == CellState.Closed:
-                            self.open_cell(neighbor)
-                    cell.update_satisfied()
-
-                # If an opened cell has the same number of unopened squares
-                # as the neighboring mine count, flag all neighbors
-                if cell_flag_remaining and cell.state == CellState.Opened:
-                    solved_active = True
-                    for neighbor in cell.neighbors:
-                        if neighbor.state == CellState.Closed:
-                            self.flag_cell(neighbor)
-                    cell.update_satisfied()
-
-            # Do not perform second-order solving if first-order solving is sufficient
-            if solved_active:
-                continue
+        solved_active = self.solve_complex(active_cells)
+
+        if solved_active:
+            return True
+
+        endgame = self.endgame
+        if endgame is not None and endgame.applies(self):
+            # None if the endgame ran out of time, continue with least squares
+            solved_endgame = endgame.solve(self, guess)
+            if solved_endgame is not None:
+                return solved_endgame or guess
 
-            solved_active = self.solve_complex(active_cells)
+        return self.solve_complex(remaining_cells, True, guess) or guess
+
+    def solve_first_order(self) -> bool:
+        """
+            Evaluates the first-order rules for the whole board at once using
+            array views of the cell state and applies them to the matching cells,
+            repeated until nothing changes:
+            If an opened cell has as many flagged neighbors as neighboring mines,
+            open its closed neighbors.
+            If an opened cell has as many closed and flagged neighbors as
+            neighboring mines, flag its closed neighbors.
+            The cells to open and flag in a pass are gathered from a neighbor
+            index array, only opening and flagging them is done cell by cell
+            since openings cascade. When few opened cells are unsatisfied, as
+            on small boards, the rules are evaluated cell by cell instead.
+            Returns True if any cell was changed or marked satisfied
+        """
+        import numpy as np
 
-            if solved_active:
+        if self.state_views is None:
+            self.state_views = BoardStateViews(self)
+        views = self.state_views
+        unresolved = views.unresolved
+        closed_neighbors = views.closed_neighbors
+        active = views.active
+        matches = views.matches
+
+        changed = False
+        while self.state == BoardState.Undefined:
+            np.equal(views.cell_state, CELL_OPENED, out=active)
+            active &= np.logical_not(views.satisfied, out=matches)
+            cells = np.flatnonzero(active)
+            if len(cells) <= SCALAR_FIRST_ORDER_CELLS:
+                if not self.solve_first_order_cells(cells.tolist()):
+                    break
+                changed = True
                 continue
 
-            self.solve_complex(remaining_cells, True, True)
+            # Signed, so that cells with more flags than mines around them
+            # do not wrap around
+            np.subtract(
+                views.neighbor_mine_count,
+                views.neighbor_flag_count,
+                out=unresolved,
+                dtype=np.int16,
+            )
+            np.subtract(
+                views.neighbor_count,
+                views.neighbor_opened_count,
+                out=closed_neighbors,
+                dtype=np.int16,
+            )
+            closed_neighbors -= views.neighbor_flag_count
+            np.equal(unresolved, 0, out=matches)
+            matches &= active
+            open_sources = np.flatnonzero(matches)
+            np.equal(unresolved, closed_neighbors, out=matches)
+            matches &= active
+            matches &= unresolved > 0
+            flag_sources = np.flatnonzero(matches)
+            if len(open_sources) == 0 and len(flag_sources) == 0:
+                break
+
+            changed = True
+            if len(open_sources) + len(flag_sources) <= SCALAR_FIRST_ORDER_SOURCES:
+                self.apply_first_order_cells(
+                    open_sources.tolist(), flag_sources.tolist()
+                )
+            else:
+                self.apply_first_order_masks(open_sources, flag_sources)
+
+        return changed
+
+    def solve_first_order_cells(self, cells: List[int]) -> bool:
+        """
+            Applies the first-order rules to the opened cells one after another,
+            each seeing the changes of the cells before it.
+            Returns True if any cell was changed or marked satisfied
+        """
+        cell_state = self.cell_state
+        neighbors = self.neighbors
+        neighbor_count = self.neighbor_count
+        neighbor_mine_count = self.neighbor_mine_count
+        neighbor_flag_count = self.neighbor_flag_count
+        neighbor_opened_count = self.neighbor_opened_count
+        trace = self.trace
+
+        changed = False
+        for cell in cells:
+            # If an opened cell has been satisfied, open remaining neighboring unflagged cells
+            if neighbor_mine_count[cell] == neighbor_flag_count[cell]:
+                changed = True
+                for neighbor in neighbors[cell]:
+                    if cell_state[neighbor] == CELL_CLOSED:
+                        if trace is not None:
+                            self.record_move(
+                                MoveAction.Open, MovePhase.FirstOrder, neighbor
+                            )
+                        self.open_cell(neighbor)
+                self.update_satisfied(cell)
+
+            # If an opened cell has the same number of unopened squares
+            # as the neighboring mine count, flag all neighbors
+            if (
+                neighbor_mine_count[cell]
+                == neighbor_count[cell] - neighbor_opened_count[cell]
+            ):
+                changed = True
+                for neighbor in neighbors[cell]:
+                    if cell_state[neighbor] == CELL_CLOSED:
+                        if trace is not None:
+                            self.record_move(
+                                MoveAction.Flag, MovePhase.FirstOrder, neighbor, 1.0
+                            )
+                        self.flag_cell(neighbor)
+                self.update_satisfied(cell)
+
+            if self.state != BoardState.Undefined:
+                break
+        return changed
+
+    def apply_first_order_cells(
+        self, open_sources: List[int], flag_sources: List[int]
+    ) -> None:
+        """
+            Opens the closed neighbors of open_sources and flags the closed
+            neighbors of flag_sources one neighbor at a time
+        """
+        cell_state = self.cell_state
+        neighbors = self.neighbors
+        trace = self.trace
+
+        open_targets = {
+            neighbor
+            for cell in open_sources
+            for neighbor in neighbors[cell]
+            if cell_state[neighbor] == CELL_CLOSED
+        }
+        # A cell can only be both with wrong flags, opening it is
+        # what the rules of the flagged cells say
+        flag_targets = {
+            neighbor
+            for cell in flag_sources
+            for neighbor in neighbors[cell]
+            if cell_state[neighbor] == CELL_CLOSED and neighbor not in open_targets
+        }
+
+        # Flags first, so that the cascades of the opened cells see them
+        for cell in sorted(flag_targets):
+            if trace is not None:
+                self.record_move(MoveAction.Flag, MovePhase.FirstOrder, cell, 1.0)
+            self.flag_cell(cell)
+        for cell in sorted(open_targets):
+            if trace is not None:
+                self.record_move(MoveAction.Open, MovePhase.FirstOrder, cell)
+            self.open_cell(cell)
+
+        for cell in open_sources:
+            self.update_satisfied(cell)
+        for cell in flag_sources:
+            self.update_satisfied(cell)
+
+    def apply_first_order_masks(self, open_sources, flag_sources) -> None:
+        """
+            Opens the closed neighbors of open_sources and flags the closed
+            neighbors of flag_sources, gathered with boolean target masks
+        """
+        import numpy as np
+
+        views = self.state_views
+        neighbor_indices = get_neighbor_array(self.width, self.height)
+        trace = self.trace
+
+        # Neighbors are padded with -1, which marks the extra last cell
+        open_targets = views.open_targets
+        flag_targets = views.flag_targets
+        open_targets.fill(False)
+        open_targets[neighbor_indices[open_sources]] = True
+        flag_targets.fill(False)
+        flag_targets[neighbor_indices[flag_sources]] = True
+        # A cell can only be both with wrong flags, opening it is
+        # what the rules of the flagged cells say
+        flag_targets &= ~open_targets
+        closed = views.padded_closed
+        np.equal(views.cell_state, CELL_CLOSED, out=closed[:-1])
+        open_targets &= closed
+        flag_targets &= closed
+
+        # Flags first, so that the cascades of the opened cells see them
+        for cell in np.flatnonzero(flag_targets).tolist():
+            if trace is not None:
+                self.record_move(MoveAction.Flag, MovePhase.FirstOrder, cell, 1.0)
+            self.flag_cell(cell)
+        for cell in np.flatnonzero(open_targets).tolist():
+            if trace is not None:
+                self.record_move(MoveAction.Open, MovePhase.FirstOrder, cell)
+            self.open_cell(cell)
+
+        # Same conditions as update_satisfied for opened cells
+        sources = np.concatenate((open_sources, flag_sources))
+        mine_count = views.neighbor_mine_count[sources]
+        satisfied = (mine_count == views.neighbor_flag_count[sources]) | (
+            mine_count
+            == views.neighbor_count[sources] - views.neighbor_opened_count[sources]
+        )
+        views.satisfied[sources[satisfied]] = 1
 
-    def solve_complex(self, cells: List[Cell], include_total=False, guess=False):
+    def solve_complex(self, cells: List[int], include_total=False, guess=False):
         """
             Form the required matrix and vector to solve
             Ax = b
@@ -336,18 +909,104 @@ class Board:
             to the matrix to get some probability value for every closed cell
         """
 
-        # Update the unknown lookup with proper indices
+        solved_active = False
+
+        cell_state = self.cell_state
+        unknown_indices = self.unknown_index
+        trace = self.trace
+        phase = (
+            MovePhase.SecondOrderTotal if include_total else MovePhase.SecondOrderActive
+        )
+
+        self.second_order_calls += 1
+        system = self.build_system(cells, include_total)
+        if system is None:
+            return False
+
+        A_matrix, B_vector = system
+        rows = len(A_matrix)
+        columns = len(A_matrix[0]) if rows > 0 else 0
+        if rows * columns > self.largest_system[0] * self.largest_system[1]:
+            self.largest_system = (rows, columns)
+        X_vector = self.solve_system(A_matrix, B_vector, guess=guess)
+
+        clean_solution(X_vector, self.config.snap_threshold)
+
+        # Find sure mines to flag or cells to open
+        # Find the least probable cell for guessing, if needed
+        least_probable_cell = None
+        least_probability = math.inf
+        for cell in cells:
+            if cell_state[cell] != CellState.Closed:
+                continue
+
+            unknown_index = unknown_indices[cell]
+
+            if X_vector[unknown_index] == 1:
+                solved_active = True
+                if trace is not None:
+                    self.record_move(MoveAction.Flag, phase, cell, 1.0)
+                self.flag_cell(cell)
+            elif X_vector[unknown_index] == 0:
+                solved_active = True
+                if trace is not None:
+                    self.record_move(MoveAction.Open, phase, cell)
+                self.open_cell(cell)
+
+            # Find a smallest valid probability (> 0)
+            if (
+                least_probability > X_vector[unknown_index]
+                and X_vector[unknown_index] > 0
+            ):
+                least_probability = X_vector[unknown_index]
+                least_probable_cell = cell
+
+            # print(cell % self.width, cell // self.width, X_vector[unknown_index])
+
+        # Last resort, pick the least probable cell in X_vector to open
+        if not solved_active and guess:
+            if least_probable_cell is None:
+                # No value is positive, guess the closed cell with the
+                # smallest value
+                closed_cells = [
+                    cell for cell in cells if cell_state[cell] == CellState.Closed
+                ]
+                if not closed_cells:
+                    return False
+                least_probable_cell = min(
+                    closed_cells, key=lambda cell: X_vector[unknown_indices[cell]]
+                )
+                least_probability = X_vector[unknown_indices[least_probable_cell]]
+            if trace is not None:
+                self.record_move(
+                    MoveAction.Guess, phase, least_probable_cell, least_probability
+                )
+            self.open_cell(least_probable_cell)
+
+        return solved_active
+
+    def build_system(self, cells: List[int], include_total=False):
+        """
+            Assembles matrix A and vector B of Ax = b for the given cells
+            as described in solve_complex. Columns are numbered in the order of
+            the closed cells in cells and stored in Board.unknown_index.  
+            Returns None if the system cannot be solved without the total row
+        """
+
+        # Update the unknown index array with proper indices
         # Rows can be added to the matrix in the order they are in active_cells
 
-        solved_active = False
+        cell_state = self.cell_state
+        unknown_indices = self.unknown_index
 
         unknown_index = 0
         known_count = 0
         for cell in cells:
-            if cell.state == CellState.Closed:
-                self.unknown_cell_lookup[(cell.x, cell.y)][1] = unknown_index
+            state = cell_state[cell]
+            if state == CellState.Closed:
+                unknown_indices[cell] = unknown_index
                 unknown_index += 1
-            if cell.state == CellState.Opened:
+            if state == CellState.Opened:
                 known_count += 1
 
         unknown_count = unknown_index
@@ -357,31 +1016,32 @@ class Board:
         # Without adding the total row, this is impossible to solve
         # If this was reached during the first solve_complex, pass the execution to the next
         if not include_total and (unknown_count == 0 or known_count == 0):
-            return False
+            return None
 
         # unknown_index is now the count of unknowns
         A_matrix = [[0 for i in range(unknown_count)] for j in range(known_count)]
         B_vector = [
-            cell.neighbor_mine_count - cell.neighbor_flag_count
+            self.neighbor_mine_count[cell] - self.neighbor_flag_count[cell]
             for cell in cells
-            if cell.state == CellState.Opened
+            if cell_state[cell] == CellState.Opened
         ]
 
         # Write values to the A matrix
         known_index = 0
+        nonzeros = 0
         for cell in cells:
-            if cell.state != CellState.Opened:
+            if cell_state[cell] != CellState.Opened:
                 continue
 
-            for neighbor in cell.neighbors:
-                if neighbor.state != CellState.Closed:
+            for neighbor in self.neighbors[cell]:
+                if cell_state[neighbor] != CellState.Closed:
                     continue
 
-                key = (neighbor.x, neighbor.y)
-                unknown_index = self.unknown_cell_lookup[key][1]
+                unknown_index = unknown_indices[neighbor]
                 row_index = known_index
 
                 A_matrix[row_index][unknown_index] = 1
+                nonzeros += 1
 
             known_index += 1
 
@@ -389,212 +1049,418 @@ class Board:
         if include_total:
             B_vector.append(self.generated_mines - self.flagged_cells)
             A_matrix.append([1 for i in range(unknown_count)])
+            nonzeros += unknown_count
 
-        # Different attempts at libraries for solving Ax = b
+        # Used by BoardSolver.Auto to estimate the cost of each backend
+        self.system_nonzeros = nonzeros
+
+        return A_matrix, B_vector
 
-        # Find a least-squres solution to the equation
-        # X_vector, residuals, rank, singular_values = numpy.linalg.lstsq(
-        #    A_matrix, B_vector, rcond=None
-        # )
+    def solve_system(self, A_matrix, B_vector, solver=None, guess=False):
+        """
+            Finds vector X of Ax = b using the given or the configured solver.  
+            guess tells BoardSolver.Auto whether a guess will be made from the result
+        """
+        if solver is None:
+            solver = self.solver
+        config = self.config
+
+        if solver == BoardSolver.Auto:
+            import dispatch
+
+            rows = len(A_matrix)
+            columns = len(A_matrix[0]) if rows > 0 else 0
+            solver = BoardSolver[
+                dispatch.get_cost_model().choose(
+                    rows, columns, self.system_nonzeros, guess
+                )
+            ]
+
+        # Different attempts at libraries for solving Ax = b
+        # Backends are imported on first use, so that processes that never
+        # reach second-order solving do not pay for importing scipy
 
         # Find a non-negative least-squares solution to the equation
         # X_vector, residual = scipy.optimize.nnls(A_matrix, B_vector)
         # PROBLEM: Returns only 0's and 1's, not anything in between
         # -> reports uncertain cells as mines or non-mines
 
-        if self.solver == BoardSolver.ScipyLinalgLstsq:
+        if solver == BoardSolver.ScipyLinalgLstsq:
+            import scipy.linalg
+
             # Find a least-squares solution to the equation
             X_vector, residuals, rank, singular_values = scipy.linalg.lstsq(
                 A_matrix, B_vector, check_finite=False
             )
-        elif self.solver == BoardSolver.ScipyOptimizeLsqLinear:
+        elif solver == BoardSolver.ScipyOptimizeLsqLinear:
+            import scipy.optimize
+
             # Find a least-squares solution with constraints
             # method="trf" (default) gets stuck in infinite loop with default lsq_solver
             # method="bvls" gets weird errors:
             # ValueError: zero-size array to reduction operation maximum which has no identity
             optimize_result = scipy.optimize.lsq_linear(
-                A_matrix, B_vector, bounds=(0.0, 1.0), method="trf", lsq_solver="lsmr"
+                A_matrix,
+                B_vector,
+                bounds=(0.0, 1.0),
+                method=config.lsq_linear_method,
+                lsq_solver=config.lsq_linear_solver,
             )
 
             X_vector = optimize_result.x
-        elif self.solver == BoardSolver.ScipySparseLinalgLsqr:
+        elif solver == BoardSolver.ScipySparseLinalgLsqr:
+            import numpy as np
+            import scipy.sparse
+            import scipy.sparse.linalg
+
             # https://docs.scipy.org/doc/scipy/reference/generated/scipy.sparse.linalg.lsqr.html
             # TODO: Attempt better performance by setting initial guess x0
+            # A has at most 8 non-zeros per row apart from the total row, so the
+            # iterations multiply by a CSR matrix instead of the dense array
             X_vector = scipy.sparse.linalg.lsqr(
-                np.array(A_matrix), np.array(B_vector), show=False
+                scipy.sparse.csr_matrix(np.asarray(A_matrix, dtype=np.float64)),
+                np.array(B_vector),
+                atol=config.lsqr_atol,
+                btol=config.lsqr_btol,
+                show=False,
             )[0]
-        elif self.solver == BoardSolver.ScipySparseLinalgLsmr:
+        elif solver == BoardSolver.ScipySparseLinalgLsmr:
+            import numpy as np
+            import scipy.sparse
+            import scipy.sparse.linalg
+
             # https://docs.scipy.org/doc/scipy/reference/generated/scipy.sparse.linalg.lsmr.html
             X_vector = scipy.sparse.linalg.lsmr(
-                np.array(A_matrix), np.array(B_vector), show=False
+                scipy.sparse.csr_matrix(np.asarray(A_matrix, dtype=np.float64)),
+                np.array(B_vector),
+                atol=config.lsmr_atol,
+                btol=config.lsmr_btol,
+                show=False,
             )[0]
-        else:
-            print("No solver configured")
-            exit()
+        elif solver == BoardSolver.NumpyLinalgLstsq:
+            import numpy.linalg
 
-        # Clean the data
-        for index, value in enumerate(X_vector):
-            # If the value is close to 0 or truly negative
-            if abs(value) < 0.0001:
-                X_vector[index] = 0
-
-            if abs(value - 1) < 0.0001:
-                X_vector[index] = 1
-
-        # Find sure mines to flag or cells to open
-        # Find the least probable cell for guessing, if needed
-        least_probable_cell = None
-        least_probability = math.inf
-        for cell in cells:
-            if cell.state != CellState.Closed:
-                continue
+            # Find a least-squares solution to the equation
+            X_vector, residuals, rank, singular_values = numpy.linalg.lstsq(
+                A_matrix, B_vector, rcond=None
+            )
+        elif solver == BoardSolver.Portfolio:
+            X_vector = self.solve_portfolio(A_matrix, B_vector)
+        else:
+            raise ValueError("no solver configured")
 
-            unknown_index = self.unknown_cell_lookup[(cell.x, cell.y)][1]
+        return X_vector
 
-            if X_vector[unknown_index] == 1:
-                solved_active = True
-                self.flag_cell(cell)
-            elif X_vector[unknown_index] == 0:
-                solved_active = True
-                self.open_cell(cell)
+    def solve_portfolio(self, A_matrix, B_vector):
+        """
+            Solves the same system with several backends concurrently
+            (the LAPACK calls release the GIL) and accepts the first cleaned
+            result that gives a certain flag or open. If none of the fast
+            backends give one, the result of PORTFOLIO_GUESS_SOLVER is used.  
+            The slow backend joins the race only if there is a core for it and
+            its task from an earlier race has finished, otherwise it is started
+            after the fast backends have failed. The losing tasks that have not
+            started yet are cancelled
+        """
+        import concurrent.futures
 
-            # Find a smallest valid probability (> 0)
-            if (
-                least_probability > X_vector[unknown_index]
-                and X_vector[unknown_index] > 0
-            ):
-                least_probability = X_vector[unknown_index]
-                least_probable_cell = cell
+        global portfolio_executor, portfolio_race_guess_solver, portfolio_guess_future
+        if portfolio_executor is None:
+            portfolio_race_guess_solver = (os.cpu_count() or 1) > len(
+                PORTFOLIO_FAST_SOLVERS
+            )
+            portfolio_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(PORTFOLIO_FAST_SOLVERS) + 1
+            )
 
-            # print(cell.x, cell.y, X_vector[unknown_index])
+        futures = {
+            portfolio_executor.submit(
+                self.solve_system, A_matrix, B_vector, solver
+            ): solver
+            for solver in PORTFOLIO_FAST_SOLVERS
+        }
+        # A running task cannot be stopped, so a new race waits for a free
+        # worker instead of queueing behind the abandoned slow task
+        if portfolio_race_guess_solver and (
+            portfolio_guess_future is None or portfolio_guess_future.done()
+        ):
+            portfolio_guess_future = portfolio_executor.submit(
+                self.solve_system, A_matrix, B_vector, PORTFOLIO_GUESS_SOLVER
+            )
+            futures[portfolio_guess_future] = PORTFOLIO_GUESS_SOLVER
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                X_vector = clean_solution(future.result(), self.config.snap_threshold)
+                if (
+                    has_certain_value(X_vector)
+                    or futures[future] == PORTFOLIO_GUESS_SOLVER
+                ):
+                    return X_vector
+        finally:
+            for future in futures:
+                future.cancel()
+
+        return clean_solution(
+            self.solve_system(A_matrix, B_vector, PORTFOLIO_GUESS_SOLVER),
+            self.config.snap_threshold,
+        )
 
-        # Last resort, pick the least probable cell in X_vector to open
-        if not solved_active and guess:
-            self.open_cell(least_probable_cell)
+    def probability_map(self):
+        """
+            Returns the probability of a mine for every cell of the current state
+            as a read-only NumPy array of shape (height, width). Opened cells are 0,
+            flagged cells and opened mines 1. Closed cells are solved from Ax = b
+            over the closed cells and their opened neighbors including the total
+            mine count row.  
+            The result is cached until a cell is opened or flagged, or the
+            solver or its configuration changes.  
+            Raises ValueError if the board has no solver
+        """
+        cache_key = (self.solver, self.config)
+        if (
+            self.probability_cache is not None
+            and self.probability_cache_key == cache_key
+        ):
+            return self.probability_cache
+
+        import numpy as np
+
+        if self.state_views is None:
+            self.state_views = BoardStateViews(self)
+        views = self.state_views
+
+        # An opened mine has no count of its neighbors and is one of the mines
+        opened_mines = (views.cell_state == CellState.Opened) & (views.mine != 0)
+        probabilities = (
+            (views.cell_state == CellState.Flagged) | opened_mines
+        ).astype(np.float64)
+
+        # Unlike solve_complex, satisfied opened cells are kept as rows as long
+        # as they have closed neighbors, since loaded positions may not have had
+        # the first-order rules applied
+        closed = views.cell_state == CellState.Closed
+        constraints = (
+            (views.cell_state == CellState.Opened) & ~opened_mines
+        ) & (
+            views.neighbor_count
+            - views.neighbor_opened_count
+            - views.neighbor_flag_count
+            > 0
+        )
 
-            if self.debug:
-                if least_probable_cell.mine:
-                    print("Guessed wrong with probability", least_probability)
-                    print("Remaining mines", self.generated_mines - self.flagged_cells)
-                    print("X_vector:")
-                    for cell in cells:
-                        if cell.state == CellState.Closed or (
-                            cell.state == CellState.Opened and cell.mine
-                        ):
-                            unknown_index = self.unknown_cell_lookup[(cell.x, cell.y)][
-                                1
-                            ]
-
-                            print(cell.x, cell.y, X_vector[unknown_index])
-                else:
-                    print("Guessed right with probability", least_probability)
-                    print(least_probable_cell.x, least_probable_cell.y)
+        # Columns of A are numbered in the order of the closed cells
+        closed_cells = np.flatnonzero(closed)
+        if len(closed_cells) > 0:
+            A_matrix, B_vector = self.build_system(
+                np.flatnonzero(closed | constraints).tolist(), True
+            )
+            B_vector[-1] -= int(opened_mines.sum())
+            X_vector = np.array(self.solve_system(A_matrix, B_vector), dtype=np.float64)
+
+            # Same snapping as clean_solution, for the whole vector at once
+            threshold = self.config.snap_threshold
+            X_vector[np.abs(X_vector) < threshold] = 0
+            X_vector[np.abs(X_vector - 1) < threshold] = 1
+            probabilities[closed_cells] = np.clip(X_vector, 0.0, 1.0)
+
+        probabilities = probabilities.reshape(self.height, self.width)
+        probabilities.flags.writeable = False
+        self.probability_cache = probabilities
+        self.probability_cache_key = cache_key
+        return probabilities
+
+    def update_satisfied(self, cell: int):
+        """
+            Updates the cell as satisfied if the conditions for it are met
+        """
+        if self.satisfied[cell]:
+            return
 
-                print()
-                print(self.str_revealed())
-                print()
+        if (
+            self.cell_state[cell] == CellState.Flagged
+            or self.neighbor_mine_count[cell] == self.neighbor_flag_count[cell]
+            or (
+                self.neighbor_mine_count[cell]
+                == self.neighbor_count[cell] - self.neighbor_opened_count[cell]
+            )
+        ):
+            self.satisfied[cell] = True
 
-        return solved_active
+    def record_move(
+        self, action: MoveAction, phase: MovePhase, cell: int, probability=0.0
+    ) -> None:
+        self.trace.record(
+            action, phase, cell % self.width, cell // self.width, probability
+        )
 
     def flag_at(self, x, y):
-        cell = self.grid[y][x]
-        self.flag_cell(cell)
+        self.flag_cell(y * self.width + x)
 
-    def flag_cell(self, cell):
-        if cell.state != CellState.Closed:
+    def flag_cell(self, cell: int):
+        if self.cell_state[cell] != CellState.Closed:
             return
 
-        # print("Flag", cell.x, cell.y, cell.neighbor_mine_count, cell.mine)
+        # print("Flag", cell % self.width, cell // self.width)
 
-        cell.state = CellState.Flagged
-        for neighbor in cell.neighbors:
-            neighbor.neighbor_flag_count += 1
+        self.cell_state[cell] = CellState.Flagged
+        self.probability_cache = None
+        neighbor_flag_count = self.neighbor_flag_count
+        for neighbor in self.neighbors[cell]:
+            neighbor_flag_count[neighbor] += 1
 
-        del self.unknown_cell_lookup[(cell.x, cell.y)]
         self.flagged_cells += 1
 
-        cell.update_satisfied()
+        self.update_satisfied(cell)
 
     def open_at(self, x, y):
-        cell = self.grid[y][x]
-        self.open_cell(cell)
+        self.open_cell(y * self.width + x)
 
-    def open_cell(self, cell):
-        if cell.state != CellState.Closed:
-            return
-
-        # print("Open", cell.x, cell.y, cell.neighbor_mine_count, cell.mine)
-
-        cell.state = CellState.Opened
-        self.opened_cells += 1
-
-        # Test lose condition
-        if cell.mine:
-            if self.debug:
-                print("Opened mine at", cell.x, cell.y)
-            self.state = BoardState.Lost
+    def open_cell(self, cell: int):
+        """
+            Opens the cell. Opening a cell that is satisfied by its flags opens
+            its closed neighbors in turn, and opening a cell with as many
+            unopened neighbors as neighboring mines flags them.  
+            The cascade is depth-first like a recursive flood fill, with an
+            explicit stack so that large, sparse boards do not exceed the
+            recursion limit
+        """
+        cell_state = self.cell_state
+        if cell_state[cell] != CellState.Closed:
             return
 
-        del self.unknown_cell_lookup[(cell.x, cell.y)]
-
-        cell_flag_satisfied = cell.neighbor_mine_count == cell.neighbor_flag_count
-        cell_flag_remaining = (
-            cell.neighbor_mine_count == cell.neighbor_count - cell.neighbor_opened_count
-        )
-
-        # Inform neighbors that the cell has been opened
-        # Also perform quick-opens and flags for neighbors
-        # since we are already looping through them here
-        for neighbor in cell.neighbors:
-            neighbor.neighbor_opened_count += 1
-
-            # Opening a cell that is fully satisfied opens neighbors
-            if cell_flag_satisfied and neighbor.state == CellState.Closed:
-                self.open_cell(neighbor)
+        neighbors = self.neighbors
+        neighbor_count = self.neighbor_count
+        neighbor_mine_count = self.neighbor_mine_count
+        neighbor_flag_count = self.neighbor_flag_count
+        neighbor_opened_count = self.neighbor_opened_count
+
+        # Cells whose neighbors are being visited:
+        # [cell, neighbor iterator, flag satisfied, flag remaining]
+        stack = []
+        while True:
+            # print("Open", cell % self.width, cell // self.width)
+
+            cell_state[cell] = CellState.Opened
+            self.opened_cells += 1
+            self.probability_cache = None
+
+            # Test lose condition
+            if self.mine[cell]:
+                self.state = BoardState.Lost
+            else:
+                stack.append(
+                    [
+                        cell,
+                        iter(neighbors[cell]),
+                        neighbor_mine_count[cell] == neighbor_flag_count[cell],
+                        neighbor_mine_count[cell]
+                        == neighbor_count[cell] - neighbor_opened_count[cell],
+                    ]
+                )
 
-            # Opening a cell that only has N mines around it and only
-            # N unopened cells remaining flags them all
-            if cell_flag_remaining and neighbor.state == CellState.Closed:
-                self.flag_cell(neighbor)
+            # Inform neighbors that the cell has been opened
+            # Also perform quick-opens and flags for neighbors
+            # since we are already looping through them here
+            cell = None
+            while stack and cell is None:
+                entry = stack[-1]
+                for neighbor in entry[1]:
+                    neighbor_opened_count[neighbor] += 1
+
+                    # Opening a cell that is fully satisfied opens neighbors
+                    if entry[2] and cell_state[neighbor] == CellState.Closed:
+                        cell = neighbor
+                        break
+
+                    # Opening a cell that only has N mines around it and only
+                    # N unopened cells remaining flags them all
+                    if entry[3] and cell_state[neighbor] == CellState.Closed:
+                        self.flag_cell(neighbor)
+                else:
+                    stack.pop()
+                    self.update_satisfied(entry[0])
 
-        cell.update_satisfied()
+            if cell is None:
+                return
 
     def link_neighbors(self) -> None:
-        for y, row in enumerate(self.grid):
-            for x, cell in enumerate(row):
-                if y > 0:
-                    cell.neighbors.append(self.grid[y - 1][x])
-                    if x > 0:
-                        cell.neighbors.append(self.grid[y - 1][x - 1])
-                    if x < self.width - 1:
-                        cell.neighbors.append(self.grid[y - 1][x + 1])
-                if x > 0:
-                    cell.neighbors.append(self.grid[y][x - 1])
-                if x < self.width - 1:
-                    cell.neighbors.append(self.grid[y][x + 1])
-                if y < self.height - 1:
-                    cell.neighbors.append(self.grid[y + 1][x])
-                    if x > 0:
-                        cell.neighbors.append(self.grid[y + 1][x - 1])
-                    if x < self.width - 1:
-                        cell.neighbors.append(self.grid[y + 1][x + 1])
-                cell.neighbor_count = len(cell.neighbors)
+        """
+            Looks up the shared neighbor table for the size of the board
+        """
+        key = (self.width, self.height)
+        table = neighbor_tables.get(key)
+        if table is None:
+            table = build_neighbor_table(self.width, self.height)
+            neighbor_tables[key] = table
+
+        self.neighbors = table
+        self.neighbor_count = bytes(len(neighbors) for neighbors in table)
 
     def reset_cells(self) -> None:
-        for row in self.grid:
-            for cell in row:
-                cell.reset()
+        """
+            Restores the state of every cell by copying the zeroed template over
+            the state arrays instead of resetting cells one by one
+        """
+        blank_state = self.blank_state
+        self.mine[:] = blank_state
+        self.neighbor_mine_count[:] = blank_state
+        self.neighbor_flag_count[:] = blank_state
+        self.neighbor_opened_count[:] = blank_state
+        self.cell_state[:] = blank_state
+        self.discovery_state[:] = blank_state
+        self.satisfied[:] = blank_state
+
+    def save_state(self) -> BoardSnapshot:
+        """
+            Copies the current state of the board so it can be restored later
+        """
+        return BoardSnapshot(
+            bytes(self.mine),
+            bytes(self.neighbor_mine_count),
+            bytes(self.neighbor_flag_count),
+            bytes(self.neighbor_opened_count),
+            bytes(self.cell_state),
+            bytes(self.discovery_state),
+            bytes(self.satisfied),
+            self.state,
+            self.opened_cells,
+            self.flagged_cells,
+            self.generated_mines,
+        )
 
-    def generate_mines(self, settings: BoardGenerationSettings) -> None:
+    def restore_state(self, snapshot: BoardSnapshot) -> None:
+        """
+            Restores a state saved with save_state on a board of the same size
+        """
+        self.mine[:] = snapshot.mine
+        self.neighbor_mine_count[:] = snapshot.neighbor_mine_count
+        self.neighbor_flag_count[:] = snapshot.neighbor_flag_count
+        self.neighbor_opened_count[:] = snapshot.neighbor_opened_count
+        self.cell_state[:] = snapshot.cell_state
+        self.discovery_state[:] = snapshot.discovery_state
+        self.satisfied[:] = snapshot.satisfied
+        self.state = snapshot.state
+        self.probability_cache = None
+        self.opened_cells = snapshot.opened_cells
+        self.flagged_cells = snapshot.flagged_cells
+        self.generated_mines = snapshot.generated_mines
+
+    def generate_mines(
+        self,
+        settings: BoardGenerationSettings,
+        start_position: Optional[Tuple[int, int]] = None,
+    ) -> Tuple[int, int]:
         # Seeds the RNG from settings. If None, assign a seed
         # since the current seed cannot be retrieved from random
         if settings.seed is None:
             settings.seed = random.randrange(sys.maxsize)
         random.seed(settings.seed)
 
-        if settings.start_position is not None:
+        # A given start position takes precedence over the one of the settings
+        if start_position is None:
             start_position = settings.start_position
-        else:
+        if start_position is None:
             start_position = (
                 random.randrange(0, self.width),
                 random.randrange(0, self.height),
@@ -625,33 +1491,315 @@ class Board:
 
         mine_positions = random.sample(valid_positions, mine_count)
 
+        neighbor_mine_count = self.neighbor_mine_count
         for position in mine_positions:
             x, y = position
-            self.grid[y][x].mine = True
+            cell = y * self.width + x
+            self.mine[cell] = True
             self.generated_mines += 1
-            for neighbor in self.grid[y][x].neighbors:
-                neighbor.neighbor_mine_count += 1
+            for neighbor in self.neighbors[cell]:
+                neighbor_mine_count[neighbor] += 1
 
         return start_position
 
     def str_real(self):
         return "\n".join(
-            ["".join([cell.str_real() for cell in row]) for row in self.grid]
+            [
+                "".join(
+                    [self.str_real_cell(y * self.width + x) for x in range(self.width)]
+                )
+                for y in range(self.height)
+            ]
         )
 
     def str_revealed(self, hide=False):
         return "\n".join(
-            ["".join([cell.str_revealed(hide) for cell in row]) for row in self.grid]
+            [
+                "".join(
+                    [
+                        self.str_revealed_cell(y * self.width + x, hide)
+                        for x in range(self.width)
+                    ]
+                )
+                for y in range(self.height)
+            ]
         )
 
+    def str_real_cell(self, cell: int):
+        return (
+            "█"
+            if self.mine[cell]
+            else (
+                " "
+                if self.neighbor_mine_count[cell] == 0
+                else str(self.neighbor_mine_count[cell])
+            )
+        )
+
+    def str_revealed_cell(self, cell: int, hide=False):
+        state = self.cell_state[cell]
+        if self.mine[cell] and state == CellState.Opened:
+            return "x"
+        elif state == CellState.Flagged:
+            return "■"
+        elif self.satisfied[cell] and hide:
+            return " "
+        elif state == CellState.Closed:
+            return "█"
+        elif state == CellState.Opened:
+            return (
+                " "
+                if self.neighbor_mine_count[cell] == 0
+                else str(self.neighbor_mine_count[cell])
+            )
+
     def get_result(self):
-        return BoardResult(self.width, self.height, self.generated_mines, self.state)
+        return BoardResult(
+            self.width,
+            self.height,
+            self.generated_mines,
+            self.state,
+            self.settings.seed if self.settings is not None else None,
+            self.solver,
+            self.settings.force_start_area if self.settings is not None else None,
+            self.second_order_calls,
+            self.largest_system,
+            self.fixed_start_position,
+            self.corpus_record,
+        )
+
+
+class RecordingBoard(Board):
+    """
+        Board that records the state at every second-order solve and
+        every Ax = b system passed to the solver backend. Used to collect
+        the fixed systems of the micro-benchmarks and the dispatch calibration
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.snapshots = []
+        self.systems = []
+
+    def solve_complex(self, cells, include_total=False, guess=False):
+        self.snapshots.append((self.save_state(), list(cells)))
+        return super().solve_complex(cells, include_total, guess)
+
+    def solve_system(self, A_matrix, B_vector, solver=None, guess=False):
+        self.systems.append((A_matrix, B_vector))
+        return super().solve_system(A_matrix, B_vector, solver, guess)
+
+
+class BoardPool:
+    """
+        Keeps released boards per grid size so that repeated solves reuse
+        already allocated state arrays instead of building new ones
+    """
+
+    boards: Dict[Tuple[int, int], List[Board]]
+
+    # Given to every acquired board
+    opening_book: Optional[OpeningBook]
+    endgame: Optional[EndgameSolver]
+    config: SolverConfig
+
+    def __init__(self):
+        self.boards = {}
+        self.opening_book = None
+        self.endgame = None
+        self.config = DEFAULT_SOLVER_CONFIG
+
+    def acquire(self, width: int, height: int) -> Board:
+        """
+            Returns a released board of the given size or allocates a new one
+        """
+        free_boards = self.boards.get((width, height))
+        if free_boards:
+            board = free_boards.pop()
+        else:
+            board = Board()
+            board.allocate(width, height)
+        board.opening_book = self.opening_book
+        board.endgame = self.endgame
+        board.config = self.config
+        return board
+
+    def release(self, board: Board) -> None:
+        """
+            Returns the board to the pool. The board must not be used after releasing
+        """
+        self.boards.setdefault((board.width, board.height), []).append(board)
+
+
+class BoardStateViews:
+    """
+        Zero-copy NumPy views of the per-cell state arrays of a board
+        for whole-board array operations
+    """
+
+    def __init__(self, board: Board):
+        import numpy as np
+
+        self.mine = np.frombuffer(board.mine, dtype=np.uint8)
+        self.neighbor_mine_count = np.frombuffer(
+            board.neighbor_mine_count, dtype=np.uint8
+        )
+        self.neighbor_flag_count = np.frombuffer(
+            board.neighbor_flag_count, dtype=np.uint8
+        )
+        self.neighbor_opened_count = np.frombuffer(
+            board.neighbor_opened_count, dtype=np.uint8
+        )
+        self.neighbor_count = np.frombuffer(board.neighbor_count, dtype=np.uint8)
+        self.cell_state = np.frombuffer(board.cell_state, dtype=np.uint8)
+        self.satisfied = np.frombuffer(board.satisfied, dtype=np.uint8)
+
+        # Buffers of Board.solve_first_order, allocated once per grid size.
+        # The target masks have an extra last cell for the -1 padding of the
+        # neighbor array
+        size = len(self.cell_state)
+        self.unresolved = np.empty(size, dtype=np.int16)
+        self.closed_neighbors = np.empty(size, dtype=np.int16)
+        self.active = np.empty(size, dtype=bool)
+        self.matches = np.empty(size, dtype=bool)
+        self.open_targets = np.empty(size + 1, dtype=bool)
+        self.flag_targets = np.empty(size + 1, dtype=bool)
+        self.padded_closed = np.zeros(size + 1, dtype=bool)
+
+
+# action, phase, x, y, probability of a mine
+MOVE_RECORD = struct.Struct("<BBHHf")
+
+
+@dataclass
+class Move:
+    __slots__ = ["action", "phase", "x", "y", "probability"]
+    action: MoveAction
+    phase: MovePhase
+    x: int
+    y: int
+    probability: float
+
+    def __str__(self):
+        return "{0} {1} {2} p={3:.4f} {4}".format(
+            self.action.name, self.x, self.y, self.probability, self.phase.name
+        )
+
+
+class MoveTrace:
+    """
+        Fixed-size ring buffer of binary move records. Recording a move is a
+        single struct pack, and once the buffer is full the oldest moves are
+        overwritten so memory use does not depend on the length of the game
+    """
+
+    capacity: int
+    buffer: bytearray
+    count: int
+    start_position: Optional[Tuple[int, int]]
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * MOVE_RECORD.size)
+        self.clear()
+
+    def clear(self) -> None:
+        self.count = 0
+        self.start_position = None
+
+    def record(
+        self, action: int, phase: int, x: int, y: int, probability: float
+    ) -> None:
+        MOVE_RECORD.pack_into(
+            self.buffer,
+            self.count % self.capacity * MOVE_RECORD.size,
+            action,
+            phase,
+            x,
+            y,
+            probability,
+        )
+        self.count += 1
+
+    def dropped(self) -> int:
+        """
+            Returns the number of oldest moves that have been overwritten
+        """
+        return max(0, self.count - self.capacity)
+
+    def to_bytes(self) -> bytes:
+        """
+            Returns the retained move records from oldest to newest
+        """
+        size = MOVE_RECORD.size
+        if self.count <= self.capacity:
+            return bytes(self.buffer[: self.count * size])
+        split = self.count % self.capacity * size
+        return bytes(self.buffer[split:] + self.buffer[:split])
+
+    def moves(self) -> List[Move]:
+        return decode_moves(self.to_bytes())
+
+
+def decode_moves(data) -> List[Move]:
+    return [
+        Move(MoveAction(action), MovePhase(phase), x, y, probability)
+        for action, phase, x, y, probability in MOVE_RECORD.iter_unpack(data)
+    ]
 
 
 @dataclass
 class BoardResult:
-    __slots__ = ["width", "height", "mines", "state"]
+    __slots__ = [
+        "width",
+        "height",
+        "mines",
+        "state",
+        "seed",
+        "solver",
+        "force_start_area",
+        "second_order_calls",
+        "largest_system",
+        "start_position",
+        "corpus_record",
+    ]
     width: int
     height: int
     mines: int
     state: BoardState
+    seed: Optional[int]
+    solver: Optional[BoardSolver]
+    force_start_area: Optional[bool]
+    second_order_calls: int
+    largest_system: Tuple[int, int]
+    # Only set if the board was not generated from its seed alone
+    start_position: Optional[Tuple[int, int]]
+    corpus_record: Optional[Tuple[str, int]]
+
+
+@dataclass
+class BoardSnapshot:
+    __slots__ = [
+        "mine",
+        "neighbor_mine_count",
+        "neighbor_flag_count",
+        "neighbor_opened_count",
+        "cell_state",
+        "discovery_state",
+        "satisfied",
+        "state",
+        "opened_cells",
+        "flagged_cells",
+        "generated_mines",
+    ]
+    mine: bytes
+    neighbor_mine_count: bytes
+    neighbor_flag_count: bytes
+    neighbor_opened_count: bytes
+    cell_state: bytes
+    discovery_state: bytes
+    satisfied: bytes
+    state: BoardState
+    opened_cells: int
+    flagged_cells: int
+    generated_mines: int
@@ -0,0 +1,257 @@
+from __future__ import annotations
+from typing import Iterable, Tuple
+
+from board import Board, BoardGenerationSettings, BoardSolver
+
+import argparse
+import mmap
+import random
+import struct
+import sys
+import time
+
+# File layout, all little-endian:
+#   header: magic, version, width, height, mines, flags, record count
+#   records: seed, start x, start y, mine bitmap with one bit per cell
+#            in row-major order, most significant bit first
+HEADER = struct.Struct("<8sIHHIIQ")
+RECORD_HEADER = struct.Struct("<QHH")
+MAGIC = b"MSCORPUS"
+VERSION = 1
+FLAG_FORCE_START_AREA = 1
+# Every board can be solved from its start position without guessing,
+# see no_guess.py. Its mines are not reproducible from the seed
+FLAG_NO_GUESS = 2
+
+# Byte value -> 8 bytes of 0 or 1, most significant bit first
+UNPACK_TABLE = [
+    bytes((value >> (7 - bit)) & 1 for bit in range(8)) for value in range(256)
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pregenerate bit-packed board corpora for benchmarking"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Write a new corpus")
+    generate_parser.add_argument("output")
+    generate_parser.add_argument("--width", type=int, required=True)
+    generate_parser.add_argument("--height", type=int, required=True)
+    generate_parser.add_argument("--mines", type=int, required=True)
+    generate_parser.add_argument("--count", type=int, required=True)
+    generate_parser.add_argument("--random-seed", type=int, default=None)
+
+    info_parser = subparsers.add_parser("info", help="Describe a corpus file")
+    info_parser.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        start_time = time.perf_counter()
+        write_corpus(
+            args.output,
+            args.width,
+            args.height,
+            args.mines,
+            args.count,
+            args.random_seed,
+        )
+        elapsed = time.perf_counter() - start_time
+        print("Generated", args.count, "boards in", elapsed, "seconds")
+    elif args.command == "info":
+        with BoardCorpus(args.path) as corpus:
+            print("Board", corpus.width, corpus.height, corpus.mines)
+            print("Boards", len(corpus))
+            print("Record size", corpus.record_size, "bytes")
+            print("No-guess boards", corpus.no_guess)
+
+
+def pack_bits(cells: bytes) -> bytes:
+    """
+        Packs one byte (0 or 1) per cell into one bit per cell
+    """
+    padded = cells + bytes(-len(cells) % 8)
+    packed = bytearray(len(padded) // 8)
+    for index in range(len(packed)):
+        value = 0
+        for bit in padded[index * 8 : index * 8 + 8]:
+            value = (value << 1) | bit
+        packed[index] = value
+    return bytes(packed)
+
+
+def unpack_bits(packed, cell_count: int) -> bytes:
+    """
+        Unpacks one bit per cell into one byte (0 or 1) per cell
+    """
+    return b"".join(map(UNPACK_TABLE.__getitem__, packed))[:cell_count]
+
+
+def write_corpus(
+    path,
+    width: int,
+    height: int,
+    mines: int,
+    count: int,
+    random_seed=None,
+    force_start_area=True,
+) -> None:
+    """
+        Generates count boards with seeds derived from random_seed and
+        writes their mines and start positions to path
+    """
+    rng = random.Random(random_seed)
+    board = Board()
+
+    def generate_records():
+        for i in range(count):
+            seed = rng.randrange(sys.maxsize)
+            start_position = board.configure(
+                width,
+                height,
+                BoardGenerationSettings(mines, seed, None, force_start_area),
+            )
+            yield seed, start_position, bytes(board.mine)
+
+    write_corpus_records(
+        path,
+        width,
+        height,
+        mines,
+        count,
+        generate_records(),
+        FLAG_FORCE_START_AREA if force_start_area else 0,
+    )
+
+
+def write_corpus_records(
+    path,
+    width: int,
+    height: int,
+    mines: int,
+    count: int,
+    records: Iterable[Tuple[int, Tuple[int, int], bytes]],
+    flags=FLAG_FORCE_START_AREA,
+) -> None:
+    """
+        Writes count (seed, start position, mines) records to path, mines with
+        one byte (0 or 1) per cell. Records are consumed one at a time
+    """
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, height, mines, flags, count))
+        written = 0
+        for seed, start_position, board_mines in records:
+            f.write(RECORD_HEADER.pack(seed, start_position[0], start_position[1]))
+            f.write(pack_bits(board_mines))
+            written += 1
+
+    if written != count:
+        raise ValueError("Expected %d records, got %d" % (count, written))
+
+
+class BoardCorpus:
+    """
+        Read-only, memory-mapped view of a corpus file. The pages are shared
+        between all processes that open the same file
+    """
+
+    path: str
+    width: int
+    height: int
+    mines: int
+    force_start_area: bool
+    no_guess: bool
+    count: int
+    record_size: int
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can not be mapped
+            self.file.close()
+            raise ValueError("Not a board corpus file: " + str(path))
+
+        if len(self.data) < HEADER.size:
+            self.close()
+            raise ValueError("Not a board corpus file: " + str(path))
+        magic, version, width, height, mines, flags, count = HEADER.unpack_from(
+            self.data
+        )
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Not a board corpus file: " + str(path))
+
+        self.width = width
+        self.height = height
+        self.mines = mines
+        self.force_start_area = bool(flags & FLAG_FORCE_START_AREA)
+        self.no_guess = bool(flags & FLAG_NO_GUESS)
+        self.count = count
+        self.bitmap_size = (width * height + 7) // 8
+        self.record_size = RECORD_HEADER.size + self.bitmap_size
+
+        # A truncated or appended file would give garbage records
+        size = len(self.data)
+        expected_size = HEADER.size + count * self.record_size
+        if size != expected_size:
+            self.close()
+            raise ValueError(
+                "Corpus file %s has %d bytes, expected %d for %d records"
+                % (path, size, expected_size, count)
+            )
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self.data.close()
+        self.file.close()
+
+    def record(self, index: int) -> Tuple[int, Tuple[int, int], memoryview]:
+        """
+            Returns the seed, start position and packed mine bitmap of a board
+        """
+        if not 0 <= index < self.count:
+            raise IndexError("Corpus index out of range: " + str(index))
+        offset = HEADER.size + index * self.record_size
+        seed, x, y = RECORD_HEADER.unpack_from(self.data, offset)
+        offset += RECORD_HEADER.size
+        bitmap = memoryview(self.data)[offset : offset + self.bitmap_size]
+        return seed, (x, y), bitmap
+
+    def configure_board(
+        self, board: Board, index: int, solver=BoardSolver.ScipyLinalgLstsq, debug=False
+    ):
+        """
+            Configures the board with the board at index. Returns the start position
+        """
+        seed, start_position, bitmap = self.record(index)
+        mines = unpack_bits(bitmap, self.width * self.height)
+        bitmap.release()
+        start_position = board.configure_mines(
+            self.width,
+            self.height,
+            mines,
+            BoardGenerationSettings(
+                self.mines, seed, start_position, self.force_start_area
+            ),
+            solver,
+            debug,
+        )
+        board.corpus_record = (self.path, index)
+        return start_position
+
+
+if __name__ == "__main__":
+    main()
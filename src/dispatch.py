@@ -0,0 +1,203 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+# Cost model calibrated on the host with `python src/dispatch.py`. Timings do
+# not carry over between hosts, so the file is not part of the repository
+COST_MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "dispatch_cost_model.json"
+)
+
+# Backends with similar solution quality, chosen by predicted cost
+FAST_SOLVERS = [
+    "ScipyLinalgLstsq",
+    "ScipySparseLinalgLsqr",
+    "ScipySparseLinalgLsmr",
+    "NumpyLinalgLstsq",
+]
+
+# Backend used for guesses when its predicted cost is within the guess budget
+GUESS_SOLVER = "ScipyOptimizeLsqLinear"
+
+# Calibration games, covering the preset board sizes and a large board whose
+# systems are big enough for the sparse iterative backends to pay off
+CALIBRATION_SETUPS = [(9, 9, 10), (16, 16, 40), (30, 16, 99), (100, 100, 2000)]
+CALIBRATION_SEEDS = [1, 2, 3, 4]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Calibrate the cost model used by BoardSolver.Auto on this host"
+    )
+    parser.add_argument("--output", default=COST_MODEL_PATH)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--guess-budget",
+        type=float,
+        default=0.02,
+        help="Maximum predicted seconds for using %s on a guess" % GUESS_SOLVER,
+    )
+    args = parser.parse_args()
+
+    model = calibrate_cost_model(args.repeat, args.guess_budget)
+    model.save(args.output)
+    print("Cost model written to", args.output)
+
+
+def system_features(rows: int, columns: int, nonzeros: int) -> List[float]:
+    """
+        Features of an Ax = b system for the linear cost model:
+        constant, size of A, non-zeros of A, the cubic term of dense solvers
+        and the sparse matrix products of the iterative solvers, whose
+        iterations grow with the smaller dimension of A
+    """
+    size = rows * columns
+    iterations = min(rows, columns)
+    return [1.0, size, nonzeros, size * iterations, nonzeros * iterations]
+
+
+class CostModel:
+    """
+        Predicts the run time of each backend from the shape and density of
+        matrix A and picks the cheapest suitable backend per system
+    """
+
+    coefficients: Dict[str, List[float]]
+    guess_budget: float
+
+    def __init__(self, coefficients: Dict[str, List[float]], guess_budget=0.02):
+        self.coefficients = coefficients
+        self.guess_budget = guess_budget
+
+    def predict(self, solver: str, rows: int, columns: int, nonzeros: int) -> float:
+        features = system_features(rows, columns, nonzeros)
+        return max(
+            0.0, sum(c * f for c, f in zip(self.coefficients[solver], features)),
+        )
+
+    def choose(self, rows: int, columns: int, nonzeros: int, guess=False) -> str:
+        """
+            Returns the name of the BoardSolver to use for the system
+        """
+        if (
+            guess
+            and GUESS_SOLVER in self.coefficients
+            and self.predict(GUESS_SOLVER, rows, columns, nonzeros) <= self.guess_budget
+        ):
+            return GUESS_SOLVER
+
+        return min(
+            (solver for solver in FAST_SOLVERS if solver in self.coefficients),
+            key=lambda solver: self.predict(solver, rows, columns, nonzeros),
+        )
+
+    def save(self, path=COST_MODEL_PATH) -> None:
+        with open(path, "w") as f:
+            json.dump(
+                {"coefficients": self.coefficients, "guess_budget": self.guess_budget},
+                f,
+                indent=4,
+                sort_keys=True,
+            )
+            f.write("\n")
+
+    @staticmethod
+    def load(path=COST_MODEL_PATH) -> CostModel:
+        with open(path) as f:
+            data = json.load(f)
+        return CostModel(data["coefficients"], data["guess_budget"])
+
+
+# Uncalibrated fallback: always the lstsq backend, lsq_linear for small guesses
+DEFAULT_COST_MODEL = CostModel(
+    {
+        "ScipyLinalgLstsq": [1e-4, 0.0, 0.0, 0.0, 0.0],
+        "ScipyOptimizeLsqLinear": [1e-3, 1e-5, 0.0, 0.0, 0.0],
+    }
+)
+
+cost_model: Optional[CostModel] = None
+
+
+def get_cost_model() -> CostModel:
+    """
+        Returns the calibrated cost model, loaded on first use
+    """
+    global cost_model
+    if cost_model is None:
+        if os.path.exists(COST_MODEL_PATH):
+            cost_model = CostModel.load(COST_MODEL_PATH)
+        else:
+            print(
+                "No cost model for BoardSolver.Auto, using ScipyLinalgLstsq. "
+                "Calibrate one with: python src/dispatch.py",
+                file=sys.stderr,
+            )
+            cost_model = DEFAULT_COST_MODEL
+    return cost_model
+
+
+def record_calibration_systems() -> List[Tuple[list, list]]:
+    from board import BoardGenerationSettings, RecordingBoard
+
+    systems = []
+    for width, height, mines in CALIBRATION_SETUPS:
+        for seed in CALIBRATION_SEEDS:
+            board = RecordingBoard()
+            board.configure_and_solve(
+                width, height, BoardGenerationSettings(mines, seed, None, True)
+            )
+            systems.extend(board.systems)
+    return systems
+
+
+def calibrate_cost_model(repeat=3, guess_budget=0.02) -> CostModel:
+    """
+        Times every backend on systems recorded from fixed games and fits
+        non-negative coefficients of the cost model with least squares
+    """
+    import numpy as np
+    import scipy.optimize
+    from board import Board, BoardSolver
+
+    systems = record_calibration_systems()
+    features = np.array(
+        [
+            system_features(len(A_matrix), len(A_matrix[0]), sum(map(sum, A_matrix)))
+            for A_matrix, B_vector in systems
+        ]
+    )
+
+    board = Board()
+    coefficients = {}
+    for name in FAST_SOLVERS + [GUESS_SOLVER]:
+        solver = BoardSolver[name]
+        times = []
+        for A_matrix, B_vector in systems:
+            timer = timeit.Timer(lambda: board.solve_system(A_matrix, B_vector, solver))
+            times.append(min(timer.repeat(repeat=repeat, number=1)))
+
+        # Weight by inverse time so that small systems are predicted
+        # with similar relative accuracy as large ones. The coefficients are
+        # non-negative so that no system size gets a negative cost, the columns
+        # are scaled to unit norm for the fit since the features span many
+        # orders of magnitude
+        times = np.array(times)
+        weights = 1.0 / np.maximum(times, 1e-6)
+        weighted = features * weights[:, None]
+        scale = np.linalg.norm(weighted, axis=0)
+        scale[scale == 0] = 1.0
+        fit, residual = scipy.optimize.nnls(weighted / scale, times * weights)
+        coefficients[name] = [float(c) for c in fit / scale]
+        print(name, "mean", 1000 * times.mean(), "ms over", len(times), "systems")
+
+    return CostModel(coefficients, guess_budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,548 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from board import Board, BoardState, CellState, MoveAction, MovePhase
+
+if TYPE_CHECKING:
+    from fractions import Fraction
+
+import math
+import time
+
+
+class EndgameBudgetExceeded(Exception):
+    pass
+
+
+class EndgameSolver:
+    """
+        Exact solver for the end of a game. When few closed cells or mines are
+        left, every assignment of mines to the closed cells that agrees with the
+        opened cells and the exact number of remaining mines is counted, giving
+        exact mine probabilities instead of the least-squares estimates of
+        Board.solve_complex. All assignments are equally likely.
+
+        Cells at the boundary are enumerated per independent group of
+        constraints and combined with the cells that touch no opened cell by
+        counting, so the assignments are never listed one by one. If there are
+        at most lookahead_configurations assignments, they are listed and the
+        guess that maximizes the probability of winning the game is searched for,
+        up to lookahead_depth guesses ahead (None for no limit). Win
+        probabilities are memoized per endgame state.
+
+        A board spends at most time_budget seconds in the endgame solver,
+        after that the least-squares solver takes over
+    """
+
+    max_closed: int
+    max_mines: int
+    lookahead_configurations: int
+    lookahead_depth: Optional[int]
+    time_budget: float
+    memo: Dict[Tuple, float]
+    max_memo_size: int
+
+    # Counts over all boards
+    endgames: int
+    certain_moves: int
+    guesses: int
+    lookahead_guesses: int
+    budget_exceeded: int
+
+    def __init__(
+        self,
+        max_closed=30,
+        max_mines=8,
+        lookahead_configurations=256,
+        lookahead_depth=None,
+        time_budget=0.05,
+        max_memo_size=100000,
+    ):
+        self.max_closed = max_closed
+        self.max_mines = max_mines
+        self.lookahead_configurations = lookahead_configurations
+        self.lookahead_depth = lookahead_depth
+        self.time_budget = time_budget
+        self.memo = {}
+        self.max_memo_size = max_memo_size
+        self.deadline = math.inf
+
+        self.endgames = 0
+        self.certain_moves = 0
+        self.guesses = 0
+        self.lookahead_guesses = 0
+        self.budget_exceeded = 0
+
+    def applies(self, board: Board) -> bool:
+        if board.endgame_time >= self.time_budget:
+            return False
+        closed = board.width * board.height - board.opened_cells - board.flagged_cells
+        remaining_mines = board.generated_mines - board.flagged_cells
+        return closed <= self.max_closed or remaining_mines <= self.max_mines
+
+    def solve(self, board: Board, guess=True) -> Optional[bool]:
+        """
+            Flags and opens the cells that are certain, or opens the best guess.
+            Returns whether the board was changed, or None if the endgame could
+            not be solved within the time budget
+        """
+        start_time = time.perf_counter()
+        self.deadline = start_time + self.time_budget - board.endgame_time
+        try:
+            return self.solve_exact(board, guess)
+        except EndgameBudgetExceeded:
+            self.budget_exceeded += 1
+            return None
+        finally:
+            board.endgame_time += time.perf_counter() - start_time
+
+    def check_budget(self) -> None:
+        if time.perf_counter() > self.deadline:
+            raise EndgameBudgetExceeded()
+
+    def probabilities(
+        self, board: Board, time_budget: float
+    ) -> Optional[Dict[int, Fraction]]:
+        """
+            Returns the exact mine probability of every closed cell of the
+            board, whatever the number of closed cells and mines left. None if
+            the assignments could not be counted within time_budget seconds or
+            the opened cells contradict the mine count
+        """
+        self.deadline = time.perf_counter() + time_budget
+        try:
+            closed, interior, components, total, probabilities = self.count(board)
+        except EndgameBudgetExceeded:
+            self.budget_exceeded += 1
+            return None
+        return probabilities if total > 0 else None
+
+    def count(self, board: Board):
+        """
+            Counts the assignments of the closed cells of the board. Returns the
+            closed cells, the interior cells that touch no opened cell, the
+            enumerated components of the other cells, the number of assignments
+            and the exact mine probability of every closed cell
+        """
+        closed, constraints = visible_constraints(board)
+        remaining_mines = board.generated_mines - board.flagged_cells
+
+        frontier_cells = {cell for cells, mines in constraints for cell in cells}
+        frontier = sorted(frontier_cells)
+        interior = [cell for cell in closed if cell not in frontier_cells]
+        components = [
+            self.enumerate_component(cells, component_constraints, remaining_mines)
+            for cells, component_constraints in split_constraints(frontier, constraints)
+        ]
+
+        total, probabilities = combine_components(
+            components, len(interior), remaining_mines
+        )
+        if total > 0 and interior:
+            interior_value = interior_probability(
+                components, len(interior), remaining_mines, total
+            )
+            for cell in interior:
+                probabilities[cell] = interior_value
+        return closed, interior, components, total, probabilities
+
+    def solve_exact(self, board: Board, guess: bool) -> Optional[bool]:
+        self.endgames += 1
+        remaining_mines = board.generated_mines - board.flagged_cells
+        closed, interior, components, total, probabilities = self.count(board)
+        if total == 0:
+            # The opened cells contradict the mine count, leave it to the
+            # least-squares solver
+            return None
+
+        changed = False
+        trace = board.trace
+        for cell, probability in probabilities.items():
+            if probability == 0:
+                if trace is not None:
+                    board.record_move(MoveAction.Open, MovePhase.Endgame, cell)
+                board.open_cell(cell)
+                changed = True
+            elif probability == 1:
+                if trace is not None:
+                    board.record_move(MoveAction.Flag, MovePhase.Endgame, cell, 1.0)
+                board.flag_cell(cell)
+                changed = True
+            if board.state != BoardState.Undefined:
+                break
+        if changed:
+            self.certain_moves += 1
+            return True
+        if not guess:
+            return False
+
+        cell = None
+        if total <= self.lookahead_configurations:
+            configurations = list_configurations(
+                closed, interior, components, remaining_mines
+            )
+            cell = self.best_guess(board, closed, configurations)
+            self.lookahead_guesses += 1
+        if cell is None:
+            cell = min(probabilities, key=lambda cell: (probabilities[cell], cell))
+
+        self.guesses += 1
+        if trace is not None:
+            board.record_move(
+                MoveAction.Guess, MovePhase.Endgame, cell, float(probabilities[cell])
+            )
+        board.open_cell(cell)
+        return True
+
+    def enumerate_component(
+        self, cells: List[int], constraints: List[Tuple[List[int], int]], max_mines
+    ):
+        """
+            Enumerates the mine assignments of the cells that satisfy the
+            constraints with at most max_mines mines. Returns the assignments
+            by mine count as {mines: [bitmask over cells, ...]}
+        """
+        index = {cell: i for i, cell in enumerate(cells)}
+        cell_constraints: List[List[int]] = [[] for cell in cells]
+        needed = []
+        unassigned = []
+        for constraint, (constraint_cells, mines) in enumerate(constraints):
+            for cell in constraint_cells:
+                cell_constraints[index[cell]].append(constraint)
+            needed.append(mines)
+            unassigned.append(len(constraint_cells))
+
+        solutions: Dict[int, List[int]] = {}
+        count = len(cells)
+
+        def assign(i: int, mask: int, mines: int) -> None:
+            if i == count:
+                solutions.setdefault(mines, []).append(mask)
+                return
+            if i % 8 == 0:
+                self.check_budget()
+
+            touched = cell_constraints[i]
+            for constraint in touched:
+                unassigned[constraint] -= 1
+
+            # No mine in the cell
+            if all(needed[c] <= unassigned[c] for c in touched):
+                assign(i + 1, mask, mines)
+
+            # Mine in the cell
+            if mines < max_mines and all(needed[c] > 0 for c in touched):
+                for constraint in touched:
+                    needed[constraint] -= 1
+                assign(i + 1, mask | (1 << i), mines + 1)
+                for constraint in touched:
+                    needed[constraint] += 1
+
+            for constraint in touched:
+                unassigned[constraint] += 1
+
+        assign(0, 0, 0)
+        return cells, solutions
+
+    def best_guess(
+        self, board: Board, closed: List[int], configurations: List[int]
+    ) -> Optional[int]:
+        """
+            Returns the closed cell to open that maximizes the probability
+            of winning, searched over the listed configurations
+        """
+        neighbor_masks = closed_neighbor_masks(board, closed)
+        key_prefix = (board.width, board.height, tuple(closed))
+        best_cell = None
+        best_probability = -1.0
+        for i, cell in enumerate(closed):
+            probability = self.guess_win_probability(
+                key_prefix, neighbor_masks, configurations, i, self.lookahead_depth
+            )
+            if probability > best_probability:
+                best_probability = probability
+                best_cell = cell
+        return best_cell
+
+    def win_probability(
+        self,
+        key_prefix: Tuple,
+        neighbor_masks: List[int],
+        configurations: List[int],
+        depth: Optional[int],
+    ) -> float:
+        """
+            Probability of winning from the configurations that are still
+            possible, with the best guesses
+        """
+        if len(configurations) == 1:
+            return 1.0
+
+        key = key_prefix + (frozenset(configurations), depth)
+        probability = self.memo.get(key)
+        if probability is not None:
+            return probability
+        self.check_budget()
+
+        if depth == 0:
+            # Estimate by the survival of the best next guess that may hit a mine
+            safe_counts = [
+                sum(1 for s in configurations if not (s >> i) & 1)
+                for i in range(len(neighbor_masks))
+            ]
+            probability = max(
+                count for count in safe_counts if count < len(configurations)
+            ) / len(configurations)
+        else:
+            probability = max(
+                self.guess_win_probability(
+                    key_prefix,
+                    neighbor_masks,
+                    configurations,
+                    i,
+                    depth - 1 if depth is not None else None,
+                )
+                for i in range(len(neighbor_masks))
+            )
+
+        if len(self.memo) >= self.max_memo_size:
+            self.memo.clear()
+        self.memo[key] = probability
+        return probability
+
+    def guess_win_probability(
+        self,
+        key_prefix: Tuple,
+        neighbor_masks: List[int],
+        configurations: List[int],
+        i: int,
+        depth: Optional[int],
+    ) -> float:
+        """
+            Probability of winning after opening closed cell i. The revealed
+            number splits the configurations in which the cell is safe
+        """
+        outcomes: Dict[int, List[int]] = {}
+        for configuration in configurations:
+            if (configuration >> i) & 1:
+                continue
+            number = bin(configuration & neighbor_masks[i]).count("1")
+            outcomes.setdefault(number, []).append(configuration)
+
+        if not outcomes:
+            return 0.0
+        if len(outcomes) == 1 and len(configurations) in map(len, outcomes.values()):
+            # Safe everywhere with the same number, opening it tells nothing
+            # and is left for later
+            return 0.0
+
+        return sum(
+            len(outcome)
+            * self.win_probability(key_prefix, neighbor_masks, outcome, depth)
+            for outcome in outcomes.values()
+        ) / len(configurations)
+
+    def display_report(self) -> None:
+        print("Endgames", self.endgames)
+        print("Endgame certain moves", self.certain_moves)
+        print("Endgame guesses", self.guesses, "with lookahead", self.lookahead_guesses)
+        print("Endgame budget exceeded", self.budget_exceeded)
+
+
+def visible_constraints(board: Board) -> Tuple[List[int], List[Tuple[List[int], int]]]:
+    """
+        Returns the closed cells and, for every opened cell next to closed cells,
+        its closed neighbors and the number of mines among them
+    """
+    cell_state = board.cell_state
+    neighbor_mine_count = board.neighbor_mine_count
+    neighbor_flag_count = board.neighbor_flag_count
+    closed = []
+    constraints = []
+    for cell in range(board.width * board.height):
+        state = cell_state[cell]
+        if state == CellState.Closed:
+            closed.append(cell)
+        elif state == CellState.Opened:
+            cells = [
+                neighbor
+                for neighbor in board.neighbors[cell]
+                if cell_state[neighbor] == CellState.Closed
+            ]
+            if cells:
+                constraints.append(
+                    (cells, neighbor_mine_count[cell] - neighbor_flag_count[cell])
+                )
+    return closed, constraints
+
+
+def split_constraints(
+    frontier: List[int], constraints: List[Tuple[List[int], int]]
+) -> List[Tuple[List[int], List[Tuple[List[int], int]]]]:
+    """
+        Groups the constraints into independent groups that share no cells
+    """
+    parent = {cell: cell for cell in frontier}
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    for cells, mines in constraints:
+        root = find(cells[0])
+        for cell in cells[1:]:
+            parent[find(cell)] = root
+
+    groups: Dict[int, Tuple[List[int], List[Tuple[List[int], int]]]] = {}
+    for cell in frontier:
+        groups.setdefault(find(cell), ([], []))[0].append(cell)
+    for constraint in constraints:
+        groups[find(constraint[0][0])][1].append(constraint)
+    return list(groups.values())
+
+
+def combine_components(components, interior_count: int, remaining_mines: int):
+    """
+        Counts the assignments of all closed cells. Returns the total count and
+        the exact mine probability of every boundary cell
+    """
+    from fractions import Fraction
+
+    counts = [
+        {mines: len(masks) for mines, masks in solutions.items()}
+        for cells, solutions in components
+    ]
+    total = sum(
+        count * math.comb(interior_count, remaining_mines - mines)
+        for mines, count in convolve(counts).items()
+        if 0 <= remaining_mines - mines <= interior_count
+    )
+
+    probabilities = {}
+    if total == 0:
+        return 0, probabilities
+    for i, (cells, solutions) in enumerate(components):
+        # Assignments of the other components and the interior by their mines
+        others = convolve(counts[:i] + counts[i + 1 :])
+        for mines, masks in solutions.items():
+            weight = sum(
+                count * math.comb(interior_count, remaining_mines - mines - other)
+                for other, count in others.items()
+                if 0 <= remaining_mines - mines - other <= interior_count
+            )
+            if weight == 0:
+                continue
+            for index, cell in enumerate(cells):
+                with_mine = sum(1 for mask in masks if (mask >> index) & 1)
+                probabilities[cell] = probabilities.get(cell, 0) + with_mine * weight
+    for cell in list(probabilities):
+        probabilities[cell] = Fraction(probabilities[cell], total)
+    for cells, solutions in components:
+        for cell in cells:
+            probabilities.setdefault(cell, Fraction(0))
+    return total, probabilities
+
+
+def interior_probability(
+    components, interior_count: int, remaining_mines: int, total: int
+):
+    """
+        Exact mine probability of a closed cell that touches no opened cell
+    """
+    from fractions import Fraction
+
+    counts = [
+        {mines: len(masks) for mines, masks in solutions.items()}
+        for cells, solutions in components
+    ]
+    # Every interior cell has the same share of the interior mines
+    weight = sum(
+        count
+        * math.comb(interior_count, remaining_mines - mines)
+        * (remaining_mines - mines)
+        for mines, count in convolve(counts).items()
+        if 0 <= remaining_mines - mines <= interior_count
+    )
+    return Fraction(weight, total * interior_count)
+
+
+def convolve(counts: List[Dict[int, int]]) -> Dict[int, int]:
+    """
+        Number of combined assignments by mine count
+    """
+    result = {0: 1}
+    for component in counts:
+        combined: Dict[int, int] = {}
+        for mines, count in result.items():
+            for component_mines, component_count in component.items():
+                total_mines = mines + component_mines
+                combined[total_mines] = (
+                    combined.get(total_mines, 0) + count * component_count
+                )
+        result = combined
+    return result
+
+
+def list_configurations(
+    closed: List[int], interior: List[int], components, remaining_mines: int,
+) -> List[int]:
+    """
+        Lists every assignment of mines to the closed cells as a bitmask over
+        the closed cells
+    """
+    import itertools
+
+    position = {cell: i for i, cell in enumerate(closed)}
+    # Bitmasks over the closed cells by mine count for each component
+    component_masks = []
+    for cells, solutions in components:
+        by_mines = {}
+        for mines, masks in solutions.items():
+            by_mines[mines] = [
+                sum(
+                    1 << position[cell]
+                    for index, cell in enumerate(cells)
+                    if (mask >> index) & 1
+                )
+                for mask in masks
+            ]
+        component_masks.append(by_mines)
+
+    partial = {0: [0]}
+    for by_mines in component_masks:
+        combined: Dict[int, List[int]] = {}
+        for mines, masks in partial.items():
+            for component_mines, component_list in by_mines.items():
+                if mines + component_mines > remaining_mines:
+                    continue
+                combined.setdefault(mines + component_mines, []).extend(
+                    mask | component_mask
+                    for mask in masks
+                    for component_mask in component_list
+                )
+        partial = combined
+
+    interior_bits = [1 << position[cell] for cell in interior]
+    configurations = []
+    for mines, masks in partial.items():
+        interior_mines = remaining_mines - mines
+        if not 0 <= interior_mines <= len(interior):
+            continue
+        for chosen in itertools.combinations(interior_bits, interior_mines):
+            interior_mask = sum(chosen)
+            configurations.extend(mask | interior_mask for mask in masks)
+    return configurations
+
+
+def closed_neighbor_masks(board: Board, closed: List[int]) -> List[int]:
+    position = {cell: i for i, cell in enumerate(closed)}
+    return [
+        sum(
+            1 << position[neighbor]
+            for neighbor in board.neighbors[cell]
+            if neighbor in position
+        )
+        for cell in closed
+    ]
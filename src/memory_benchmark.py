@@ -0,0 +1,377 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+
+from board import Board, BoardGenerationSettings, BoardSolver
+from results import ResultAggregator
+import benchmark
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+# Board sizes measured by default, presets or WIDTHxHEIGHTxMINES
+DEFAULT_SIZES = ["easy", "medium", "expert", "50x50x500", "100x100x2000"]
+
+# Results created to measure the size of one BoardResult
+RESULT_COUNT = 10000
+
+# Retained growth per board over the second half and the last quarter of the
+# long run that is reported as a possible leak. The free lists of the
+# interpreter fill up over the first thousands of boards, growth that levels
+# off is not a leak
+LEAK_THRESHOLD = 64
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the peak and retained memory of boards, "
+        "second-order solves and results with tracemalloc, and the memory "
+        "growth over a long run"
+    )
+    parser.add_argument(
+        "sizes",
+        nargs="*",
+        default=DEFAULT_SIZES,
+        help="Presets (easy, medium, expert) or WIDTHxHEIGHTxMINES",
+    )
+    parser.add_argument("--boards", type=int, default=20, help="Solved boards per size")
+    parser.add_argument(
+        "--solver",
+        default=BoardSolver.ScipyLinalgLstsq.name,
+        choices=[solver.name for solver in BoardSolver],
+    )
+    parser.add_argument("--random-seed", type=int, default=0)
+    parser.add_argument(
+        "--long-run",
+        type=int,
+        default=5000,
+        help="Boards of the growth run on the first size, 0 to skip",
+    )
+    parser.add_argument(
+        "--checkpoints", type=int, default=20, help="Memory samples of the growth run"
+    )
+    parser.add_argument(
+        "--gc",
+        action="store_true",
+        help="Keep the garbage collector enabled in the growth run, "
+        "the benchmark disables it",
+    )
+    parser.add_argument("--json", default=None, help="Also write the results to JSON")
+    args = parser.parse_args()
+
+    solver = BoardSolver[args.solver]
+    report = {"solver": solver.name, "sizes": []}
+
+    tracemalloc.start()
+    print(
+        "{0:<14}{1:>7}{2:>12}{3:>12}{4:>12}{5:>11}{6:>16}{7:>16}".format(
+            "Board",
+            "Cells",
+            "Alloc KiB",
+            "Solved KiB",
+            "Peak KiB",
+            "B/cell",
+            "Complex avg KiB",
+            "Complex max KiB",
+        )
+    )
+    for name in args.sizes:
+        width, height, mines = board_size(name)
+        measurement = measure_board(
+            width, height, mines, solver, args.boards, args.random_seed
+        )
+        measurement["name"] = name
+        report["sizes"].append(measurement)
+        print(
+            "{0:<14}{1:>7}{2:>12.1f}{3:>12.1f}{4:>12.1f}{5:>11.1f}{6:>16.1f}{7:>16.1f}".format(
+                name,
+                measurement["cells"],
+                measurement["allocated"] / 1024,
+                measurement["retained"] / 1024,
+                measurement["peak"] / 1024,
+                measurement["retained"] / measurement["cells"],
+                measurement["solve_complex_mean_peak"] / 1024,
+                measurement["solve_complex_max_peak"] / 1024,
+            )
+        )
+
+    report["result"] = measure_results(args.sizes[0], solver, args.random_seed)
+    print("-" * 50)
+    print("BoardResult", report["result"]["board_result"], "bytes")
+    print(
+        "ResultAggregator per board", report["result"]["aggregator_per_board"], "bytes"
+    )
+
+    if args.long_run > 0:
+        print("-" * 50)
+        report["long_run"] = measure_growth(
+            args.sizes[0],
+            solver,
+            args.long_run,
+            args.checkpoints,
+            args.random_seed,
+            args.gc,
+        )
+    tracemalloc.stop()
+
+    report["max_rss"] = max_rss()
+    print("-" * 50)
+    print("Max RSS", report["max_rss"] // 1024, "KiB")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+            f.write("\n")
+        print("Results written to", args.json)
+
+
+def board_size(name: str) -> Tuple[int, int, int]:
+    if name in benchmark.PRESETS:
+        return benchmark.PRESETS[name]
+    size = name.split("x")
+    if len(size) != 3 or not all(value.isdigit() for value in size):
+        raise ValueError("Unknown board size: " + name)
+    return tuple(int(value) for value in size)
+
+
+class MeasuringBoard(Board):
+    """
+        Board that records the peak memory of every second-order solve above
+        the memory in use when the solve started
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.solve_complex_peaks = []
+
+    def solve_complex(self, cells, include_total=False, guess=False):
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        solved = super().solve_complex(cells, include_total, guess)
+        self.solve_complex_peaks.append(tracemalloc.get_traced_memory()[1] - start)
+        return solved
+
+
+def measure_board(
+    width: int,
+    height: int,
+    mines: int,
+    solver: BoardSolver,
+    boards: int,
+    random_seed: int,
+) -> Dict:
+    """
+        Measures a board allocated for the size, the most memory it retains
+        after solving any of the boards and the peak while solving.
+        The second-order solves are measured in a second pass, since their
+        peaks are measured by resetting the peak of tracemalloc
+    """
+    seeds = list(benchmark.seed_sequence(random_seed, boards))
+
+    # Solve the boards once first, so that the imports of the solver and the
+    # caches of numpy and scipy are not counted
+    warmup_board = Board()
+    for seed in seeds:
+        warmup_board.configure_and_solve(
+            width, height, BoardGenerationSettings(mines, seed, None, True), solver
+        )
+    del warmup_board
+    gc.collect()
+
+    start = tracemalloc.get_traced_memory()[0]
+    board = Board()
+    board.allocate(width, height)
+    allocated = tracemalloc.get_traced_memory()[0] - start
+
+    retained = allocated
+    peak = allocated
+    for seed in seeds:
+        tracemalloc.reset_peak()
+        board.configure_and_solve(
+            width, height, BoardGenerationSettings(mines, seed, None, True), solver
+        )
+        current, board_peak = tracemalloc.get_traced_memory()
+        retained = max(retained, current - start)
+        peak = max(peak, board_peak - start)
+    del board
+
+    measuring_board = MeasuringBoard()
+    for seed in seeds:
+        measuring_board.configure_and_solve(
+            width, height, BoardGenerationSettings(mines, seed, None, True), solver
+        )
+    peaks = measuring_board.solve_complex_peaks
+    del measuring_board
+    gc.collect()
+
+    return {
+        "width": width,
+        "height": height,
+        "mines": mines,
+        "cells": width * height,
+        "allocated": allocated,
+        "retained": retained,
+        "peak": peak,
+        "solve_complex_calls": len(peaks),
+        "solve_complex_mean_peak": sum(peaks) / len(peaks) if peaks else 0.0,
+        "solve_complex_max_peak": max(peaks) if peaks else 0,
+    }
+
+
+def measure_results(name: str, solver: BoardSolver, random_seed: int) -> Dict:
+    """
+        Measures one BoardResult and the memory a ResultAggregator keeps per board
+    """
+    width, height, mines = board_size(name)
+    board = Board()
+    board.configure_and_solve(
+        width, height, BoardGenerationSettings(mines, random_seed, None, True), solver
+    )
+
+    gc.collect()
+    start = tracemalloc.get_traced_memory()[0]
+    results = [board.get_result() for i in range(RESULT_COUNT)]
+    board_result = (tracemalloc.get_traced_memory()[0] - start) / RESULT_COUNT
+
+    aggregator = ResultAggregator()
+    # The first boards fill the list of the slowest boards
+    for result in results[:100]:
+        aggregator.add(result, 0.001)
+    start = tracemalloc.get_traced_memory()[0]
+    for result in results[100:]:
+        aggregator.add(result, 0.001)
+    aggregator_per_board = (tracemalloc.get_traced_memory()[0] - start) / (
+        RESULT_COUNT - 100
+    )
+
+    return {"board_result": board_result, "aggregator_per_board": aggregator_per_board}
+
+
+def measure_growth(
+    name: str,
+    solver: BoardSolver,
+    boards: int,
+    checkpoints: int,
+    random_seed: int,
+    enable_gc=False,
+) -> Dict:
+    """
+        Solves boards like run_benchmark and samples the traced memory at
+        checkpoints. The growth per board is fitted over the second half and
+        the last quarter of the run, after the caches have filled. Lists the
+        lines that allocated the most memory retained since the middle of the run
+    """
+    board_setup = benchmark.get_board_setup(name)
+    aggregator = ResultAggregator()
+    seeds = benchmark.seed_sequence(random_seed, boards)
+    interval = max(1, boards // checkpoints)
+
+    gc_enabled = gc.isenabled()
+    if enable_gc:
+        gc.enable()
+    else:
+        gc.disable()
+    samples: List[Tuple[int, int]] = []
+    middle_snapshot = None
+    try:
+        benchmark.toggle_output(False)
+        for i in range(1, boards + 1):
+            board_setup(aggregator, True, solver, seeds)
+            if i % interval == 0 or i == boards:
+                # The snapshot is taken first, so that the memory it holds is
+                # in every sample of the second half
+                if middle_snapshot is None and i >= boards // 2:
+                    middle_snapshot = take_snapshot()
+                samples.append((i, tracemalloc.get_traced_memory()[0]))
+        end_snapshot = take_snapshot()
+    finally:
+        benchmark.toggle_output(True)
+        benchmark.close_board_setup(board_setup)
+        if gc_enabled:
+            gc.enable()
+        else:
+            gc.disable()
+
+    growth = fit_slope([sample for sample in samples if sample[0] >= boards // 2])
+    last_quarter_growth = fit_slope(
+        [sample for sample in samples if sample[0] >= boards * 3 // 4]
+    )
+    print("Growth run", name, boards, "boards, gc", "on" if enable_gc else "off")
+    print("{0:>8}{1:>14}".format("Boards", "Traced KiB"))
+    for index, current in samples:
+        print("{0:>8}{1:>14.1f}".format(index, current / 1024))
+    print("Growth over the second half", round(growth, 1), "bytes per board")
+    print(
+        "Growth over the last quarter", round(last_quarter_growth, 1), "bytes per board"
+    )
+    if growth > LEAK_THRESHOLD and last_quarter_growth > LEAK_THRESHOLD:
+        print("Possible leak, growth above", LEAK_THRESHOLD, "bytes per board")
+
+    top_growth = []
+    differences = end_snapshot.compare_to(middle_snapshot, "lineno")
+    differences.sort(key=lambda difference: -difference.size_diff)
+    for difference in differences[:5]:
+        if difference.size_diff <= 0:
+            break
+        top_growth.append(
+            {
+                "location": str(difference.traceback),
+                "bytes": difference.size_diff,
+                "blocks": difference.count_diff,
+            }
+        )
+        print(
+            "  {0:>10} bytes {1:>6} blocks  {2}".format(
+                difference.size_diff, difference.count_diff, difference.traceback
+            )
+        )
+
+    return {
+        "name": name,
+        "boards": boards,
+        "gc": enable_gc,
+        "samples": samples,
+        "growth_per_board": growth,
+        "last_quarter_growth_per_board": last_quarter_growth,
+        "top_growth": top_growth,
+    }
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    # Without the memory of the snapshots themselves
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+
+
+def fit_slope(samples: List[Tuple[int, int]]) -> float:
+    """
+        Least-squares slope of (x, y) samples
+    """
+    if len(samples) < 2:
+        return 0.0
+    mean_x = sum(x for x, y in samples) / len(samples)
+    mean_y = sum(y for x, y in samples) / len(samples)
+    variance = sum((x - mean_x) ** 2 for x, y in samples)
+    if variance == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in samples) / variance
+
+
+def max_rss() -> int:
+    """
+        Peak resident set size of the process in bytes, 0 where unavailable
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+if __name__ == "__main__":
+    main()
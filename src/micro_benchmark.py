@@ -0,0 +1,314 @@
+from board import (
+    BoardGenerationSettings,
+    BoardSolver,
+    CellState,
+    PORTFOLIO_FAST_SOLVERS,
+    RecordingBoard,
+    build_neighbor_table,
+    clean_solution,
+    has_certain_value,
+)
+from typing import Callable, Dict, List, Tuple
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+# Stored per-call times relative to the calibration loop that the current run
+# is compared against
+THRESHOLDS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "micro_benchmark_thresholds.json"
+)
+
+# All snapshots are taken from fixed expert boards so that runs are comparable
+SNAPSHOT_WIDTH = 30
+SNAPSHOT_HEIGHT = 16
+SNAPSHOT_MINES = 99
+SNAPSHOT_SEED = 3283476030983952662
+SYSTEM_SEEDS = [1, 2, 3]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmarks for the hot-path methods of the solver"
+    )
+    parser.add_argument(
+        "--filter", default=None, help="Only run benchmarks containing this text"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed slowdown relative to the stored threshold (0.5 = 50%%)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--update-thresholds",
+        action="store_true",
+        help="Store the measured time ratios as the new thresholds",
+    )
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    args = parser.parse_args()
+
+    passed = run_micro_benchmarks(
+        args.filter,
+        args.tolerance,
+        args.repeat,
+        args.update_thresholds,
+        args.thresholds,
+    )
+    sys.exit(0 if passed else 1)
+
+
+def snapshot_settings(seed=SNAPSHOT_SEED):
+    return BoardGenerationSettings(SNAPSHOT_MINES, seed, None, True)
+
+
+def record_game(seed):
+    board = RecordingBoard()
+    start_position = board.configure(
+        SNAPSHOT_WIDTH, SNAPSHOT_HEIGHT, snapshot_settings(seed)
+    )
+    fresh_state = board.save_state()
+    board.solve(start_position)
+    return board, start_position, fresh_state
+
+
+def collect_benchmarks() -> List[Tuple[str, Callable[[], None]]]:
+    """
+        Builds the fixed snapshots and returns (name, function) pairs to time
+    """
+    board, start_position, fresh_state = record_game(SNAPSHOT_SEED)
+
+    # The second-order solve with the largest frontier is the heaviest
+    # mid-game state of the snapshot game
+    mid_state, active_cells = max(board.snapshots, key=lambda entry: len(entry[1]))
+    remaining_cells = [
+        cell
+        for cell in range(len(mid_state.satisfied))
+        if not mid_state.satisfied[cell]
+    ]
+    closed_mines = [
+        cell
+        for cell in range(len(mid_state.mine))
+        if mid_state.mine[cell] and mid_state.cell_state[cell] == CellState.Closed
+    ]
+
+    systems = []
+    for seed in SYSTEM_SEEDS:
+        systems.extend(record_game(seed)[0].systems)
+
+    # The portfolio only returns early on systems where a fast backend gives a
+    # certain move, on the others it waits for the slow guess solver
+    race_systems = [
+        (A_matrix, B_vector)
+        for A_matrix, B_vector in systems
+        if has_certain_value(
+            clean_solution(
+                board.solve_system(A_matrix, B_vector, PORTFOLIO_FAST_SOLVERS[0]),
+                board.config.snap_threshold,
+            )
+        )
+    ]
+
+    settings = snapshot_settings()
+
+    def restore_state():
+        board.restore_state(mid_state)
+
+    def link_neighbors():
+        build_neighbor_table(board.width, board.height)
+
+    def reset_cells():
+        board.reset_cells()
+
+    def generate_mines():
+        board.reset()
+        board.reset_cells()
+        board.generate_mines(settings)
+
+    def open_cell_cascade():
+        board.restore_state(fresh_state)
+        board.open_at(start_position[0], start_position[1])
+
+    def flag_cell():
+        board.restore_state(mid_state)
+        for cell in closed_mines:
+            board.flag_cell(cell)
+
+    def update_satisfied():
+        board.restore_state(mid_state)
+        for cell in remaining_cells:
+            board.update_satisfied(cell)
+
+    def solve_first_order():
+        board.restore_state(fresh_state)
+        board.open_at(start_position[0], start_position[1])
+        board.solve_first_order()
+
+    def probability_map():
+        # generate_mines resets the board, including its solver
+        board.solver = BoardSolver.ScipyLinalgLstsq
+        board.restore_state(mid_state)
+        board.probability_map()
+
+    def build_system_active():
+        board.restore_state(mid_state)
+        board.build_system(active_cells)
+
+    def build_system_total():
+        board.restore_state(mid_state)
+        board.build_system(remaining_cells, True)
+
+    benchmarks = [
+        ("Board.restore_state", restore_state),
+        ("build_neighbor_table", link_neighbors),
+        ("Board.reset_cells", reset_cells),
+        ("Board.generate_mines", generate_mines),
+        ("Board.open_cell cascade", open_cell_cascade),
+        ("Board.flag_cell", flag_cell),
+        ("Board.update_satisfied", update_satisfied),
+        ("Board.solve_first_order", solve_first_order),
+        ("Board.probability_map", probability_map),
+        ("Board.build_system active", build_system_active),
+        ("Board.build_system total", build_system_total),
+    ]
+
+    for solver in BoardSolver:
+
+        def solve_systems(solver=solver):
+            board.solver = solver
+            for A_matrix, B_vector in systems:
+                board.solve_system(A_matrix, B_vector)
+
+        if solver != BoardSolver.Portfolio:
+            benchmarks.append(("BoardSolver." + solver.name, solve_systems))
+
+    def solve_race_systems():
+        board.solver = BoardSolver.Portfolio
+        for A_matrix, B_vector in race_systems:
+            board.solve_system(A_matrix, B_vector)
+
+    benchmarks.append(("BoardSolver.Portfolio race", solve_race_systems))
+
+    return benchmarks
+
+
+def time_calibration(repeat=5) -> float:
+    """
+        Times a fixed loop over the cells and neighbors of an expert board,
+        like the hot paths of Board. The benchmarks are stored relative to its
+        time, so that the thresholds carry over between machines
+    """
+    cells = bytearray(SNAPSHOT_WIDTH * SNAPSHOT_HEIGHT)
+    neighbors = build_neighbor_table(SNAPSHOT_WIDTH, SNAPSHOT_HEIGHT)
+
+    def calibration_loop():
+        total = 0
+        for cell in range(len(cells)):
+            for neighbor in neighbors[cell]:
+                total += cells[neighbor] + 1
+        return total
+
+    return time_benchmark(calibration_loop, repeat)
+
+
+def time_benchmark(function: Callable[[], None], repeat=5) -> float:
+    """
+        Returns the best time per call in seconds
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def load_thresholds(path) -> Dict[str, float]:
+    """
+        Returns the stored time of each benchmark relative to the calibration
+        loop. Files with absolute times have no ratios and no thresholds
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("ratios", {})
+
+
+def run_micro_benchmarks(
+    name_filter=None,
+    tolerance=0.5,
+    repeat=5,
+    update_thresholds=False,
+    thresholds_path=THRESHOLDS_PATH,
+):
+    """
+        Runs the micro-benchmarks and compares them to the stored thresholds.
+        Times are divided by the time of the calibration loop in the same
+        process, so a uniformly faster or slower machine passes.
+        Returns False if any benchmark is slower than its threshold by more than tolerance
+    """
+    thresholds = load_thresholds(thresholds_path)
+    passed = True
+
+    print(
+        "{0:<36}{1:>14}{2:>12}{3:>12}  {4}".format(
+            "Benchmark", "Time (us)", "Ratio", "Threshold", "Status"
+        )
+    )
+
+    calibration_times = []
+    for name, function in collect_benchmarks():
+        if name_filter is not None and name_filter not in name:
+            continue
+
+        # The calibration loop is timed next to each benchmark, so that both
+        # see the same frequency scaling and load
+        calibration = time_calibration(repeat)
+        calibration_times.append(calibration)
+        elapsed = time_benchmark(function, repeat)
+        ratio = elapsed / calibration
+        threshold = thresholds.get(name)
+
+        if threshold is None:
+            status = "no threshold"
+        elif ratio > threshold * (1 + tolerance):
+            status = "REGRESSION {0:+.1f}%".format(100 * (ratio / threshold - 1))
+            passed = False
+        else:
+            status = "ok {0:+.1f}%".format(100 * (ratio / threshold - 1))
+
+        print(
+            "{0:<36}{1:>14.2f}{2:>12.3f}{3:>12}  {4}".format(
+                name,
+                1e6 * elapsed,
+                ratio,
+                "-" if threshold is None else "{0:.3f}".format(threshold),
+                status,
+            )
+        )
+
+        if update_thresholds:
+            thresholds[name] = ratio
+
+    if update_thresholds:
+        with open(thresholds_path, "w") as f:
+            # The calibration time is only kept for reference
+            json.dump(
+                {
+                    "calibration_seconds": min(calibration_times, default=None),
+                    "ratios": thresholds,
+                },
+                f,
+                indent=4,
+                sort_keys=True,
+            )
+            f.write("\n")
+        print("Thresholds written to", thresholds_path)
+        return True
+
+    return passed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+from __future__ import annotations
+from typing import List, Optional, Tuple
+from dataclasses import dataclass
+
+from board import (
+    Board,
+    BoardGenerationSettings,
+    BoardSolver,
+    BoardState,
+    Move,
+    MoveAction,
+    MoveTrace,
+    MOVE_RECORD,
+    decode_moves,
+)
+from corpus import pack_bits, unpack_bits
+
+import argparse
+import os
+import struct
+
+# File layout, all little-endian:
+#   header: magic, version, width, height, mines, flags, seed, start x, start y,
+#           solver, final state, elapsed seconds, dropped moves, move count
+#   mine bitmap: one bit per cell in row-major order, most significant bit first
+#   moves: action, phase, x, y, probability (see board.MOVE_RECORD)
+# Replaces the text action list written by writeboard in old_mss.py.
+# The mines are stored since corpus and no-guess boards, and boards with a
+# fixed start position, cannot be generated again from their seed
+HEADER = struct.Struct("<8sIHHIIQHHBBdQI")
+MAGIC = b"MSTRACE\0"
+VERSION = 2
+FLAG_FORCE_START_AREA = 1
+
+# Large enough to hold every move of an expert game
+REPLAY_CAPACITY = 1 << 16
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show or replay move traces dumped by the benchmark"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show_parser = subparsers.add_parser("show", help="Print the moves of a trace")
+    show_parser.add_argument("path")
+
+    replay_parser = subparsers.add_parser(
+        "replay", help="Rebuild the board from its mines and apply the moves"
+    )
+    replay_parser.add_argument("path")
+    replay_parser.add_argument(
+        "--step", action="store_true", help="Print the board after every move"
+    )
+
+    args = parser.parse_args()
+
+    trace_file = read_trace(args.path)
+    if args.command == "show":
+        print_header(trace_file)
+        for move in trace_file.moves:
+            print(move)
+    elif args.command == "replay":
+        print_header(trace_file)
+        board = replay(trace_file, args.step)
+        print(board.str_revealed())
+        print()
+        print(board.str_real())
+        print()
+        print("Replayed", board.state.name, "recorded", trace_file.state.name)
+
+
+@dataclass
+class TraceFile:
+    width: int
+    height: int
+    mines: int
+    force_start_area: bool
+    seed: int
+    start_position: Tuple[int, int]
+    # One byte (0 or 1) per cell in row-major order
+    mine: bytes
+    solver: BoardSolver
+    state: BoardState
+    elapsed: float
+    dropped: int
+    moves: List[Move]
+
+    def configure_board(self, board: Board) -> Tuple[int, int]:
+        """
+            Configures the board with the mines and start position of the traced
+            board. Returns the start position
+        """
+        return board.configure_mines(
+            self.width,
+            self.height,
+            self.mine,
+            BoardGenerationSettings(
+                self.mines, self.seed, self.start_position, self.force_start_area
+            ),
+            self.solver,
+        )
+
+
+def write_trace(path, board: Board, elapsed: float) -> None:
+    """
+        Writes the settings, mines, result and retained moves of a traced board
+    """
+    trace = board.trace
+    settings = board.settings
+    start_position = trace.start_position or (0, 0)
+
+    flags = 0
+    if settings.force_start_area:
+        flags |= FLAG_FORCE_START_AREA
+
+    data = trace.to_bytes()
+    with open(path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                board.width,
+                board.height,
+                settings.mines,
+                flags,
+                settings.seed,
+                start_position[0],
+                start_position[1],
+                board.solver.value,
+                board.state.value,
+                elapsed,
+                trace.dropped(),
+                len(data) // MOVE_RECORD.size,
+            )
+        )
+        f.write(pack_bits(bytes(board.mine)))
+        f.write(data)
+
+
+def read_trace(path) -> TraceFile:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    (
+        magic,
+        version,
+        width,
+        height,
+        mines,
+        flags,
+        seed,
+        start_x,
+        start_y,
+        solver,
+        state,
+        elapsed,
+        dropped,
+        count,
+    ) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a move trace file: " + str(path))
+
+    moves_offset = HEADER.size + (width * height + 7) // 8
+    mine = unpack_bits(data[HEADER.size : moves_offset], width * height)
+    moves = decode_moves(data[moves_offset : moves_offset + count * MOVE_RECORD.size])
+    return TraceFile(
+        width,
+        height,
+        mines,
+        bool(flags & FLAG_FORCE_START_AREA),
+        seed,
+        (start_x, start_y),
+        mine,
+        BoardSolver(solver),
+        BoardState(state),
+        elapsed,
+        dropped,
+        moves,
+    )
+
+
+def print_header(trace_file: TraceFile) -> None:
+    print("Board", trace_file.width, trace_file.height, trace_file.mines)
+    print("Seed", trace_file.seed)
+    print("Start position", trace_file.start_position)
+    print("Solver", trace_file.solver.name)
+    print("Result", trace_file.state.name, "in", 1000 * trace_file.elapsed, "ms")
+    print("Moves", len(trace_file.moves), "dropped", trace_file.dropped)
+    print()
+
+
+def replay(trace_file: TraceFile, step=False) -> Board:
+    """
+        Rebuilds the board from the mines of the trace and applies its moves.
+        If the ring buffer dropped the oldest moves, the missing moves are
+        recovered by solving the board again with the recorded solver
+    """
+    moves = trace_file.moves
+    if trace_file.dropped > 0:
+        board = Board()
+        board.trace = MoveTrace(REPLAY_CAPACITY)
+        board.solve(trace_file.configure_board(board))
+        full_moves = board.trace.moves()
+        if full_moves[trace_file.dropped :] != moves:
+            print("Warning: the solver no longer reproduces the recorded moves")
+        moves = full_moves[: trace_file.dropped] + moves
+
+    board = Board()
+    trace_file.configure_board(board)
+
+    for move in moves:
+        if board.state != BoardState.Undefined:
+            break
+
+        if move.action == MoveAction.Flag:
+            board.flag_at(move.x, move.y)
+        else:
+            board.open_at(move.x, move.y)
+
+        if step or move.action == MoveAction.Guess:
+            print(move)
+            print(board.str_revealed())
+            print()
+
+    if board.state == BoardState.Undefined and board.opened_cells == (
+        board.width * board.height - board.generated_mines
+    ):
+        board.state = BoardState.Won
+
+    return board
+
+
+class TraceDumper:
+    """
+        Records the moves of benchmarked boards and writes the traces of boards
+        that were lost or slower than latency_threshold (seconds) to directory
+    """
+
+    directory: str
+    latency_threshold: Optional[float]
+    dump_lost: bool
+    trace: MoveTrace
+    dumped: int
+
+    def __init__(
+        self, directory, latency_threshold=None, dump_lost=True, capacity=4096
+    ):
+        self.directory = directory
+        self.latency_threshold = latency_threshold
+        self.dump_lost = dump_lost
+        self.trace = MoveTrace(capacity)
+        self.dumped = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def attach(self, board: Board) -> None:
+        """
+            Starts recording the moves of the board. Call before configuring it
+        """
+        board.trace = self.trace
+
+    def finish(self, board: Board, elapsed: float) -> Optional[str]:
+        """
+            Stops recording and dumps the trace if the board was lost or slow.
+            Returns the path of the written trace
+        """
+        lost = self.dump_lost and board.state == BoardState.Lost
+        slow = self.latency_threshold is not None and elapsed > self.latency_threshold
+        if not lost and not slow:
+            board.trace = None
+            return None
+
+        path = os.path.join(
+            self.directory,
+            "{0}_{1}x{2}_{3}_{4}.mstrace".format(
+                board.solver.name,
+                board.width,
+                board.height,
+                board.settings.mines,
+                board.settings.seed,
+            ),
+        )
+        write_trace(path, board, elapsed)
+        board.trace = None
+        self.dumped += 1
+        return path
+
+
+if __name__ == "__main__":
+    main()
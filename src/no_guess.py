@@ -0,0 +1,404 @@
+from __future__ import annotations
+from typing import Iterator, List, Optional, Tuple
+
+from board import (
+    Board,
+    BoardGenerationSettings,
+    BoardSnapshot,
+    BoardSolver,
+    BoardState,
+    CellState,
+    MoveAction,
+    MovePhase,
+    MoveTrace,
+)
+from corpus import FLAG_FORCE_START_AREA, FLAG_NO_GUESS, write_corpus_records
+from endgame import EndgameSolver
+
+import argparse
+import collections
+import concurrent.futures
+import os
+import random
+import sys
+import time
+
+# Boards per task of a worker process. Every chunk has its own random seed,
+# so the output does not depend on the number of workers
+CHUNK_SIZE = 64
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate boards that can be solved from the start position "
+        "without guessing and write them as a board corpus"
+    )
+    parser.add_argument("output")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=16)
+    parser.add_argument("--mines", type=int, default=99)
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--random-seed", type=int, default=None)
+    parser.add_argument(
+        "--max-repairs",
+        type=int,
+        default=100,
+        help="Mine moves per board before starting over, 0 to only generate and check",
+    )
+    parser.add_argument(
+        "--solver",
+        default=BoardSolver.ScipyLinalgLstsq.name,
+        choices=[solver.name for solver in BoardSolver],
+    )
+    parser.add_argument(
+        "--exact-budget",
+        type=float,
+        default=1.0,
+        help="Seconds to confirm one second-order solve by counting the mine "
+        "assignments, the solver counts as stuck if it takes longer",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    totals = NoGuessGenerator(args.width, args.height, args.mines)
+    start_time = time.perf_counter()
+    write_corpus_records(
+        args.output,
+        args.width,
+        args.height,
+        args.mines,
+        args.count,
+        generate_boards(
+            totals,
+            args.count,
+            args.random_seed,
+            args.max_repairs,
+            BoardSolver[args.solver],
+            args.workers,
+            args.exact_budget,
+        ),
+        FLAG_FORCE_START_AREA | FLAG_NO_GUESS,
+    )
+    totals.display_report(time.perf_counter() - start_time)
+
+
+def generate_chunk(
+    width: int,
+    height: int,
+    mines: int,
+    count: int,
+    random_seed: int,
+    max_repairs: int,
+    solver: BoardSolver,
+    exact_budget: float,
+) -> Tuple[List[Tuple[int, Tuple[int, int], bytes]], NoGuessGenerator]:
+    generator = NoGuessGenerator(
+        width, height, mines, random_seed, max_repairs, solver, exact_budget
+    )
+    boards = [generator.generate() for i in range(count)]
+    # The board, the random generator and the exact solver are not needed
+    # for the counts
+    generator.board = None
+    generator.rng = None
+    generator.exact = None
+    return boards, generator
+
+
+def generate_boards(
+    totals: NoGuessGenerator,
+    count: int,
+    random_seed=None,
+    max_repairs=100,
+    solver=BoardSolver.ScipyLinalgLstsq,
+    workers=None,
+    exact_budget=1.0,
+) -> Iterator[Tuple[int, Tuple[int, int], bytes]]:
+    """
+        Generates count no-guess boards of the size of totals in chunks, in
+        parallel if workers > 1, and adds the generation counts to totals
+    """
+    rng = random.Random(random_seed)
+    chunks = [
+        (
+            totals.width,
+            totals.height,
+            totals.mines,
+            min(CHUNK_SIZE, count - start),
+            rng.randrange(sys.maxsize),
+            max_repairs,
+            solver,
+            exact_budget,
+        )
+        for start in range(0, count, CHUNK_SIZE)
+    ]
+
+    if workers is None or workers <= 1:
+        for chunk in chunks:
+            boards, counts = generate_chunk(*chunk)
+            totals.merge(counts)
+            yield from boards
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(generate_chunk, *chunk))
+            if len(pending) >= 2 * workers:
+                boards, counts = pending.popleft().result()
+                totals.merge(counts)
+                yield from boards
+
+        for future in pending:
+            boards, counts = future.result()
+            totals.merge(counts)
+            yield from boards
+
+
+class NoGuessGenerator:
+    """
+        Generates boards that the solver finishes from the start position using
+        deduction only.
+        A random board is solved without guessing. Whenever the solver gets stuck,
+        the board is locally repaired by moving one mine between a closed cell at
+        the boundary of the revealed area and a cell that has not been revealed
+        yet, and solving continues from the last state that did not depend on
+        either cell. A repaired board is verified once more by solving it from
+        scratch. After max_repairs moves the board is dropped and a new one drawn.
+
+        The second-order solve snaps an approximate least-squares solution, so
+        its moves are only kept if they are certain: every cell it flags or
+        opens is checked against the exact mine probabilities of endgame.py,
+        counted over all mine assignments. If a move is not certain, or the
+        counting takes longer than exact_budget seconds, the solver counts as
+        stuck at that position. Accepted boards are therefore solvable by
+        deduction alone
+    """
+
+    width: int
+    height: int
+    mines: int
+    max_repairs: int
+    solver: BoardSolver
+    exact_budget: float
+    board: Board
+    exact: EndgameSolver
+    boards: int
+    attempts: int
+    repairs: int
+    rejected: int
+    unconfirmed: int
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        mines: int,
+        random_seed=None,
+        max_repairs=100,
+        solver=BoardSolver.ScipyLinalgLstsq,
+        exact_budget=1.0,
+    ):
+        self.width = width
+        self.height = height
+        self.mines = mines
+        self.max_repairs = max_repairs
+        self.solver = solver
+        self.exact_budget = exact_budget
+        self.rng = random.Random(random_seed)
+        self.board = Board()
+        # Holds the moves of one solver step, see solve_step
+        self.board.trace = MoveTrace(width * height + 1)
+        self.exact = EndgameSolver()
+
+        self.boards = 0
+        self.attempts = 0
+        self.repairs = 0
+        self.rejected = 0
+        self.unconfirmed = 0
+
+    def generate(self) -> Tuple[int, Tuple[int, int], bytes]:
+        """
+            Returns the seed of the initial random board, the start position and
+            the mines (one byte per cell) of the next no-guess board
+        """
+        while True:
+            board = self.attempt()
+            if board is not None:
+                self.boards += 1
+                return board
+
+    def attempt(self) -> Optional[Tuple[int, Tuple[int, int], bytes]]:
+        self.attempts += 1
+        board = self.board
+        seed = self.rng.randrange(sys.maxsize)
+        settings = BoardGenerationSettings(self.mines, seed, None, True)
+        start_position = board.configure(self.width, self.height, settings, self.solver)
+        mines = bytearray(board.mine)
+        settings.start_position = start_position
+
+        board.open_at(start_position[0], start_position[1])
+        snapshots = [board.save_state()]
+
+        repairs = 0
+        while True:
+            while board.state == BoardState.Undefined and self.solve_step():
+                snapshots.append(board.save_state())
+
+            if board.state == BoardState.Won:
+                if repairs == 0 or self.verify(start_position, mines):
+                    return seed, start_position, bytes(mines)
+                # The solver reached a different position from scratch,
+                # continue repairing from there
+                snapshots = [board.save_state()]
+
+            if board.state == BoardState.Lost or repairs == self.max_repairs:
+                self.rejected += 1
+                return None
+
+            changed = self.repair(mines)
+            if changed is None:
+                self.rejected += 1
+                return None
+            repairs += 1
+            self.repairs += 1
+
+            # Resume from the last state in which the changed cells and their
+            # neighbors were all closed, their counts were not revealed there
+            while len(snapshots) > 1 and not all_closed(snapshots[-1], changed):
+                snapshots.pop()
+            if all_closed(snapshots[-1], changed):
+                board.restore_state(snapshots[-1])
+                board.replace_mines(bytes(mines))
+            else:
+                board.configure_mines(
+                    self.width, self.height, bytes(mines), settings, self.solver
+                )
+                board.open_at(start_position[0], start_position[1])
+                snapshots = [board.save_state()]
+
+    def repair(self, mines: bytearray) -> Optional[List[int]]:
+        """
+            Moves one mine into or out of a closed cell at the boundary of the
+            revealed area where the solver is stuck.
+            Returns the changed cells and their neighbors
+        """
+        board = self.board
+        cell_state = board.cell_state
+        neighbor_opened_count = board.neighbor_opened_count
+        closed = [
+            cell
+            for cell in range(board.width * board.height)
+            if cell_state[cell] == CellState.Closed
+        ]
+        boundary = [cell for cell in closed if neighbor_opened_count[cell] > 0]
+        source = self.rng.choice(boundary or closed)
+
+        # Cells that have not been revealed are preferred as the other end, so
+        # that the solving can continue from a late state. Near the end of the
+        # game, only revealed cells may be left. The start area stays empty
+        unrevealed = [
+            cell
+            for cell in closed
+            if neighbor_opened_count[cell] == 0 and mines[cell] != mines[source]
+        ]
+        if unrevealed:
+            target = self.rng.choice(unrevealed)
+        else:
+            start_cell = board.settings.start_position
+            start_area = set(
+                board.neighbors[start_cell[1] * board.width + start_cell[0]]
+            )
+            start_area.add(start_cell[1] * board.width + start_cell[0])
+            revealed = [
+                cell
+                for cell in range(board.width * board.height)
+                if cell_state[cell] != CellState.Closed
+                and mines[cell] != mines[source]
+                and cell not in start_area
+            ]
+            if not revealed:
+                return None
+            target = self.rng.choice(revealed)
+
+        mines[source] ^= 1
+        mines[target] ^= 1
+
+        changed = [source, target]
+        changed.extend(board.neighbors[source])
+        changed.extend(board.neighbors[target])
+        return changed
+
+    def solve_step(self) -> bool:
+        """
+            Performs one step of the solver without guessing. The moves of a
+            second-order solve are undone unless they are certain.
+            Returns False if the solver is stuck
+        """
+        board = self.board
+        if board.solve_first_order():
+            return True
+
+        # Only second-order solves are left in this step
+        state = board.save_state()
+        probabilities = self.exact.probabilities(board, self.exact_budget)
+        trace = board.trace
+        trace.clear()
+        if not board.solve_step(False):
+            return False
+
+        for move in trace.moves():
+            if move.phase == MovePhase.FirstOrder:
+                continue
+            cell = move.y * board.width + move.x
+            certain = 1 if move.action == MoveAction.Flag else 0
+            if probabilities is None or probabilities.get(cell) != certain:
+                self.unconfirmed += 1
+                board.restore_state(state)
+                return False
+        return True
+
+    def verify(self, start_position: Tuple[int, int], mines: bytearray) -> bool:
+        board = self.board
+        board.configure_mines(
+            self.width,
+            self.height,
+            bytes(mines),
+            BoardGenerationSettings(self.mines, None, start_position, True),
+            self.solver,
+        )
+        board.open_at(start_position[0], start_position[1])
+        while board.state == BoardState.Undefined and self.solve_step():
+            pass
+        return board.state == BoardState.Won
+
+    def merge(self, other: NoGuessGenerator) -> None:
+        self.boards += other.boards
+        self.attempts += other.attempts
+        self.repairs += other.repairs
+        self.rejected += other.rejected
+        self.unconfirmed += other.unconfirmed
+
+    def display_report(self, elapsed: float) -> None:
+        print("Board", self.width, self.height, self.mines)
+        print("No-guess boards", self.boards)
+        print("Attempts", self.attempts, "rejected", self.rejected)
+        print(
+            "Repairs per board",
+            self.repairs / float(self.boards) if self.boards > 0 else 0.0,
+        )
+        print("Second-order solves not confirmed exactly", self.unconfirmed)
+        print("Total runtime", elapsed, "seconds")
+        print(
+            "Throughput",
+            int(60 * self.boards / elapsed) if elapsed > 0 else 0,
+            "boards per minute",
+        )
+
+
+def all_closed(snapshot: BoardSnapshot, cells: List[int]) -> bool:
+    cell_state = snapshot.cell_state
+    return all(cell_state[cell] == CellState.Closed for cell in cells)
+
+
+if __name__ == "__main__":
+    main()
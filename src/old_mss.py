@@ -1,38 +1,39 @@
-import numpy.linalg
+import argparse
 import time
 import datetime
 import random
 
 saveboards = ""
 
+PRESETS = {
+    "easy": (9, 9, 10),
+    "medium": (16, 16, 40),
+    "expert": (30, 16, 99),
+}
+
 
 def main():
-    while True:
-        preset = input("Preset? (e)asy - (m)edium - e(x)pert - (n)one\n")
-        preset = preset.lower()
-        if preset == "n":
-            width = int(input("Width?\n"))
-            height = int(input("Height?\n"))
-            mines = int(input("Mines?\n"))
-        elif preset == "e":
-            width = 9
-            height = 9
-            mines = 10
-        elif preset == "m":
-            width = 16
-            height = 16
-            mines = 40
-        elif preset == "x":
-            width = 30
-            height = 16
-            mines = 99
-        else:
-            print("Bad input\n\n")
-            continue
-        repeats = int(input("Repeats?\n"))
-        break
+    # Benchmarks of the current solver are run with benchmark.py
+    parser = argparse.ArgumentParser(description="Run the original solver")
+    parser.add_argument("--preset", choices=list(PRESETS), default="expert")
+    parser.add_argument("--width", type=int, help="Custom size instead of the preset")
+    parser.add_argument("--height", type=int)
+    parser.add_argument("--mines", type=int)
+    parser.add_argument("--repeats", type=int, default=1000)
+    parser.add_argument(
+        "--save-boards", action="store_true", help="Write the actions of every game"
+    )
+    args = parser.parse_args()
+
+    width, height, mines = PRESETS[args.preset]
+    if args.width is not None or args.height is not None or args.mines is not None:
+        if args.width is None or args.height is None or args.mines is None:
+            parser.error("a custom size needs --width, --height and --mines")
+        width, height, mines = args.width, args.height, args.mines
+    repeats = args.repeats
+
     global saveboards
-    saveboards = input("Save boards? y/n\n")
+    saveboards = "y" if args.save_boards else "n"
 
     print("Starting...")
     t0 = time.perf_counter()
@@ -49,10 +50,11 @@ def main():
     print("Wins:", wins)
     print("Losses:", losses)
     print("Time taken:", time.perf_counter() - t0)
-    time.sleep(5)
 
 
 def game(width, height, mines):
+    import numpy.linalg
+
     global saveboards
     width = width
     height = height
@@ -0,0 +1,229 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from board import Board, BoardGenerationSettings, BoardSolver, BoardState
+
+if TYPE_CHECKING:
+    import numpy as np
+
+import argparse
+import mmap
+import random
+import struct
+import sys
+import time
+
+# File layout, all little-endian:
+#   header: magic, version, solver, ranking count
+#   rankings: per board size a header of width, height, mines and games per
+#             position, followed by the win rate of every start position as
+#             width * height float32 in row-major order
+# Version 1 books also held solved frontier systems, which cost more to look
+# up than to solve and are no longer read
+HEADER = struct.Struct("<8sIII")
+RANKING_HEADER = struct.Struct("<HHII")
+MAGIC = b"MSBOOK\0\0"
+VERSION = 2
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build or describe an opening book of start position rankings"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build a new book")
+    build_parser.add_argument("output")
+    build_parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=["30x16x99"],
+        help="Boards WIDTHxHEIGHTxMINES to rank the start positions of",
+    )
+    build_parser.add_argument(
+        "--ranking-games",
+        type=int,
+        default=100,
+        help="Games per start position, every position gets the same seeds",
+    )
+    build_parser.add_argument(
+        "--solver",
+        default=BoardSolver.ScipyLinalgLstsq.name,
+        choices=[solver.name for solver in BoardSolver],
+    )
+    build_parser.add_argument("--random-seed", type=int, default=None)
+
+    info_parser = subparsers.add_parser("info", help="Describe a book file")
+    info_parser.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.ranking_games < 1:
+            parser.error("--ranking-games must be at least 1")
+        start_time = time.perf_counter()
+        build_book(
+            args.output,
+            [tuple(int(value) for value in size.split("x")) for size in args.sizes],
+            BoardSolver[args.solver],
+            args.ranking_games,
+            args.random_seed,
+        )
+        print("Built in", time.perf_counter() - start_time, "seconds")
+    elif args.command == "info":
+        with OpeningBook(args.path) as book:
+            print_info(book)
+
+
+def print_info(book: OpeningBook) -> None:
+    print("Solver", book.solver.name)
+    for (width, height, mines), (games, win_rates) in book.rankings.items():
+        print("Start positions", width, height, mines, "from", games, "games each")
+        x, y = book.start_position(width, height, mines)
+        print("Best", (x, y), "win rate", float(win_rates[y, x]))
+        print("Worst win rate", float(win_rates.min()))
+
+
+class OpeningBook:
+    """
+        Read-only, memory-mapped table of start position rankings by estimated
+        win rate per board size. The pages are shared between all processes
+        that open the same file
+    """
+
+    solver: BoardSolver
+    rankings: Dict[Tuple[int, int, int], Tuple[int, np.ndarray]]
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.file.close()
+            raise
+
+        try:
+            if len(self.data) < HEADER.size:
+                raise ValueError("Not an opening book file: " + str(path))
+            magic, version, solver, ranking_count = HEADER.unpack_from(self.data)
+            if magic != MAGIC:
+                raise ValueError("Not an opening book file: " + str(path))
+            if version != VERSION:
+                raise ValueError(
+                    "Opening book version %d is not supported, rebuild it: %s"
+                    % (version, path)
+                )
+
+            self.solver = BoardSolver(solver)
+            self.rankings = {}
+            offset = HEADER.size
+            for i in range(ranking_count):
+                width, height, mines, games = RANKING_HEADER.unpack_from(
+                    self.data, offset
+                )
+                offset += RANKING_HEADER.size
+                win_rates = np.frombuffer(
+                    self.data, np.float32, width * height, offset
+                ).reshape(height, width)
+                offset += win_rates.nbytes
+                self.rankings[(width, height, mines)] = (games, win_rates)
+        except (ValueError, struct.error):
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        # The arrays are views of the mapping and have to go first
+        self.rankings = {}
+        self.data.close()
+        self.file.close()
+
+    def start_position(self, width: int, height: int, mines: int):
+        """
+            Returns the start position with the highest win rate for the board
+            size, None if the book has no ranking for it
+        """
+        import numpy as np
+
+        ranking = self.rankings.get((width, height, mines))
+        if ranking is None:
+            return None
+        y, x = np.unravel_index(int(ranking[1].argmax()), ranking[1].shape)
+        return int(x), int(y)
+
+
+def rank_start_positions(
+    width: int,
+    height: int,
+    mines: int,
+    games: int,
+    solver=BoardSolver.ScipyLinalgLstsq,
+    rng=None,
+):
+    """
+        Estimates the win rate of every start position by solving games boards
+        from it. Every position is solved with the same seeds, so that the
+        ranking compares positions rather than the luck of their boards.
+        Positions that are mirror images of each other share their games
+    """
+    import numpy as np
+
+    rng = rng or random.Random()
+    seeds = [rng.randrange(sys.maxsize) for i in range(games)]
+    board = Board()
+    win_rates = np.zeros((height, width), dtype=np.float32)
+    for y in range((height + 1) // 2):
+        for x in range((width + 1) // 2):
+            wins = 0
+            for seed in seeds:
+                board.configure_and_solve(
+                    width,
+                    height,
+                    BoardGenerationSettings(mines, seed, (x, y), True),
+                    solver,
+                )
+                wins += board.state == BoardState.Won
+            for mirror_y in {y, height - 1 - y}:
+                for mirror_x in {x, width - 1 - x}:
+                    win_rates[mirror_y, mirror_x] = wins / games
+    return win_rates
+
+
+def build_book(
+    path,
+    sizes: List[Tuple[int, int, int]],
+    solver=BoardSolver.ScipyLinalgLstsq,
+    ranking_games=100,
+    random_seed=None,
+) -> None:
+    """
+        Ranks the start positions of every size with ranking_games games per
+        position and writes the rankings to path
+    """
+    rng = random.Random(random_seed)
+    rankings = [
+        (
+            width,
+            height,
+            mines,
+            rank_start_positions(width, height, mines, ranking_games, solver, rng),
+        )
+        for width, height, mines in sizes
+    ]
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, solver.value, len(rankings)))
+        for width, height, mines, win_rates in rankings:
+            f.write(RANKING_HEADER.pack(width, height, mines, ranking_games))
+            f.write(win_rates.tobytes())
+
+
+if __name__ == "__main__":
+    main()
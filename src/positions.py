@@ -0,0 +1,320 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from board import (
+    Board,
+    BoardGenerationSettings,
+    BoardSolver,
+    BoardState,
+    REVEALED_GLYPHS,
+)
+from endgame import EndgameSolver
+
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+# Input format: every position starts with a header line
+#   @ <total mines> [<id>]
+# followed by one line per row with the glyphs of Board.str_revealed.
+# Empty lines are skipped. All rows of a position must have the same width,
+# opened cells without neighboring mines are " " or 0
+HEADER_PREFIX = "@"
+
+# Board and exact solver reused by all positions solved in a worker process
+worker_board: Optional[Board] = None
+worker_exact: Optional[EndgameSolver] = None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Solve a file of board positions for certain moves and "
+        "mine probabilities, writing one JSON line per position"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    solve_parser = subparsers.add_parser("solve", help="Solve a file of positions")
+    solve_parser.add_argument("input", help="Position file, - for stdin")
+    solve_parser.add_argument("output", help="JSON lines file, - for stdout")
+    solve_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    solve_parser.add_argument("--chunk-size", type=int, default=256)
+    solve_parser.add_argument(
+        "--solver",
+        default=BoardSolver.ScipyLinalgLstsq.name,
+        choices=[solver.name for solver in BoardSolver],
+    )
+    solve_parser.add_argument(
+        "--no-probabilities",
+        action="store_true",
+        help="Only write the certain moves of each position",
+    )
+    solve_parser.add_argument(
+        "--exact-budget",
+        type=float,
+        default=1.0,
+        help="Seconds to prove the certain moves of a position by counting its "
+        "mine assignments, none are reported if it takes longer",
+    )
+
+    sample_parser = subparsers.add_parser(
+        "sample", help="Write positions from the first moves of generated games"
+    )
+    sample_parser.add_argument("output")
+    sample_parser.add_argument("--count", type=int, required=True)
+    sample_parser.add_argument("--width", type=int, default=30)
+    sample_parser.add_argument("--height", type=int, default=16)
+    sample_parser.add_argument("--mines", type=int, default=99)
+    sample_parser.add_argument("--random-seed", type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "solve":
+        start_time = time.perf_counter()
+        with open_text(args.input, "r") as input_file, open_text(
+            args.output, "w"
+        ) as output_file:
+            count = solve_positions(
+                input_file,
+                output_file,
+                args.workers,
+                args.chunk_size,
+                BoardSolver[args.solver],
+                not args.no_probabilities,
+                args.exact_budget,
+            )
+        elapsed = time.perf_counter() - start_time
+        print(
+            "Solved",
+            count,
+            "positions in",
+            elapsed,
+            "seconds,",
+            int(60 * count / elapsed) if elapsed > 0 else 0,
+            "per minute",
+            file=sys.stderr,
+        )
+    elif args.command == "sample":
+        write_sample_positions(
+            args.output,
+            args.count,
+            args.width,
+            args.height,
+            args.mines,
+            args.random_seed,
+        )
+
+
+def open_text(path, mode) -> TextIO:
+    if path == "-":
+        # Do not close the standard streams when done
+        return os.fdopen(
+            os.dup((sys.stdin if mode == "r" else sys.stdout).fileno()),
+            mode,
+            encoding="utf-8",
+        )
+    return open(path, mode, encoding="utf-8")
+
+
+def read_positions(lines: Iterable[str]) -> Iterator[Tuple[str, str, List[str]]]:
+    """
+        Yields (id, total mines, rows) for each position, reading one line at a time.
+        The total mines are the text of the header, parsed when the position is
+        solved so that a malformed header gives an error line for its position
+    """
+    header = None
+    rows: List[str] = []
+    index = 0
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith(HEADER_PREFIX):
+            if header is not None:
+                yield header[0], header[1], rows
+            fields = line[len(HEADER_PREFIX) :].split()
+            position_id = fields[1] if len(fields) > 1 else str(index)
+            header = (position_id, fields[0] if fields else "")
+            rows = []
+            index += 1
+        elif header is not None and line:
+            rows.append(line)
+
+    if header is not None:
+        yield header[0], header[1], rows
+
+
+def solve_position(
+    board: Board,
+    position_id: str,
+    mines: int,
+    rows: List[str],
+    solver=BoardSolver.ScipyLinalgLstsq,
+    include_probabilities=True,
+    exact: Optional[EndgameSolver] = None,
+    exact_budget=1.0,
+) -> Dict:
+    """
+        Loads the position into board and returns its certain moves and,
+        optionally, the least-squares mine probability of every cell.
+        The certain moves are proven by counting every mine assignment with
+        exact. If that takes longer than exact_budget seconds, no moves are
+        reported and exact is False in the result
+    """
+    if not rows:
+        raise ValueError("Position has no rows")
+    values = [list(map(REVEALED_GLYPHS.__getitem__, row)) for row in rows]
+    board.load_revealed(values, mines)
+    board.solver = solver
+
+    result = {"id": position_id, "width": board.width, "height": board.height}
+    if board.state == BoardState.Lost:
+        result["lost"] = True
+        return result
+
+    if exact is None:
+        exact = EndgameSolver()
+    # Snapped least-squares values are estimates, only counting proves a move
+    exact_probabilities = exact.probabilities(board, exact_budget)
+    result["exact"] = exact_probabilities is not None
+    result["safe"] = []
+    result["mines"] = []
+    if exact_probabilities is not None:
+        for cell in sorted(exact_probabilities):
+            probability = exact_probabilities[cell]
+            if probability == 0 or probability == 1:
+                result["safe" if probability == 0 else "mines"].append(
+                    [cell % board.width, cell // board.width]
+                )
+
+    if include_probabilities:
+        import numpy as np
+
+        result["probabilities"] = np.round(board.probability_map(), 4).ravel().tolist()
+    return result
+
+
+def solve_chunk(
+    chunk: List[Tuple[str, str, List[str]]],
+    solver=BoardSolver.ScipyLinalgLstsq,
+    include_probabilities=True,
+    exact_budget=1.0,
+) -> str:
+    """
+        Solves a chunk of positions on the board of the current process.
+        Returns the JSON lines of the results
+    """
+    global worker_board, worker_exact
+    if worker_board is None:
+        worker_board = Board()
+        worker_exact = EndgameSolver()
+    board = worker_board
+
+    lines = []
+    for position_id, mines, rows in chunk:
+        try:
+            result = solve_position(
+                board,
+                position_id,
+                int(mines),
+                rows,
+                solver,
+                include_probabilities,
+                worker_exact,
+                exact_budget,
+            )
+        except (KeyError, ValueError) as e:
+            result = {"id": position_id, "error": repr(e)}
+        lines.append(json.dumps(result, separators=(",", ":")))
+        lines.append("\n")
+    return "".join(lines)
+
+
+def init_worker():
+    # One process per core already, keep BLAS from starting threads of its own.
+    # NumPy is imported lazily by the board, so this is in time
+    os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+
+def solve_positions(
+    input_file: TextIO,
+    output_file: TextIO,
+    workers=None,
+    chunk_size=256,
+    solver=BoardSolver.ScipyLinalgLstsq,
+    include_probabilities=True,
+    exact_budget=1.0,
+) -> int:
+    """
+        Streams positions from input_file to results in output_file in input order.
+        At most two chunks per worker are in flight, so memory use does not
+        depend on the size of the input. Returns the number of positions solved
+    """
+    positions = read_positions(input_file)
+    chunks = iter(lambda: list(itertools.islice(positions, chunk_size)), [])
+    count = 0
+
+    if workers is None or workers <= 1:
+        for chunk in chunks:
+            output_file.write(
+                solve_chunk(chunk, solver, include_probabilities, exact_budget)
+            )
+            count += len(chunk)
+        return count
+
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, initializer=init_worker
+    ) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(
+                (
+                    len(chunk),
+                    executor.submit(
+                        solve_chunk, chunk, solver, include_probabilities, exact_budget
+                    ),
+                )
+            )
+
+            # Write finished chunks in order before reading more input
+            if len(pending) >= 2 * workers:
+                chunk_count, future = pending.popleft()
+                output_file.write(future.result())
+                count += chunk_count
+
+        for chunk_count, future in pending:
+            output_file.write(future.result())
+            count += chunk_count
+
+    return count
+
+
+def write_sample_positions(
+    path, count: int, width: int, height: int, mines: int, random_seed=None
+) -> None:
+    """
+        Writes count positions reached by opening the start position of
+        generated games and applying the first-order rules
+    """
+    rng = random.Random(random_seed)
+    board = Board()
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(count):
+            seed = rng.randrange(sys.maxsize)
+            start_position = board.configure(
+                width, height, BoardGenerationSettings(mines, seed, None, True)
+            )
+            board.open_at(start_position[0], start_position[1])
+            board.solve_first_order()
+            f.write("{0} {1} {2}\n".format(HEADER_PREFIX, mines, seed))
+            f.write(board.str_revealed())
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
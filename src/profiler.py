@@ -0,0 +1,306 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Tuple
+
+import marshal
+import os
+import sys
+
+# pstats keys functions by (file, line, name), builtins have the file "~"
+FunctionKey = Tuple[str, int, str]
+
+# Phases of solving a board by (file, function). Phases nest, the second-order
+# solve includes the linear systems and the endgame
+PHASES = [
+    ("Generation", "board.py", "configure"),
+    ("Generation", "board.py", "configure_mines"),
+    ("Generation", "corpus.py", "configure_board"),
+    ("First order", "board.py", "solve_first_order"),
+    ("Second order", "board.py", "solve_complex"),
+    ("Linear systems", "board.py", "solve_system"),
+    ("Endgame", "endgame.py", "solve"),
+    ("Probability map", "board.py", "probability_map"),
+]
+
+# Calls of Board.solve_system by backend, by (library directory or file, function)
+BACKEND_CALLS = [
+    ("ScipyLinalgLstsq", "scipy", "lstsq"),
+    ("ScipyOptimizeLsqLinear", "scipy", "lsq_linear"),
+    ("ScipySparseLinalgLsqr", "scipy", "lsqr"),
+    ("ScipySparseLinalgLsmr", "scipy", "lsmr"),
+    ("NumpyLinalgLstsq", "numpy", "lstsq"),
+    ("Portfolio", "board.py", "solve_portfolio"),
+    ("Auto dispatch", "dispatch.py", "choose"),
+]
+
+# Stack branches below a microsecond are left out of the collapsed stacks
+MIN_STACK_TIME = 1e-6
+
+
+def parse_board_range(spec: str) -> range:
+    """
+        Board indices of START:STOP[:STEP], STOP may be empty for all boards
+    """
+    parts = spec.split(":")
+    if not 1 <= len(parts) <= 3:
+        raise ValueError("Boards must be START:STOP[:STEP]: " + spec)
+    start = int(parts[0]) if parts[0] else 0
+    stop = int(parts[1]) if len(parts) > 1 and parts[1] else sys.maxsize
+    step = int(parts[2]) if len(parts) > 2 and parts[2] else 1
+    return range(start, stop, step)
+
+
+class BoardProfiler:
+    """
+        Profiles the boards of a benchmark run whose index is in boards with
+        cProfile. Profiles of worker processes are merged into one.
+        Time is attributed to the phases of solving a board and the backends
+        of Board.solve_system, and written as pstats data, collapsed stacks for
+        flame graph tools and a table of the hottest functions.
+        Profiled boards are slower, their times include the profiler overhead
+    """
+
+    boards: range
+    stats: Dict[FunctionKey, Tuple]
+    profiled_boards: int
+
+    def __init__(self, boards=range(sys.maxsize)):
+        self.boards = boards
+        self.stats = {}
+        self.profiled_boards = 0
+
+    def wrap(self, board_setup: Callable, index: int) -> Callable:
+        """
+            Returns board_setup, profiled if the board index is in boards
+        """
+        if index not in self.boards:
+            return board_setup
+
+        def profiled_board_setup(*args):
+            import cProfile
+
+            profile = cProfile.Profile()
+            profile.runcall(board_setup, *args)
+            profile.create_stats()
+            self.merge(profile.stats, 1)
+
+        return profiled_board_setup
+
+    def merge(self, stats: Dict[FunctionKey, Tuple], boards: int) -> None:
+        """
+            Adds the pstats data of profiled boards, such as the stats of
+            a profiler in a worker process
+        """
+        import pstats
+
+        own_stats = self.stats
+        for function, function_stats in stats.items():
+            if function in own_stats:
+                own_stats[function] = pstats.add_func_stats(
+                    own_stats[function], function_stats
+                )
+            else:
+                own_stats[function] = function_stats
+        self.profiled_boards += boards
+
+    def total_time(self) -> float:
+        return sum(function_stats[2] for function_stats in self.stats.values())
+
+    def phase_times(self) -> List[Tuple[str, int, float]]:
+        """
+            Returns the calls and cumulative time of each phase
+        """
+        phases: Dict[str, Tuple[int, float]] = {}
+        for name, file_name, function_name in PHASES:
+            calls, time = phases.get(name, (0, 0.0))
+            for (path, line, function), function_stats in self.stats.items():
+                if function == function_name and os.path.basename(path) == file_name:
+                    calls += function_stats[1]
+                    time += function_stats[3]
+            phases[name] = (calls, time)
+        return [(name, calls, time) for name, (calls, time) in phases.items()]
+
+    def backend_times(self) -> List[Tuple[str, int, float]]:
+        """
+            Returns the calls and cumulative time of the functions called by
+            Board.solve_system, by backend. Library functions behind a wrapper,
+            such as the batching decorator of scipy.linalg, are found one call
+            further down. The lazy imports of the first solve are listed apart
+        """
+        callees: Dict[FunctionKey, List[FunctionKey]] = {}
+        for function, function_stats in self.stats.items():
+            for caller in function_stats[4]:
+                callees.setdefault(caller, []).append(function)
+
+        backends: Dict[str, Tuple[int, float]] = {}
+        for function, function_stats in self.stats.items():
+            calls = 0
+            time = 0.0
+            for caller, caller_stats in function_stats[4].items():
+                if caller[2] == "solve_system" and os.path.basename(caller[0]) == (
+                    "board.py"
+                ):
+                    calls += caller_stats[1]
+                    time += caller_stats[3]
+            if calls == 0:
+                continue
+
+            name = backend_name(function)
+            if name is None:
+                name = next(
+                    filter(None, map(backend_name, callees.get(function, []))), "Other",
+                )
+            backend_calls, backend_time = backends.get(name, (0, 0.0))
+            backends[name] = (backend_calls + calls, backend_time + time)
+        return sorted(
+            ((name, calls, time) for name, (calls, time) in backends.items()),
+            key=lambda backend: -backend[2],
+        )
+
+    def collapsed_stacks(self) -> Dict[str, float]:
+        """
+            Returns the self time of each call stack, keyed by the functions
+            separated by semicolons. cProfile only records callers and callees,
+            so the time of a function is split between its callers in proportion
+            to the time of each call. Recursive calls are folded into the caller.
+            The time of every stack is split exactly between its own time and its
+            callees, so the stacks of a root add up to its cumulative time
+        """
+        callees: Dict[FunctionKey, List[Tuple[FunctionKey, float]]] = {}
+        for function, function_stats in self.stats.items():
+            for caller, caller_stats in function_stats[4].items():
+                callees.setdefault(caller, []).append((function, caller_stats[3]))
+
+        stacks: Dict[str, float] = {}
+
+        def visit(function: FunctionKey, stack: List[FunctionKey], time: float):
+            total_calls, calls, own_time, cumulative_time, callers = self.stats[
+                function
+            ]
+            children = [
+                (callee, callee_time)
+                for callee, callee_time in callees.get(function, [])
+                if callee not in stack
+            ]
+            # Calls into recursive functions are counted in the time of more
+            # than one call, scale them down to the time spent in callees
+            children_time = sum(callee_time for callee, callee_time in children)
+            share = time / cumulative_time if cumulative_time > 0 else 0.0
+            if children_time > cumulative_time - own_time:
+                share *= max(cumulative_time - own_time, 0.0) / children_time
+
+            self_time = time
+            for callee, callee_time in children:
+                callee_time *= share
+                if callee_time >= MIN_STACK_TIME:
+                    self_time -= callee_time
+                    stack.append(callee)
+                    visit(callee, stack, callee_time)
+                    stack.pop()
+            if self_time > 0:
+                key = ";".join(function_label(frame) for frame in stack)
+                stacks[key] = stacks.get(key, 0.0) + self_time
+
+        for function, function_stats in self.stats.items():
+            # Roots of the profiled calls, except for stopping the profiler
+            if not function_stats[4] and "_lsprof" not in function[2]:
+                visit(function, [function], function_stats[3])
+        return stacks
+
+    def top_functions(self, count=20) -> List[Tuple[FunctionKey, Tuple]]:
+        return sorted(self.stats.items(), key=lambda item: -item[1][2])[:count]
+
+    def display_report(self, top=20, file=None) -> None:
+        total = self.total_time()
+        print("Profiled boards", self.profiled_boards, file=file)
+        print("Profiled time", total, "seconds", file=file)
+        if total <= 0:
+            return
+
+        print(file=file)
+        print(
+            "{0:<20} {1:>10} {2:>12} {3:>7}".format(
+                "Phase", "calls", "cumulative s", "share"
+            ),
+            file=file,
+        )
+        for name, calls, time in self.phase_times():
+            print(
+                "{0:<20} {1:>10} {2:>12.4f} {3:>6.1%}".format(
+                    name, calls, time, time / total
+                ),
+                file=file,
+            )
+
+        print(file=file)
+        print(
+            "{0:<24} {1:>10} {2:>12} {3:>7}".format(
+                "Backend", "calls", "cumulative s", "share"
+            ),
+            file=file,
+        )
+        for name, calls, time in self.backend_times():
+            print(
+                "{0:<24} {1:>10} {2:>12.4f} {3:>6.1%}".format(
+                    name, calls, time, time / total
+                ),
+                file=file,
+            )
+
+        print(file=file)
+        print(
+            "{0:>10} {1:>10} {2:>12} {3:>7}  {4}".format(
+                "calls", "self s", "cumulative s", "share", "function"
+            ),
+            file=file,
+        )
+        for function, function_stats in self.top_functions(top):
+            print(
+                "{0:>10} {1:>10.4f} {2:>12.4f} {3:>6.1%}  {4}".format(
+                    function_stats[1],
+                    function_stats[2],
+                    function_stats[3],
+                    function_stats[2] / total,
+                    function_label(function),
+                ),
+                file=file,
+            )
+
+    def write(self, prefix: str, top=20) -> List[str]:
+        """
+            Writes prefix.pstats (readable by pstats and snakeviz),
+            prefix.collapsed (one "stack microseconds" line per call stack, for
+            flamegraph.pl and speedscope) and the report as prefix.txt.
+            Returns the written paths
+        """
+        paths = [prefix + ".pstats", prefix + ".collapsed", prefix + ".txt"]
+        with open(paths[0], "wb") as f:
+            marshal.dump(self.stats, f)
+        with open(paths[1], "w") as f:
+            for stack, time in sorted(self.collapsed_stacks().items()):
+                microseconds = round(time * 1e6)
+                if microseconds > 0:
+                    f.write("{0} {1}\n".format(stack, microseconds))
+        with open(paths[2], "w") as f:
+            self.display_report(top, f)
+        return paths
+
+
+def backend_name(function: FunctionKey) -> Optional[str]:
+    path, line, name = function
+    if path.startswith("<frozen importlib"):
+        return "Imports"
+    for backend, library, backend_function in BACKEND_CALLS:
+        if name == backend_function and library in path.split(os.sep):
+            return backend
+    return None
+
+
+def function_label(function: FunctionKey) -> str:
+    path, line, name = function
+    if path == "~":
+        # Builtins, such as <built-in method numpy.array>
+        label = name
+    else:
+        label = "{0}:{1}({2})".format(os.path.basename(path), line, name)
+    # Semicolons separate the frames of a collapsed stack
+    return label.replace(";", ",")
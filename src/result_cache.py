@@ -0,0 +1,292 @@
+from __future__ import annotations
+from typing import Dict, Optional, Tuple
+
+from board import BoardResult, BoardSolver, BoardState
+
+import ast
+import hashlib
+import itertools
+import os
+import sqlite3
+
+# Every solver shares the code of board.py outside of the backend branches of
+# Board.solve_system. A backend is fingerprinted by the shared code, its own
+# branch and the versions of the libraries it calls, so editing one backend
+# only invalidates the cached boards of that backend
+BACKEND_LIBRARIES = {
+    BoardSolver.ScipyLinalgLstsq: ["numpy", "scipy"],
+    BoardSolver.ScipyOptimizeLsqLinear: ["numpy", "scipy"],
+    BoardSolver.ScipySparseLinalgLsqr: ["numpy", "scipy"],
+    BoardSolver.ScipySparseLinalgLsmr: ["numpy", "scipy"],
+    BoardSolver.NumpyLinalgLstsq: ["numpy"],
+    BoardSolver.Auto: ["numpy", "scipy"],
+}
+
+# The portfolio accepts whichever backend finishes first, so its outcome
+# depends on thread scheduling and is not cached
+UNCACHED_SOLVERS = {BoardSolver.Portfolio}
+
+# Rows written between commits
+COMMIT_INTERVAL = 1000
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+COST_MODEL_FILE = "dispatch_cost_model.json"
+
+solver_fingerprints: Dict[BoardSolver, Optional[str]] = {}
+
+
+def read_source(name: str) -> str:
+    with open(os.path.join(SOURCE_DIRECTORY, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def split_backends(source: str) -> Tuple[str, Dict[str, str]]:
+    """
+        Returns the source of board.py without the backend branches of
+        Board.solve_system and the source of each branch by solver name
+    """
+    tree = ast.parse(source)
+    lines = source.splitlines(keepends=True)
+    branch_lines = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.FunctionDef) or node.name != "solve_system":
+            continue
+        for statement in node.body:
+            # The chain of "if solver == BoardSolver.X: ... elif ..." branches
+            while isinstance(statement, ast.If):
+                test = statement.test
+                if not (
+                    isinstance(test, ast.Compare)
+                    and isinstance(test.comparators[0], ast.Attribute)
+                    and isinstance(test.comparators[0].value, ast.Name)
+                    and test.comparators[0].value.id == "BoardSolver"
+                ):
+                    break
+                # The lines after the condition, including leading comments
+                branch_lines[test.comparators[0].attr] = range(
+                    statement.lineno, statement.body[-1].end_lineno
+                )
+                if len(statement.orelse) != 1:
+                    break
+                statement = statement.orelse[0]
+
+    branches = {
+        name: "".join(lines[line] for line in line_range)
+        for name, line_range in branch_lines.items()
+    }
+    excluded = set(itertools.chain.from_iterable(branch_lines.values()))
+    shared = "".join(line for index, line in enumerate(lines) if index not in excluded)
+    return shared, branches
+
+
+def library_version(name: str) -> str:
+    import importlib.metadata
+
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return "missing"
+
+
+def solver_fingerprint(solver: BoardSolver) -> Optional[str]:
+    """
+        Hash of the code that decides the outcome of a board solved with solver,
+        None if its outcomes are not cached
+    """
+    if solver in solver_fingerprints:
+        return solver_fingerprints[solver]
+
+    fingerprint = None
+    if solver not in UNCACHED_SOLVERS:
+        shared, branches = split_backends(read_source("board.py"))
+        parts = [shared, branches.get(solver.name, "")]
+        if solver == BoardSolver.Auto:
+            # Auto may pick any backend through the cost model
+            parts.extend(branches[name] for name in sorted(branches))
+            parts.append(read_source("dispatch.py"))
+            # The cost model is calibrated per host, without one Auto uses
+            # the default model of dispatch.py
+            if os.path.exists(os.path.join(SOURCE_DIRECTORY, COST_MODEL_FILE)):
+                parts.append(read_source(COST_MODEL_FILE))
+        for library in BACKEND_LIBRARIES.get(solver, []):
+            parts.append(library + " " + library_version(library))
+
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        fingerprint = digest.hexdigest()
+
+    solver_fingerprints[solver] = fingerprint
+    return fingerprint
+
+
+def result_key(
+    width: int,
+    height: int,
+    mines: int,
+    force_start_area: bool,
+    seed: int,
+    solver: BoardSolver,
+) -> Optional[bytes]:
+    fingerprint = solver_fingerprint(solver)
+    if fingerprint is None or seed is None:
+        return None
+    return hashlib.sha256(
+        "{0},{1},{2},{3},{4},{5},{6}".format(
+            width, height, mines, int(force_start_area), seed, solver.name, fingerprint
+        ).encode("ascii")
+    ).digest()
+
+
+class ResultCache:
+    """
+        On-disk cache of board outcomes, addressed by the hash of the board
+        parameters, the seed, the solver and the fingerprint of the solver code.
+        The outcome of a board is deterministic, so a sweep that is run again
+        only solves the boards of changed solvers.
+        Holds at most max_entries boards. When closed, the boards that were
+        used in the fewest recent runs are evicted first
+    """
+
+    path: str
+    max_entries: int
+    hits: int
+    misses: int
+    pending: int
+
+    def __init__(self, path: str, max_entries=1000000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key BLOB PRIMARY KEY, state INTEGER, time REAL, "
+            "second_order_calls INTEGER, largest_rows INTEGER, "
+            "largest_columns INTEGER, used INTEGER) WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS used ON results (used)")
+        # Entries read or written in this run are stamped with the run number
+        self.run = (
+            self.connection.execute("SELECT MAX(used) FROM results").fetchone()[0] or 0
+        ) + 1
+
+    def get(
+        self,
+        width: int,
+        height: int,
+        mines: int,
+        force_start_area: bool,
+        seed: int,
+        solver: BoardSolver,
+    ) -> Optional[Tuple[BoardResult, float]]:
+        """
+            Returns the result and the recorded solve time of the board if cached
+        """
+        key = result_key(width, height, mines, force_start_area, seed, solver)
+        if key is None:
+            return None
+
+        row = self.connection.execute(
+            "SELECT state, time, second_order_calls, largest_rows, largest_columns "
+            "FROM results WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.connection.execute(
+            "UPDATE results SET used = ? WHERE key = ?", (self.run, key)
+        )
+        self.count_write()
+        state, elapsed, second_order_calls, largest_rows, largest_columns = row
+        result = BoardResult(
+            width,
+            height,
+            mines,
+            BoardState(state),
+            seed,
+            solver,
+            force_start_area,
+            second_order_calls,
+            (largest_rows, largest_columns),
+            None,
+            None,
+        )
+        return result, elapsed
+
+    def put(self, result: BoardResult, elapsed: float) -> None:
+        key = result_key(
+            result.width,
+            result.height,
+            result.mines,
+            result.force_start_area,
+            result.seed,
+            result.solver,
+        )
+        if key is None:
+            return
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                result.state.value,
+                elapsed,
+                result.second_order_calls,
+                result.largest_system[0],
+                result.largest_system[1],
+                self.run,
+            ),
+        )
+        self.count_write()
+
+    def count_write(self) -> None:
+        self.pending += 1
+        if self.pending >= COMMIT_INTERVAL:
+            self.connection.commit()
+            self.pending = 0
+
+    def entries(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def evict(self) -> int:
+        """
+            Deletes the least recently used boards above max_entries.
+            Returns the number of boards deleted
+        """
+        excess = self.entries() - self.max_entries
+        if excess <= 0:
+            return 0
+        self.connection.execute(
+            "DELETE FROM results WHERE key IN "
+            "(SELECT key FROM results ORDER BY used LIMIT ?)",
+            (excess,),
+        )
+        return excess
+
+    def close(self) -> None:
+        self.evict()
+        self.connection.commit()
+        self.connection.close()
+
+
+class CachingAggregator:
+    """
+        Stores the results of solved boards in the cache before passing them
+        on to the aggregator
+    """
+
+    def __init__(self, aggregator, cache: ResultCache):
+        self.aggregator = aggregator
+        self.cache = cache
+
+    def add(self, result: BoardResult, elapsed: float) -> None:
+        self.cache.put(result, elapsed)
+        self.aggregator.add(result, elapsed)
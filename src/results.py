@@ -0,0 +1,297 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, TextIO, Tuple
+from statistics import NormalDist
+import heapq
+import itertools
+import json
+import math
+
+from board import BoardResult, BoardState
+
+
+class LatencyHistogram:
+    """
+        Fixed-size histogram of latencies with logarithmic buckets.
+        Memory use does not depend on how many values have been added
+    """
+
+    min_value: float
+    buckets_per_decade: int
+    counts: List[int]
+    count: int
+    # Smallest and largest added values, percentiles stay within them
+    value_min: float
+    value_max: float
+
+    def __init__(self, min_value=1e-6, max_value=1e3, buckets_per_decade=50):
+        self.min_value = min_value
+        self.buckets_per_decade = buckets_per_decade
+        bucket_count = int(
+            math.ceil(math.log10(max_value / min_value) * buckets_per_decade)
+        )
+        # The last bucket collects all values above max_value
+        self.counts = [0] * (bucket_count + 1)
+        self.count = 0
+        self.value_min = math.inf
+        self.value_max = 0.0
+
+    def add(self, value: float) -> None:
+        if value <= self.min_value:
+            bucket = 0
+        else:
+            bucket = min(
+                int(math.log10(value / self.min_value) * self.buckets_per_decade),
+                len(self.counts) - 1,
+            )
+        self.counts[bucket] += 1
+        self.count += 1
+        self.value_min = min(self.value_min, value)
+        self.value_max = max(self.value_max, value)
+
+    def bucket_upper_bound(self, bucket: int) -> float:
+        return self.min_value * 10 ** ((bucket + 1) / self.buckets_per_decade)
+
+    def percentile(self, q: float) -> float:
+        """
+            Returns the upper bound of the bucket containing the q-th percentile
+            (0-100), clamped to the smallest and largest added values
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = max(1, int(math.ceil(q / 100.0 * self.count)))
+        cumulative = 0
+        bucket = len(self.counts) - 1
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                bucket = index
+                break
+        return min(max(self.bucket_upper_bound(bucket), self.value_min), self.value_max)
+
+    def merge(self, other: LatencyHistogram) -> None:
+        for bucket, count in enumerate(other.counts):
+            self.counts[bucket] += count
+        self.count += other.count
+        self.value_min = min(self.value_min, other.value_min)
+        self.value_max = max(self.value_max, other.value_max)
+
+
+class SlowestBoards:
+    """
+        Keeps the count slowest boards in a min-heap of their times,
+        so adding a board costs at most O(log count)
+    """
+
+    count: int
+    heap: List[Tuple[float, int, BoardResult]]
+
+    def __init__(self, count=10):
+        self.count = count
+        self.heap = []
+        # Breaks ties between equal times, results are not comparable
+        self.order = itertools.count()
+
+    def add(self, result: BoardResult, elapsed: float) -> None:
+        if len(self.heap) < self.count:
+            heapq.heappush(self.heap, (elapsed, next(self.order), result))
+        elif elapsed > self.heap[0][0]:
+            heapq.heapreplace(self.heap, (elapsed, next(self.order), result))
+
+    def boards(self) -> List[Tuple[float, BoardResult]]:
+        """
+            Returns (time, result) pairs from slowest to fastest
+        """
+        return [
+            (elapsed, result)
+            for elapsed, order, result in sorted(self.heap, reverse=True)
+        ]
+
+    def merge(self, other: SlowestBoards) -> None:
+        for elapsed, result in other.boards():
+            self.add(result, elapsed)
+
+    def write_reproducers(self, path: str) -> None:
+        """
+            Writes the slowest boards as a JSON list that debug() in
+            benchmark.py can load to solve them again
+        """
+        reproducers = [
+            {
+                "seed": result.seed,
+                "width": result.width,
+                "height": result.height,
+                "mines": result.mines,
+                "force_start_area": result.force_start_area,
+                "solver": result.solver.name if result.solver is not None else None,
+                "state": result.state.name,
+                "time": elapsed,
+                "second_order_calls": result.second_order_calls,
+                "largest_system": list(result.largest_system),
+                "start_position": list(result.start_position)
+                if result.start_position is not None
+                else None,
+                "corpus_path": result.corpus_record[0]
+                if result.corpus_record is not None
+                else None,
+                "corpus_index": result.corpus_record[1]
+                if result.corpus_record is not None
+                else None,
+            }
+            for elapsed, result in self.boards()
+        ]
+        with open(path, "w") as f:
+            json.dump(reproducers, f, indent=4)
+            f.write("\n")
+
+
+def load_reproducers(path: str) -> List[Dict]:
+    with open(path) as f:
+        return json.load(f)
+
+
+class ResultSink:
+    """
+        Writes per-board records as CSV lines to a file in chunks
+    """
+
+    file: TextIO
+    chunk_size: int
+    buffer: List[str]
+
+    def __init__(self, path: str, chunk_size=10000):
+        self.file = open(path, "w")
+        self.file.write("seed,width,height,mines,state,time\n")
+        self.chunk_size = chunk_size
+        self.buffer = []
+
+    def write(self, result: BoardResult, elapsed: float) -> None:
+        self.buffer.append(
+            "{0},{1},{2},{3},{4},{5!r}\n".format(
+                result.seed,
+                result.width,
+                result.height,
+                result.mines,
+                result.state.name,
+                elapsed,
+            )
+        )
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.write("".join(self.buffer))
+        self.buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+
+class ResultAggregator:
+    """
+        Aggregates board results online so that memory use stays constant
+        regardless of how many boards are run. Per-board records are only
+        kept if a sink is given, which writes them to disk
+    """
+
+    width: int
+    height: int
+    mines: int
+    boards: int
+    wins: int
+    losses: int
+    time_total: float
+    time_mean: float
+    time_m2: float
+    time_max: float
+    latencies: LatencyHistogram
+    slowest: SlowestBoards
+    sink: Optional[ResultSink]
+
+    def __init__(self, sink: Optional[ResultSink] = None, slowest_count=10):
+        self.width = 0
+        self.height = 0
+        self.mines = 0
+        self.boards = 0
+        self.wins = 0
+        self.losses = 0
+        self.time_total = 0.0
+        self.time_mean = 0.0
+        self.time_m2 = 0.0
+        self.time_max = 0.0
+        self.latencies = LatencyHistogram()
+        self.slowest = SlowestBoards(slowest_count)
+        self.sink = sink
+
+    def add(self, result: BoardResult, elapsed: float) -> None:
+        self.width = result.width
+        self.height = result.height
+        self.mines = result.mines
+
+        self.boards += 1
+        if result.state == BoardState.Won:
+            self.wins += 1
+        elif result.state == BoardState.Lost:
+            self.losses += 1
+
+        # Welford's online update of the latency mean and variance
+        self.time_total += elapsed
+        delta = elapsed - self.time_mean
+        self.time_mean += delta / self.boards
+        self.time_m2 += delta * (elapsed - self.time_mean)
+        if elapsed > self.time_max:
+            self.time_max = elapsed
+        self.latencies.add(elapsed)
+        self.slowest.add(result, elapsed)
+
+        if self.sink is not None:
+            self.sink.write(result, elapsed)
+
+    def win_rate(self) -> float:
+        return self.wins / float(self.boards) if self.boards > 0 else 0.0
+
+    def mean_time(self) -> float:
+        return self.time_total / self.boards if self.boards > 0 else 0.0
+
+    def time_stdev(self) -> float:
+        if self.boards < 2:
+            return 0.0
+        return math.sqrt(self.time_m2 / (self.boards - 1))
+
+    def win_rate_interval(self, confidence=0.95) -> Tuple[float, float]:
+        return wilson_interval(self.wins, self.boards, confidence)
+
+    def mean_time_interval(self, confidence=0.95) -> Tuple[float, float]:
+        """
+            Normal approximation of the confidence interval of the mean latency.
+            The lower bound is clamped at 0, skewed small samples would
+            otherwise give negative latencies
+        """
+        if self.boards == 0:
+            return (0.0, 0.0)
+
+        z = z_score(confidence)
+        half_width = z * self.time_stdev() / math.sqrt(self.boards)
+        mean = self.mean_time()
+        return (max(0.0, mean - half_width), mean + half_width)
+
+
+def z_score(confidence: float) -> float:
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def wilson_interval(successes: int, n: int, confidence=0.95) -> Tuple[float, float]:
+    """
+        Wilson score interval for a binomial proportion.
+        Stays within [0, 1] and behaves well for win rates close to 0 or 1
+    """
+    if n == 0:
+        return (0.0, 1.0)
+
+    z = z_score(confidence)
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return (max(0.0, center - half_width), min(1.0, center + half_width))
@@ -0,0 +1,481 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+
+from board import BoardResult, BoardSolver, BoardState
+from results import wilson_interval
+import benchmark
+
+import argparse
+import math
+import time
+
+DEFAULT_SIZES = ["9x9", "16x16", "30x16", "32x32", "48x48", "64x64"]
+DEFAULT_DENSITIES = [0.12, 0.16, 0.206]
+
+# The portfolio races the other backends, it is only swept when asked for
+DEFAULT_SOLVERS = [
+    solver.name for solver in BoardSolver if solver != BoardSolver.Portfolio
+]
+
+# Boards per task of a worker process
+CHUNK_SIZE = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep the solvers over a grid of board sizes and mine "
+        "densities, fit how their time grows and find where they break"
+    )
+    parser.add_argument(
+        "--sizes", nargs="+", default=DEFAULT_SIZES, help="Board sizes as WIDTHxHEIGHT"
+    )
+    parser.add_argument(
+        "--densities",
+        nargs="+",
+        type=float,
+        default=DEFAULT_DENSITIES,
+        help="Mines per cell, expert is 0.206",
+    )
+    parser.add_argument(
+        "--solvers",
+        nargs="+",
+        default=DEFAULT_SOLVERS,
+        choices=[solver.name for solver in BoardSolver],
+    )
+    parser.add_argument("--repeats", type=int, default=50, help="Boards per point")
+    parser.add_argument("--random-seed", type=int, default=0)
+    parser.add_argument(
+        "--max-mean-time",
+        type=float,
+        default=1.0,
+        help="Seconds per board above which a solver is broken at a point, "
+        "its larger sizes of the same density are skipped",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--format", choices=["text", "csv", "json"], default="text")
+    parser.add_argument("--output", default=None, help="Table file, stdout if unset")
+    parser.add_argument(
+        "--boards-output", default=None, help="Also write every board as CSV"
+    )
+    args = parser.parse_args()
+
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+
+    sizes = sorted(
+        (parse_size(size) for size in args.sizes), key=lambda size: size[0] * size[1]
+    )
+    solvers = [BoardSolver[name] for name in args.solvers]
+    verbose = args.format == "text"
+
+    points, boards = run_sweep(
+        sizes,
+        args.densities,
+        solvers,
+        args.repeats,
+        args.random_seed,
+        args.max_mean_time,
+        args.workers,
+        verbose,
+    )
+    fits = fit_complexity(points, boards)
+
+    if verbose:
+        display_points(points)
+        print("-" * 50)
+        display_fits(fits)
+    else:
+        benchmark.write_summaries(points, args.format, args.output)
+
+    if args.boards_output is not None:
+        write_boards(boards, args.boards_output)
+
+
+def parse_size(spec: str) -> Tuple[int, int]:
+    size = spec.split("x")
+    if len(size) != 2 or not all(value.isdigit() for value in size):
+        raise ValueError("Board size must be WIDTHxHEIGHT: " + spec)
+    return int(size[0]), int(size[1])
+
+
+def mine_count(width: int, height: int, density: float) -> int:
+    # The start position and its neighbors stay free of mines
+    return max(1, min(round(density * width * height), width * height - 9))
+
+
+def warm_up_solvers(solvers: List[BoardSolver]) -> None:
+    # Imports the backends before the first timed board of a worker
+    for solver in solvers:
+        benchmark.warm_up_worker("easy", solver, 3)
+
+
+def solve_boards(
+    setup_name: str, solver: BoardSolver, seeds: List[int], executor=None
+) -> List[Tuple[BoardResult, float]]:
+    """
+        Solves the boards of the seeds, in chunks across the executor if given.
+        Returns the result and time of each board in the order of the seeds
+    """
+    if executor is None:
+        return benchmark.solve_seed_chunk(setup_name, solver, seeds)[0]
+
+    futures = [
+        executor.submit(
+            benchmark.solve_seed_chunk,
+            setup_name,
+            solver,
+            seeds[start : start + CHUNK_SIZE],
+        )
+        for start in range(0, len(seeds), CHUNK_SIZE)
+    ]
+    boards = []
+    for future in futures:
+        boards.extend(future.result()[0])
+    return boards
+
+
+def run_sweep(
+    sizes: List[Tuple[int, int]],
+    densities: List[float],
+    solvers: List[BoardSolver],
+    repeats: int,
+    random_seed=0,
+    max_mean_time=1.0,
+    workers=1,
+    verbose=True,
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+        Solves repeats boards at every size, density and solver. Every solver
+        gets the same seeds at a point. Sizes are run from small to large, after
+        a point whose mean time per board exceeds max_mean_time the larger sizes
+        of the density are skipped for the solver. A point whose boards raise an
+        error is recorded as failed with the error, and the larger sizes of the
+        density are skipped for the solver as well.
+        Returns the summary of every point and the record of every board
+    """
+    import concurrent.futures
+
+    executor = None
+    if workers > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=warm_up_solvers, initargs=(solvers,)
+        )
+    else:
+        warm_up_solvers(solvers)
+
+    points = []
+    boards = []
+    try:
+        for density in densities:
+            broken = set()
+            for width, height in sizes:
+                mines = mine_count(width, height, density)
+                setup_name = "{0}x{1}x{2}".format(width, height, mines)
+                seeds = list(benchmark.seed_sequence(random_seed, repeats))
+                for solver in solvers:
+                    if solver in broken:
+                        points.append(
+                            skipped_point(width, height, mines, density, solver)
+                        )
+                        continue
+
+                    start_time = time.perf_counter()
+                    try:
+                        point_boards = solve_boards(setup_name, solver, seeds, executor)
+                    except Exception as error:
+                        error_text = "{0}: {1}".format(type(error).__name__, error)
+                        points.append(
+                            skipped_point(
+                                width, height, mines, density, solver, error_text
+                            )
+                        )
+                        broken.add(solver)
+                        if verbose:
+                            print(setup_name, solver.name, "failed", error_text)
+                        continue
+
+                    point = summarize_point(
+                        width,
+                        height,
+                        mines,
+                        density,
+                        solver,
+                        point_boards,
+                        time.perf_counter() - start_time,
+                    )
+                    points.append(point)
+                    for result, elapsed in point_boards:
+                        boards.append(board_record(density, result, elapsed))
+
+                    if point["mean_ms"] / 1000 > max_mean_time:
+                        broken.add(solver)
+                    if verbose:
+                        print(
+                            setup_name,
+                            solver.name,
+                            "{0:.2f} ms".format(point["mean_ms"]),
+                            "win {0:.3f}".format(point["win_rate"]),
+                            "broken" if solver in broken else "",
+                        )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return points, boards
+
+
+def board_record(density: float, result: BoardResult, elapsed: float) -> Dict:
+    return {
+        "solver": result.solver.name,
+        "width": result.width,
+        "height": result.height,
+        "mines": result.mines,
+        "density": density,
+        "seed": result.seed,
+        "state": result.state.name,
+        "ms": 1000 * elapsed,
+        "second_order_calls": result.second_order_calls,
+        "largest_rows": result.largest_system[0],
+        "largest_columns": result.largest_system[1],
+    }
+
+
+def summarize_point(
+    width: int,
+    height: int,
+    mines: int,
+    density: float,
+    solver: BoardSolver,
+    boards: List[Tuple[BoardResult, float]],
+    total_time: float,
+) -> Dict:
+    times = sorted(elapsed for result, elapsed in boards)
+    wins = sum(1 for result, elapsed in boards if result.state == BoardState.Won)
+    win_low, win_high = wilson_interval(wins, len(boards))
+    system_sizes = [
+        result.largest_system[0] * result.largest_system[1]
+        for result, elapsed in boards
+    ]
+    return {
+        "solver": solver.name,
+        "width": width,
+        "height": height,
+        "cells": width * height,
+        "mines": mines,
+        "density": density,
+        "boards": len(boards),
+        "wins": wins,
+        "win_rate": wins / len(boards),
+        "win_rate_low": win_low,
+        "win_rate_high": win_high,
+        "mean_ms": 1000 * sum(times) / len(times),
+        "p50_ms": 1000 * times[len(times) // 2],
+        "p90_ms": 1000 * times[min(len(times) - 1, len(times) * 9 // 10)],
+        "max_ms": 1000 * times[-1],
+        "mean_second_order_calls": sum(
+            result.second_order_calls for result, elapsed in boards
+        )
+        / len(boards),
+        "mean_largest_system": sum(system_sizes) / len(boards),
+        "max_largest_rows": max(result.largest_system[0] for result, elapsed in boards),
+        "max_largest_columns": max(
+            result.largest_system[1] for result, elapsed in boards
+        ),
+        "total_seconds": total_time,
+        "skipped": False,
+        "error": None,
+    }
+
+
+def skipped_point(
+    width: int,
+    height: int,
+    mines: int,
+    density: float,
+    solver: BoardSolver,
+    error: Optional[str] = None,
+) -> Dict:
+    # Same columns as a solved point for the csv output, without measurements.
+    # Points that failed with an error are skipped points with the error
+    measurements = [
+        "wins",
+        "win_rate",
+        "win_rate_low",
+        "win_rate_high",
+        "mean_ms",
+        "p50_ms",
+        "p90_ms",
+        "max_ms",
+        "mean_second_order_calls",
+        "mean_largest_system",
+        "max_largest_rows",
+        "max_largest_columns",
+        "total_seconds",
+    ]
+    point = {
+        "solver": solver.name,
+        "width": width,
+        "height": height,
+        "cells": width * height,
+        "mines": mines,
+        "density": density,
+        "boards": 0,
+    }
+    point.update(dict.fromkeys(measurements))
+    point["skipped"] = True
+    point["error"] = error
+    return point
+
+
+def fit_power_law(
+    samples: List[Tuple[float, float]]
+) -> Optional[Tuple[float, float, float]]:
+    """
+        Fits y = c * x^k by least squares on log(y) = log(c) + k * log(x).
+        Returns (c, k, r squared) or None without two distinct positive x
+    """
+    import numpy as np
+
+    samples = [(x, y) for x, y in samples if x > 0 and y > 0]
+    if len({x for x, y in samples}) < 2:
+        return None
+    log_x = np.log([x for x, y in samples])
+    log_y = np.log([y for x, y in samples])
+    k, log_c = np.polyfit(log_x, log_y, 1)
+    residuals = log_y - (log_c + k * log_x)
+    total = np.sum((log_y - log_y.mean()) ** 2)
+    r_squared = 1.0 - np.sum(residuals ** 2) / total if total > 0 else 1.0
+    return math.exp(log_c), float(k), float(r_squared)
+
+
+def fit_complexity(points: List[Dict], boards: List[Dict]) -> List[Dict]:
+    """
+        Fits per solver and density how the mean time per board grows with the
+        cells of the board, and per solver how the time of a board grows with
+        the size (rows * columns) of its largest linear system
+    """
+    fits = []
+    solvers = list(dict.fromkeys(point["solver"] for point in points))
+    densities = list(dict.fromkeys(point["density"] for point in points))
+    for solver in solvers:
+        for density in densities:
+            fit = fit_power_law(
+                [
+                    (point["cells"], point["mean_ms"])
+                    for point in points
+                    if point["solver"] == solver
+                    and point["density"] == density
+                    and not point["skipped"]
+                ]
+            )
+            if fit is not None:
+                fits.append(
+                    {
+                        "solver": solver,
+                        "density": density,
+                        "x": "cells",
+                        "c": fit[0],
+                        "k": fit[1],
+                        "r_squared": fit[2],
+                    }
+                )
+
+        fit = fit_power_law(
+            [
+                (board["largest_rows"] * board["largest_columns"], board["ms"])
+                for board in boards
+                if board["solver"] == solver
+            ]
+        )
+        if fit is not None:
+            fits.append(
+                {
+                    "solver": solver,
+                    "density": None,
+                    "x": "largest system",
+                    "c": fit[0],
+                    "k": fit[1],
+                    "r_squared": fit[2],
+                }
+            )
+    return fits
+
+
+def display_points(points: List[Dict]) -> None:
+    print(
+        "{0:<24}{1:>10}{2:>8}{3:>8}{4:>8}{5:>10}{6:>10}{7:>10}{8:>12}".format(
+            "Solver",
+            "Size",
+            "Mines",
+            "Boards",
+            "Win",
+            "Mean ms",
+            "p90 ms",
+            "Max ms",
+            "Max system",
+        )
+    )
+    for point in points:
+        size = "{0}x{1}".format(point["width"], point["height"])
+        if point["error"] is not None:
+            print(
+                "{0:<24}{1:>10}{2:>8}  failed, {3}".format(
+                    point["solver"], size, point["mines"], point["error"]
+                )
+            )
+            continue
+        if point["skipped"]:
+            print(
+                "{0:<24}{1:>10}{2:>8}  skipped, broken at a smaller size".format(
+                    point["solver"], size, point["mines"]
+                )
+            )
+            continue
+        print(
+            "{0:<24}{1:>10}{2:>8}{3:>8}{4:>8.3f}{5:>10.2f}{6:>10.2f}{7:>10.2f}{8:>12}".format(
+                point["solver"],
+                size,
+                point["mines"],
+                point["boards"],
+                point["win_rate"],
+                point["mean_ms"],
+                point["p90_ms"],
+                point["max_ms"],
+                "{0}x{1}".format(
+                    point["max_largest_rows"], point["max_largest_columns"]
+                ),
+            )
+        )
+
+
+def display_fits(fits: List[Dict]) -> None:
+    print("Fitted time = c * x^k in ms")
+    print(
+        "{0:<24}{1:>9}{2:>16}{3:>12}{4:>8}{5:>8}".format(
+            "Solver", "Density", "x", "c", "k", "R^2"
+        )
+    )
+    for fit in fits:
+        print(
+            "{0:<24}{1:>9}{2:>16}{3:>12.4g}{4:>8.2f}{5:>8.3f}".format(
+                fit["solver"],
+                "-" if fit["density"] is None else fit["density"],
+                fit["x"],
+                fit["c"],
+                fit["k"],
+                fit["r_squared"],
+            )
+        )
+
+
+def write_boards(boards: List[Dict], path: str) -> None:
+    import csv
+
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(boards[0]) if boards else [])
+        writer.writeheader()
+        writer.writerows(boards)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+from __future__ import annotations
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from board import BoardResult, BoardSolver, BoardState
+from results import ResultAggregator
+import benchmark
+
+import argparse
+import gc
+import itertools
+import os
+import sys
+import time
+
+# Shard file layout: one comment line with the parameters of the run,
+# the CSV header and one line per board
+COLUMNS = (
+    "setup,solver,index,seed,width,height,mines,state,time,"
+    "second_order_calls,largest_rows,largest_columns"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a shard of the benchmark sweep into a resumable result "
+        "file, or merge shard files into one report"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run one shard of the sweep")
+    run_parser.add_argument("output", help="Shard file, resumed if it exists")
+    run_parser.add_argument(
+        "--shard", default="0/1", help="Shard i/N runs the i-th of N seed ranges"
+    )
+    run_parser.add_argument("--repeats", type=int, default=1000)
+    run_parser.add_argument("--random-seed", type=int, required=True)
+    run_parser.add_argument(
+        "--setups",
+        nargs="+",
+        default=list(benchmark.PRESETS),
+        help="Presets (easy, medium, expert) or WIDTHxHEIGHTxMINES",
+    )
+    run_parser.add_argument(
+        "--solvers",
+        nargs="+",
+        default=[solver.name for solver in BoardSolver],
+        choices=[solver.name for solver in BoardSolver],
+    )
+    run_parser.add_argument(
+        "--checkpoint-interval",
+        type=int,
+        default=100,
+        help="Boards between writes that are synced to disk",
+    )
+
+    merge_parser = subparsers.add_parser("merge", help="Report on shard files")
+    merge_parser.add_argument("paths", nargs="+")
+    merge_parser.add_argument(
+        "--allow-partial",
+        action="store_true",
+        help="Report even if shards or boards of the sweep are missing",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        shard, shard_count = parse_shard(args.shard)
+        run_shard(
+            args.output,
+            shard,
+            shard_count,
+            args.repeats,
+            args.random_seed,
+            args.setups,
+            [BoardSolver[name] for name in args.solvers],
+            args.checkpoint_interval,
+        )
+    elif args.command == "merge":
+        merge_shards(args.paths, args.allow_partial)
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    shard, shard_count = (int(value) for value in spec.split("/"))
+    if not 0 <= shard < shard_count:
+        raise ValueError("Shard must be i/N with 0 <= i < N: " + spec)
+    return shard, shard_count
+
+
+def shard_range(repeats: int, shard: int, shard_count: int) -> range:
+    """
+        Board indices of the shard. The ranges of all shards cover 0..repeats once
+    """
+    return range(repeats * shard // shard_count, repeats * (shard + 1) // shard_count)
+
+
+class ShardFile:
+    """
+        Append-only result file of a shard. Lines are written in chunks that are
+        synced to disk, so an interrupted run loses at most one chunk. Opening an
+        existing file drops a partially written last line and remembers the
+        boards that are already done
+    """
+
+    path: str
+    parameters: str
+    checkpoint_interval: int
+    done: Set[Tuple[str, str, int]]
+    buffer: List[str]
+
+    def __init__(self, path: str, parameters: str, checkpoint_interval=100):
+        self.path = path
+        self.parameters = parameters
+        self.checkpoint_interval = checkpoint_interval
+        self.done = set()
+        self.buffer = []
+        self.key = None
+
+        if os.path.exists(path):
+            self.recover()
+            self.file = open(path, "a")
+        else:
+            self.file = open(path, "w")
+            self.file.write("# " + parameters + "\n")
+            self.file.write(COLUMNS + "\n")
+            self.sync()
+
+    def recover(self) -> None:
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        # Everything after the last newline is an interrupted write
+        complete = data[: data.rfind(b"\n") + 1]
+        if len(complete) != len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(len(complete))
+
+        lines = complete.decode().splitlines()
+        if not lines or lines[0] != "# " + self.parameters:
+            raise ValueError(
+                "%s was written with different parameters: %s"
+                % (self.path, lines[0] if lines else "")
+            )
+        for row in parse_rows(lines):
+            self.done.add((row[0], row[1], row[2]))
+
+    def add(self, result: BoardResult, elapsed: float) -> None:
+        """
+            Called by the benchmark board setups with the result of the current board
+        """
+        setup, solver, index = self.key
+        self.buffer.append(
+            "{0},{1},{2},{3},{4},{5},{6},{7},{8!r},{9},{10},{11}\n".format(
+                setup,
+                solver,
+                index,
+                result.seed,
+                result.width,
+                result.height,
+                result.mines,
+                result.state.name,
+                elapsed,
+                result.second_order_calls,
+                result.largest_system[0],
+                result.largest_system[1],
+            )
+        )
+        self.done.add(self.key)
+        if len(self.buffer) >= self.checkpoint_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        self.file.write("".join(self.buffer))
+        self.buffer.clear()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.sync()
+        self.file.close()
+
+
+def parse_rows(lines) -> Iterator[Tuple[str, str, int, BoardResult, float]]:
+    """
+        Yields (setup, solver, index, result, time) for each board line
+    """
+    for line in lines:
+        if line.startswith("#") or line.startswith("setup,"):
+            continue
+        fields = line.rstrip("\n").split(",")
+        if len(fields) != 12:
+            continue
+        result = BoardResult(
+            int(fields[4]),
+            int(fields[5]),
+            int(fields[6]),
+            BoardState[fields[7]],
+            int(fields[3]),
+            BoardSolver[fields[1]],
+            True,
+            int(fields[9]),
+            (int(fields[10]), int(fields[11])),
+            None,
+            None,
+        )
+        yield fields[0], fields[1], int(fields[2]), result, float(fields[8])
+
+
+def run_shard(
+    output: str,
+    shard: int,
+    shard_count: int,
+    repeats: int,
+    random_seed: int,
+    setups: List[str],
+    solvers: List[BoardSolver],
+    checkpoint_interval=100,
+) -> None:
+    """
+        Solves the boards of the shard for every setup and solver with the seeds
+        of benchmark.seed_sequence, skipping boards already in the output file
+    """
+    indices = shard_range(repeats, shard, shard_count)
+    # A shard file is only resumed with the same parameters. The shard comes
+    # last, merge_shards compares the parameters before it
+    parameters = (
+        "random_seed={0} repeats={1} setups={2} solvers={3} shard={4}/{5}"
+    ).format(
+        random_seed,
+        repeats,
+        ",".join(setups),
+        ",".join(solver.name for solver in solvers),
+        shard,
+        shard_count,
+    )
+    shard_file = ShardFile(output, parameters, checkpoint_interval)
+    print(
+        "Shard", shard, "of", shard_count, "boards", indices.start, "to", indices.stop
+    )
+    print("Already done", len(shard_file.done))
+
+    # Like run_benchmark, keep the garbage collector disabled during timing
+    # and disable stdout prints (scipy)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    benchmark.toggle_output(False)
+    start_time = time.perf_counter()
+    try:
+        for setup_name in setups:
+            board_setup = benchmark.get_board_setup(setup_name)
+            corpus_size = getattr(board_setup, "corpus_size", None)
+            for solver in solvers:
+                # The backends are imported lazily, import them before the
+                # first timed board like run_benchmark
+                benchmark.import_backend(solver)
+                if corpus_size is not None:
+                    # Corpus boards are solved in record order, board i is
+                    # record i, wrapping around like run_benchmark_parallel
+                    seeds = (index % corpus_size for index in indices)
+                else:
+                    seeds = itertools.islice(
+                        benchmark.seed_sequence(random_seed, repeats),
+                        indices.start,
+                        indices.stop,
+                    )
+                for index, seed in zip(indices, seeds):
+                    key = (setup_name, solver.name, index)
+                    if key in shard_file.done:
+                        continue
+                    shard_file.key = key
+                    board_setup(shard_file, True, solver, iter([seed]))
+                print(setup_name, solver.name, "done", file=sys.__stdout__)
+            benchmark.close_board_setup(board_setup)
+    finally:
+        if gc_enabled:
+            gc.enable()
+        benchmark.toggle_output(True)
+        shard_file.close()
+
+    print("Total runtime", time.perf_counter() - start_time, "seconds")
+
+
+def parse_parameters(header: str) -> Dict[str, str]:
+    """
+        Parameters of the comment line of a shard file, by name
+    """
+    return dict(field.split("=", 1) for field in header.lstrip("# ").split(" "))
+
+
+def merge_shards(
+    paths: List[str], allow_partial=False
+) -> Dict[Tuple[str, str], ResultAggregator]:
+    """
+        Combines shard files into one aggregator per setup and solver and prints
+        the report. Boards found in more than one file are counted once.
+        Raises ValueError if shards or boards of the sweep are missing, unless
+        allow_partial is set, in which case they are only reported
+    """
+    aggregators: Dict[Tuple[str, str], ResultAggregator] = {}
+    seen = set()
+    duplicates = 0
+    parameters: Optional[str] = None
+    shard_count = None
+    shards = set()
+    for path in paths:
+        with open(path) as f:
+            header = f.readline().rstrip("\n")
+            # All shards of one sweep share the seed, repeats, setups and solvers
+            run_parameters, shard = header.rsplit(" shard=", 1)
+            if parameters is None:
+                parameters = run_parameters
+            elif run_parameters != parameters:
+                raise ValueError(
+                    "%s has different parameters: %s, expected %s"
+                    % (path, run_parameters, parameters)
+                )
+            shard, count = parse_shard(shard)
+            if shard_count is None:
+                shard_count = count
+            elif count != shard_count:
+                raise ValueError(
+                    "%s is shard %d/%d, expected a shard of %d"
+                    % (path, shard, count, shard_count)
+                )
+            shards.add(shard)
+
+            for setup, solver, index, result, elapsed in parse_rows(f):
+                if (setup, solver, index) in seen:
+                    duplicates += 1
+                    continue
+                seen.add((setup, solver, index))
+                key = (setup, solver)
+                if key not in aggregators:
+                    aggregators[key] = ResultAggregator()
+                aggregators[key].add(result, elapsed)
+
+    missing_shards = sorted(set(range(shard_count)) - shards)
+    fields = parse_parameters(parameters)
+    repeats = int(fields["repeats"])
+    missing_boards = {}
+    for setup in fields["setups"].split(","):
+        for solver in fields["solvers"].split(","):
+            missing = [
+                index
+                for index in range(repeats)
+                if (setup, solver, index) not in seen
+            ]
+            if missing:
+                missing_boards[(setup, solver)] = missing
+
+    print("Merged", len(paths), "files,", len(seen), "boards")
+    if duplicates > 0:
+        print("Skipped", duplicates, "duplicate boards")
+    print(parameters)
+    if missing_shards:
+        print(
+            "Missing shards",
+            ", ".join("%d/%d" % (shard, shard_count) for shard in missing_shards),
+        )
+    for (setup, solver), missing in missing_boards.items():
+        print(
+            "Missing",
+            len(missing),
+            "of",
+            repeats,
+            "boards of",
+            setup,
+            solver,
+            "from index",
+            missing[0],
+        )
+    if (missing_shards or missing_boards) and not allow_partial:
+        raise ValueError(
+            "The shard files do not cover the sweep, pass --allow-partial to "
+            "report on the boards that are done"
+        )
+    print("-" * 50)
+    for (setup, solver), aggregator in aggregators.items():
+        print("Setup", setup)
+        print("Solver", solver)
+        benchmark.display_results(
+            aggregator.boards, aggregator, aggregator.time_total, stop_reason=None
+        )
+        print("-" * 50)
+
+    return aggregators
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+
+from board import BoardResult, BoardSolver, SolverConfig, DEFAULT_SOLVER_CONFIG
+from results import ResultAggregator
+import benchmark
+
+import argparse
+import dataclasses
+import itertools
+import os
+import time
+
+# Boards per task of a worker process. Tasks of all configurations are
+# interleaved, so that every configuration runs under the same load
+CHUNK_SIZE = 25
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep grids of solver tuning constants over a shared seed "
+        "set in parallel and report the win rate and latency Pareto front"
+    )
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE,VALUE,...",
+        help="Values of a SolverConfig field, repeat for a grid: "
+        + ", ".join(field.name for field in dataclasses.fields(SolverConfig)),
+    )
+    parser.add_argument(
+        "--setup",
+        default="expert",
+        help="Preset (easy, medium, expert), WIDTHxHEIGHTxMINES or a corpus file",
+    )
+    parser.add_argument(
+        "--solver",
+        default=BoardSolver.ScipyLinalgLstsq.name,
+        choices=[solver.name for solver in BoardSolver],
+    )
+    parser.add_argument("--repeats", type=int, default=1000)
+    parser.add_argument("--random-seed", type=int, default=0)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--format", choices=["text", "csv", "json"], default="text")
+    parser.add_argument("--output", default=None, help="Table file, stdout if unset")
+    args = parser.parse_args()
+
+    try:
+        configs = parse_grid(args.param)
+    except ValueError as error:
+        parser.error(str(error))
+    solver = BoardSolver[args.solver]
+    board_setup = benchmark.get_board_setup(args.setup)
+    if hasattr(board_setup, "corpus_size"):
+        seeds = list(range(min(args.repeats, board_setup.corpus_size)))
+    else:
+        seeds = list(benchmark.seed_sequence(args.random_seed, args.repeats))
+    benchmark.close_board_setup(board_setup)
+
+    verbose = args.format == "text"
+    if verbose:
+        print("Setup", args.setup)
+        print("Solver", solver.name)
+        print("Configurations", len(configs), "boards", len(seeds))
+        print("-" * 25)
+
+    start_time = time.perf_counter()
+    aggregators, errors = run_sweep(
+        args.setup, solver, configs, seeds, args.workers, args.warmup
+    )
+    summaries = summarize_sweep(configs, aggregators, errors)
+
+    if verbose:
+        display_sweep(summaries)
+        print("Total runtime", time.perf_counter() - start_time, "seconds")
+    else:
+        benchmark.write_summaries(summaries, args.format, args.output)
+
+
+def parse_grid(params: List[str]) -> List[SolverConfig]:
+    """
+        Returns the configurations of the cartesian product of the given field
+        values, the other fields keep their defaults. Raises ValueError for
+        values outside the range of their field, see SolverConfig
+    """
+    fields = {field.name: field for field in dataclasses.fields(SolverConfig)}
+    names = []
+    values = []
+    for param in params:
+        name, _, value_list = param.partition("=")
+        if name not in fields:
+            raise ValueError("Unknown SolverConfig field: " + name)
+        # Values are parsed with the type of the default value
+        value_type = type(getattr(DEFAULT_SOLVER_CONFIG, name))
+        names.append(name)
+        field_values = [value_type(value) for value in value_list.split(",")]
+        # Checked one field at a time, so that the error names the value
+        for value in field_values:
+            dataclasses.replace(DEFAULT_SOLVER_CONFIG, **{name: value})
+        values.append(field_values)
+
+    return [
+        dataclasses.replace(DEFAULT_SOLVER_CONFIG, **dict(zip(names, combination)))
+        for combination in itertools.product(*values)
+    ]
+
+
+def solve_config_chunk(
+    setup_name: str, solver: BoardSolver, config: SolverConfig, seeds: List[int]
+) -> List[Tuple[BoardResult, float]]:
+    # Boards acquired from the pool of the worker get the configuration
+    benchmark.board_pool.config = config
+    return benchmark.solve_seed_chunk(setup_name, solver, seeds)[0]
+
+
+def run_sweep(
+    setup_name: str,
+    solver: BoardSolver,
+    configs: List[SolverConfig],
+    seeds: List[int],
+    workers=None,
+    warmup=5,
+) -> Tuple[List[ResultAggregator], List[Optional[str]]]:
+    """
+        Solves the boards of the seeds with every configuration across a process
+        pool. Returns one aggregator and one error per configuration, the error
+        is None unless a chunk of the configuration raised, in which case the
+        configuration is dropped and the sweep goes on with the others
+    """
+    import concurrent.futures
+
+    aggregators = [ResultAggregator() for config in configs]
+    errors: List[Optional[str]] = [None for config in configs]
+    with concurrent.futures.ProcessPoolExecutor(
+        workers,
+        initializer=benchmark.warm_up_worker,
+        initargs=(setup_name, solver, warmup),
+    ) as executor:
+        futures = [
+            (
+                index,
+                executor.submit(
+                    solve_config_chunk,
+                    setup_name,
+                    solver,
+                    config,
+                    seeds[start : start + CHUNK_SIZE],
+                ),
+            )
+            for start in range(0, len(seeds), CHUNK_SIZE)
+            for index, config in enumerate(configs)
+        ]
+        for index, future in futures:
+            if errors[index] is not None:
+                continue
+            try:
+                chunk = future.result()
+            except Exception as error:
+                errors[index] = "{0}: {1}".format(type(error).__name__, error)
+                aggregators[index] = ResultAggregator()
+                for other_index, other_future in futures:
+                    if other_index == index:
+                        other_future.cancel()
+                continue
+            for board in chunk:
+                aggregators[index].add(*board)
+    return aggregators, errors
+
+
+def pareto_front(summaries: List[Dict]) -> List[bool]:
+    """
+        Marks the configurations that no other configuration beats on both
+        the win rate and the mean time per board
+    """
+    return [
+        not any(
+            other["win_rate"] >= summary["win_rate"]
+            and other["mean_ms"] <= summary["mean_ms"]
+            and (
+                other["win_rate"] > summary["win_rate"]
+                or other["mean_ms"] < summary["mean_ms"]
+            )
+            for other in summaries
+        )
+        for summary in summaries
+    ]
+
+
+def summarize_sweep(
+    configs: List[SolverConfig],
+    aggregators: List[ResultAggregator],
+    errors: Optional[List[Optional[str]]] = None,
+    confidence=0.95,
+) -> List[Dict]:
+    if errors is None:
+        errors = [None for config in configs]
+    summaries = []
+    for config, aggregator, error in zip(configs, aggregators, errors):
+        win_low, win_high = aggregator.win_rate_interval(confidence)
+        summary = dataclasses.asdict(config)
+        summary.update(
+            {
+                "boards": aggregator.boards,
+                "wins": aggregator.wins,
+                "win_rate": aggregator.win_rate(),
+                "win_rate_low": win_low,
+                "win_rate_high": win_high,
+                "mean_ms": 1000 * aggregator.mean_time(),
+                "p90_ms": 1000 * aggregator.latencies.percentile(90),
+                "max_ms": 1000 * aggregator.time_max,
+                "error": error,
+            }
+        )
+        summaries.append(summary)
+
+    # Failed configurations are not part of the front
+    completed = [summary for summary in summaries if summary["error"] is None]
+    for summary in summaries:
+        summary["pareto"] = False
+    for summary, pareto in zip(completed, pareto_front(completed)):
+        summary["pareto"] = pareto
+    return summaries
+
+
+def display_sweep(summaries: List[Dict]) -> None:
+    """
+        Prints the configurations by win rate with the fields that differ
+        from the defaults, Pareto-optimal ones marked with * and failed ones
+        last with their error
+    """
+    print(
+        "{0:<2}{1:>8}{2:>18}{3:>10}{4:>10}  {5}".format(
+            "", "Win", "95% CI", "Mean ms", "p90 ms", "Configuration"
+        )
+    )
+    for summary in sorted(
+        summaries,
+        key=lambda summary: (summary["error"] is not None, -summary["win_rate"]),
+    ):
+        changed = [
+            "{0}={1}".format(field.name, summary[field.name])
+            for field in dataclasses.fields(SolverConfig)
+            if summary[field.name] != getattr(DEFAULT_SOLVER_CONFIG, field.name)
+        ]
+        if summary["error"] is not None:
+            print(
+                "{0:<2}{1:>46}  {2}, failed, {3}".format(
+                    "", "", ", ".join(changed) or "defaults", summary["error"]
+                )
+            )
+            continue
+        print(
+            "{0:<2}{1:>8.4f}{2:>18}{3:>10.2f}{4:>10.2f}  {5}".format(
+                "*" if summary["pareto"] else "",
+                summary["win_rate"],
+                "[{0:.4f}, {1:.4f}]".format(
+                    summary["win_rate_low"], summary["win_rate_high"]
+                ),
+                summary["mean_ms"],
+                summary["p90_ms"],
+                ", ".join(changed) or "defaults",
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from board import BoardSolver
+from benchmark import get_board_setup, run_benchmark, seed_sequence, target_reached
+from results import ResultAggregator
+
+
+def run_easy(repeats, **kwargs):
+    return run_benchmark(
+        get_board_setup("easy"),
+        repeats,
+        BoardSolver.ScipyLinalgLstsq,
+        seed_sequence(1, repeats),
+        verbose=False,
+        **kwargs
+    )
+
+
+def test_target_reached_needs_every_given_target():
+    aggregator = run_easy(50)
+    low, high = aggregator.win_rate_interval()
+    width = high - low
+    assert target_reached(aggregator, None, None)
+    assert target_reached(aggregator, width * 1.01, None)
+    assert not target_reached(aggregator, width * 0.99, None)
+    assert not target_reached(aggregator, width * 1.01, 1e-9)
+
+
+def test_run_stops_at_wide_target_after_min_repeats():
+    aggregator = run_easy(500, target_win_rate_ci_width=1.0, min_repeats=20)
+    assert aggregator.boards == 20
+
+
+def test_run_continues_to_repeats_for_unreachable_target():
+    aggregator = run_easy(30, target_win_rate_ci_width=1e-9, min_repeats=1)
+    assert aggregator.boards == 30
+
+
+def test_run_stops_at_time_budget():
+    aggregator = run_easy(100000, time_budget=0.0)
+    assert aggregator.boards == 1
+
+
+def test_target_is_not_reached_without_boards():
+    assert not target_reached(ResultAggregator(), 0.5, None)
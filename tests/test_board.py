@@ -0,0 +1,41 @@
+from board import Board, BoardSolver
+
+import pytest
+
+
+def test_probability_map_excludes_opened_mines():
+    # The only mine is the opened one, the closed cells are safe
+    probabilities = Board.from_string("x#\n##\n", 1).probability_map()
+    assert probabilities[0, 0] == 1
+    assert probabilities.sum() == 1
+
+
+def test_probability_map_counts_remaining_mines_without_opened_mines():
+    probabilities = Board.from_string("x#\n##\n", 2).probability_map()
+    assert abs(probabilities[0, 1] - 1 / 3) < 1e-6
+    assert abs(probabilities[1, 0] - 1 / 3) < 1e-6
+    assert abs(probabilities[1, 1] - 1 / 3) < 1e-6
+
+
+def test_probability_map_without_solver_raises():
+    board = Board.from_string("x#\n##\n", 2, None)
+    with pytest.raises(ValueError):
+        board.probability_map()
+
+
+def test_probability_map_is_cached_until_the_board_changes():
+    board = Board.from_string("1###\n####\n####\n", 2)
+    probabilities = board.probability_map()
+    assert not probabilities.flags.writeable
+    assert board.probability_map() is probabilities
+
+    board.solver = BoardSolver.NumpyLinalgLstsq
+    assert board.probability_map() is not probabilities
+
+    probabilities = board.probability_map()
+    board.flag_at(1, 1)
+    flagged = board.probability_map()
+    assert flagged is not probabilities
+    assert flagged[1, 1] == 1
+    assert flagged[0, 1] == 0
+    assert flagged[1, 0] == 0
@@ -0,0 +1,50 @@
+from board import Board, BoardGenerationSettings, BoardPool
+from endgame import EndgameSolver
+
+
+def play(board: Board, width, height, mines, seed):
+    board.configure_and_solve(
+        width, height, BoardGenerationSettings(mines, seed, None, True)
+    )
+    return board.state, board.opened_cells, bytes(board.cell_state)
+
+
+def test_released_boards_are_reused_per_size():
+    pool = BoardPool()
+    board = pool.acquire(9, 9)
+    pool.release(board)
+    assert pool.acquire(9, 9) is board
+    assert pool.acquire(9, 9) is not board
+    assert pool.acquire(16, 16).width == 16
+
+
+def test_reused_board_plays_like_a_new_board():
+    pool = BoardPool()
+    sizes = [(9, 9, 10), (16, 16, 40), (9, 9, 10), (30, 16, 99)]
+    for seed in range(6):
+        for width, height, mines in sizes:
+            board = pool.acquire(width, height)
+            assert play(board, width, height, mines, seed) == play(
+                Board(), width, height, mines, seed
+            )
+            pool.release(board)
+
+
+def test_board_resized_by_configure_plays_like_a_new_board():
+    board = Board()
+    for seed in range(6):
+        for width, height, mines in [(16, 16, 40), (9, 9, 10)]:
+            assert play(board, width, height, mines, seed) == play(
+                Board(), width, height, mines, seed
+            )
+
+
+def test_acquire_applies_the_current_pool_settings():
+    pool = BoardPool()
+    pool.endgame = EndgameSolver()
+    board = pool.acquire(9, 9)
+    assert board.endgame is pool.endgame
+    pool.release(board)
+
+    pool.endgame = None
+    assert pool.acquire(9, 9).endgame is None
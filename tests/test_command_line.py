@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "benchmark.py")
+
+
+def run_benchmark(*args):
+    return subprocess.run(
+        [sys.executable, BENCHMARK] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+
+def summaries(*args):
+    process = run_benchmark(*args, "--format", "json")
+    assert process.returncode == 0, process.stderr
+    return json.loads(process.stdout)
+
+
+def test_runs_every_setup_and_solver():
+    results = summaries(
+        "easy",
+        "8x8x9",
+        "--solvers",
+        "ScipyLinalgLstsq",
+        "NumpyLinalgLstsq",
+        "--repeats",
+        "10",
+        "--random-seed",
+        "1",
+    )
+    assert [(result["setup"], result["solver"]) for result in results] == [
+        ("easy", "ScipyLinalgLstsq"),
+        ("easy", "NumpyLinalgLstsq"),
+        ("8x8x9", "ScipyLinalgLstsq"),
+        ("8x8x9", "NumpyLinalgLstsq"),
+    ]
+    assert all(result["boards"] == 10 for result in results)
+    assert results[2]["mines"] == 9
+
+
+def test_solvers_share_the_boards_without_a_seed(tmp_path):
+    prefix = str(tmp_path / "boards")
+    summaries(
+        "easy",
+        "--solvers",
+        "ScipyLinalgLstsq",
+        "NumpyLinalgLstsq",
+        "--repeats",
+        "5",
+        "--sink",
+        prefix,
+    )
+    seeds = []
+    for solver in ("ScipyLinalgLstsq", "NumpyLinalgLstsq"):
+        with open(prefix + "_easy_" + solver + ".csv") as f:
+            seeds.append([line.split(",")[0] for line in f.readlines()[1:]])
+    assert len(seeds[0]) == 5
+    assert seeds[0] == seeds[1]
+
+
+def test_worker_processes_solve_the_same_boards(tmp_path):
+    seed_file = tmp_path / "seeds.txt"
+    seed_file.write_text("\n".join(str(seed) for seed in range(12)) + "\n")
+    single = summaries("medium", "--seed-file", str(seed_file))
+    parallel = summaries("medium", "--seed-file", str(seed_file), "--workers", "2")
+    assert single[0]["boards"] == parallel[0]["boards"] == 12
+    assert single[0]["wins"] == parallel[0]["wins"]
+
+
+def test_invalid_options_are_rejected():
+    for args in (
+        ["--workers", "2", "--cache", "cache.sqlite"],
+        ["--cache", "cache.sqlite", "--endgame"],
+        ["--trace-latency", "0.1"],
+        ["--random-seed", "1", "--seed-file", "seeds.txt"],
+    ):
+        process = run_benchmark("easy", "--repeats", "1", *args)
+        assert process.returncode == 2
+        assert "error" in process.stderr
@@ -0,0 +1,67 @@
+from board import Board, BoardGenerationSettings
+from corpus import BoardCorpus, pack_bits, unpack_bits, write_corpus
+
+import random
+
+import pytest
+
+
+def test_pack_bits_round_trip():
+    rng = random.Random(1)
+    for cell_count in (1, 7, 8, 9, 81, 480):
+        cells = bytes(rng.randrange(2) for _ in range(cell_count))
+        packed = pack_bits(cells)
+        assert len(packed) == (cell_count + 7) // 8
+        assert unpack_bits(packed, cell_count) == cells
+
+
+def test_corpus_boards_play_like_their_seeds(tmp_path):
+    path = str(tmp_path / "corpus.bin")
+    write_corpus(path, 16, 16, 40, 5, random_seed=1)
+    board, seeded = Board(), Board()
+    with BoardCorpus(path) as corpus:
+        assert (corpus.width, corpus.height, corpus.mines) == (16, 16, 40)
+        assert corpus.force_start_area
+        for index in range(len(corpus)):
+            start_position = corpus.configure_board(board, index)
+            seed = corpus.record(index)[0]
+            assert board.corpus_record == (path, index)
+
+            seeded_start = seeded.configure(
+                16, 16, BoardGenerationSettings(40, seed, None, True)
+            )
+            assert start_position == seeded_start
+            assert board.mine == seeded.mine
+
+            board.solve(start_position)
+            seeded.solve(seeded_start)
+            assert board.state == seeded.state
+            assert board.cell_state == seeded.cell_state
+
+
+def test_corpus_index_out_of_range(tmp_path):
+    path = tmp_path / "corpus.bin"
+    write_corpus(path, 9, 9, 10, 2, random_seed=1)
+    with BoardCorpus(path) as corpus:
+        with pytest.raises(IndexError):
+            corpus.record(2)
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "corpus.bin"
+    for data in (b"", b"not a corpus file at all, but long enough" * 2):
+        path.write_bytes(data)
+        with pytest.raises(ValueError):
+            BoardCorpus(path)
+
+
+def test_truncated_corpus_is_rejected(tmp_path):
+    path = tmp_path / "corpus.bin"
+    write_corpus(path, 9, 9, 10, 5, random_seed=1)
+    with BoardCorpus(path) as corpus:
+        assert len(corpus) == 5
+
+    data = path.read_bytes()
+    path.write_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        BoardCorpus(path)
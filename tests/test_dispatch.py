@@ -0,0 +1,50 @@
+from board import BoardSolver
+import dispatch
+from dispatch import DEFAULT_COST_MODEL, CostModel, calibrate_cost_model
+import result_cache
+
+
+def test_cost_model_chooses_the_cheapest_fast_backend():
+    model = CostModel(
+        {
+            "ScipyLinalgLstsq": [0.0, 1.0, 0.0, 0.0, 0.0],
+            "ScipySparseLinalgLsqr": [0.0, 0.0, 1.0, 0.0, 0.0],
+            "ScipyOptimizeLsqLinear": [1.0, 0.0, 0.0, 0.0, 0.0],
+        },
+        guess_budget=2.0,
+    )
+    # Size 100 against 10 non-zeros, then size 4 against 4 non-zeros
+    assert model.choose(10, 10, 10) == "ScipySparseLinalgLsqr"
+    assert model.choose(2, 2, 5) == "ScipyLinalgLstsq"
+    assert model.choose(10, 10, 10, guess=True) == "ScipyOptimizeLsqLinear"
+
+    model.guess_budget = 0.5
+    assert model.choose(10, 10, 10, guess=True) == "ScipySparseLinalgLsqr"
+
+
+def test_default_cost_model_uses_lstsq():
+    assert DEFAULT_COST_MODEL.choose(500, 400, 3000) == "ScipyLinalgLstsq"
+    assert DEFAULT_COST_MODEL.choose(5, 4, 10, guess=True) == "ScipyOptimizeLsqLinear"
+
+
+def test_cost_model_round_trip(tmp_path):
+    path = str(tmp_path / "model.json")
+    DEFAULT_COST_MODEL.save(path)
+    model = CostModel.load(path)
+    assert model.coefficients == DEFAULT_COST_MODEL.coefficients
+    assert model.guess_budget == DEFAULT_COST_MODEL.guess_budget
+
+
+def test_calibrated_costs_are_not_negative(monkeypatch):
+    monkeypatch.setattr(dispatch, "CALIBRATION_SETUPS", [(9, 9, 10), (16, 16, 40)])
+    monkeypatch.setattr(dispatch, "CALIBRATION_SEEDS", [1])
+    model = calibrate_cost_model(repeat=1)
+    for coefficients in model.coefficients.values():
+        assert len(coefficients) == len(dispatch.system_features(1, 1, 1))
+        assert min(coefficients) >= 0
+
+
+def test_auto_is_cached_without_a_calibrated_cost_model(monkeypatch):
+    monkeypatch.setattr(result_cache, "COST_MODEL_FILE", "missing_cost_model.json")
+    monkeypatch.setattr(result_cache, "solver_fingerprints", {})
+    assert result_cache.solver_fingerprint(BoardSolver.Auto) is not None
@@ -0,0 +1,87 @@
+from board import Board, BoardGenerationSettings, BoardState, CellState
+from endgame import EndgameSolver
+
+from fractions import Fraction
+import itertools
+
+
+def brute_force_counts(board: Board):
+    """
+        Lists every assignment of the remaining mines to the closed cells that
+        agrees with the opened cells. Returns the number of assignments and
+        the number of them with a mine per closed cell
+    """
+    size = board.width * board.height
+    closed = [cell for cell in range(size) if board.cell_state[cell] == CellState.Closed]
+    opened = [cell for cell in range(size) if board.cell_state[cell] == CellState.Opened]
+    remaining = board.generated_mines - board.flagged_cells
+    total = 0
+    mines = dict.fromkeys(closed, 0)
+    for assignment in itertools.combinations(closed, remaining):
+        chosen = set(assignment)
+        if all(
+            sum(
+                neighbor in chosen or board.cell_state[neighbor] == CellState.Flagged
+                for neighbor in board.neighbors[cell]
+            )
+            == board.neighbor_mine_count[cell]
+            for cell in opened
+        ):
+            total += 1
+            for cell in chosen:
+                mines[cell] += 1
+    return total, mines
+
+
+def positions():
+    """
+        Positions of small boards after the start and after a few solver steps,
+        some with flags
+    """
+    board = Board()
+    for seed in range(12):
+        start_position = board.configure(
+            6, 5, BoardGenerationSettings(5, seed, None, True)
+        )
+        board.open_at(start_position[0], start_position[1])
+        for step in range(3):
+            if board.state != BoardState.Undefined:
+                break
+            yield board
+            board.solve_step()
+
+
+def test_counts_match_brute_force():
+    endgame = EndgameSolver()
+    checked = 0
+    for board in positions():
+        closed, interior, components, total, probabilities = endgame.count(board)
+        expected_total, mines = brute_force_counts(board)
+        assert total == expected_total
+        assert sorted(closed) == sorted(mines)
+        for cell, count in mines.items():
+            assert probabilities[cell] == Fraction(count, expected_total)
+        checked += 1
+    assert checked > 20
+
+
+def test_solve_only_makes_certain_moves():
+    copy = Board()
+    for board in positions():
+        total, mines = brute_force_counts(board)
+        certain = [cell for cell, count in mines.items() if count in (0, total)]
+        copy.configure(board.width, board.height, board.settings)
+        copy.restore_state(board.save_state())
+
+        changed = EndgameSolver(time_budget=10.0).solve(copy, guess=False)
+        assert changed == bool(certain)
+        assert copy.state != BoardState.Lost
+        # Opening cells may flag and open more cells that the new numbers
+        # make certain, those moves are checked against the mines
+        for cell, count in mines.items():
+            if count == total:
+                assert copy.cell_state[cell] == CellState.Flagged
+            elif count == 0:
+                assert copy.cell_state[cell] == CellState.Opened
+            if copy.cell_state[cell] == CellState.Flagged:
+                assert copy.mine[cell]
@@ -0,0 +1,73 @@
+import board as board_module
+from board import Board, BoardGenerationSettings, BoardState
+
+import pytest
+
+
+def reference_first_order(board: Board) -> bool:
+    """
+        Applies the first-order rules cell by cell over all unsatisfied
+        opened cells until nothing changes, as the solver did before the
+        rules were evaluated on array views
+    """
+    changed = False
+    while board.state == BoardState.Undefined:
+        cells = [
+            cell
+            for cell in range(board.width * board.height)
+            if board.cell_state[cell] == board_module.CELL_OPENED
+            and not board.satisfied[cell]
+        ]
+        if not board.solve_first_order_cells(cells):
+            break
+        changed = True
+    return changed
+
+
+def positions(width, height, mines, seed):
+    """
+        Plays a game and yields the state before every solving step
+    """
+    board = Board()
+    start_position = board.configure(
+        width, height, BoardGenerationSettings(mines, seed, None, True)
+    )
+    board.open_at(start_position[0], start_position[1])
+    while board.state == BoardState.Undefined:
+        yield board.save_state()
+        board.solve_step()
+
+
+@pytest.mark.parametrize(
+    "cells, sources",
+    [
+        (board_module.SCALAR_FIRST_ORDER_CELLS, board_module.SCALAR_FIRST_ORDER_SOURCES),
+        (-1, board_module.SCALAR_FIRST_ORDER_SOURCES),
+        (-1, -1),
+    ],
+    ids=["default", "vector", "masks"],
+)
+@pytest.mark.parametrize(
+    "width, height, mines", [(9, 9, 10), (16, 16, 40), (30, 16, 99), (40, 40, 300)]
+)
+def test_first_order_matches_cell_by_cell_rules(
+    monkeypatch, cells, sources, width, height, mines
+):
+    monkeypatch.setattr(board_module, "SCALAR_FIRST_ORDER_CELLS", cells)
+    monkeypatch.setattr(board_module, "SCALAR_FIRST_ORDER_SOURCES", sources)
+    expected, actual = Board(), Board()
+    for seed in range(4):
+        for snapshot in positions(width, height, mines, seed):
+            for board in (expected, actual):
+                board.configure(width, height, BoardGenerationSettings(mines, seed))
+                board.restore_state(snapshot)
+            assert actual.solve_first_order() == reference_first_order(expected)
+            assert actual.state == expected.state
+            assert actual.opened_cells == expected.opened_cells
+            # Whether the remaining mines are flagged before the win is
+            # noticed depends on the order the cells are visited in
+            if actual.state == BoardState.Won:
+                continue
+            assert actual.cell_state == expected.cell_state
+            assert actual.satisfied == expected.satisfied
+            assert actual.flagged_cells == expected.flagged_cells
@@ -0,0 +1,46 @@
+from board import Board, BoardGenerationSettings, BoardSolver
+
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+
+def imported_modules(code):
+    output = subprocess.run(
+        [sys.executable, "-c", code + "; import sys; print(' '.join(sys.modules))"],
+        cwd=SRC,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return set(output.split())
+
+
+def test_board_imports_no_backend():
+    modules = imported_modules("import board")
+    assert "numpy" not in modules
+    assert "scipy" not in modules
+
+
+def test_numpy_backend_does_not_import_scipy():
+    modules = imported_modules(
+        "import board; board.Board().configure_and_solve("
+        "16, 16, board.BoardGenerationSettings(40, 1, None, True), "
+        "board.BoardSolver.NumpyLinalgLstsq)"
+    )
+    assert "numpy" in modules
+    assert "scipy" not in modules
+
+
+def test_numpy_backend_plays_like_scipy_lstsq():
+    for seed in range(10):
+        states = []
+        for solver in (BoardSolver.ScipyLinalgLstsq, BoardSolver.NumpyLinalgLstsq):
+            board = Board()
+            board.configure_and_solve(
+                16, 16, BoardGenerationSettings(40, seed, None, True), solver
+            )
+            states.append((board.state, board.opened_cells))
+        assert states[0] == states[1]
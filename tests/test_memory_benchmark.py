@@ -0,0 +1,54 @@
+from board import BoardSolver
+from memory_benchmark import (
+    board_size,
+    fit_slope,
+    measure_board,
+    measure_growth,
+    measure_results,
+)
+
+import tracemalloc
+
+import pytest
+
+
+@pytest.fixture
+def traced():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def test_fit_slope():
+    assert fit_slope([(x, 3 * x + 5) for x in range(10)]) == pytest.approx(3)
+    assert fit_slope([(1, 5)]) == 0.0
+    assert fit_slope([(1, 5), (1, 7)]) == 0.0
+
+
+def test_board_size():
+    assert board_size("expert") == (30, 16, 99)
+    assert board_size("50x40x300") == (50, 40, 300)
+    with pytest.raises(ValueError):
+        board_size("50x40")
+
+
+def test_board_memory_is_ordered(traced):
+    measurement = measure_board(16, 16, 40, BoardSolver.ScipyLinalgLstsq, 5, 1)
+    # Six state arrays of one byte per cell
+    assert measurement["allocated"] >= 6 * 16 * 16
+    assert measurement["allocated"] <= measurement["retained"] <= measurement["peak"]
+    assert measurement["solve_complex_calls"] > 0
+    assert measurement["solve_complex_max_peak"] >= measurement["solve_complex_mean_peak"]
+
+
+def test_aggregator_memory_does_not_grow_per_board(traced):
+    measurement = measure_results("easy", BoardSolver.ScipyLinalgLstsq, 1)
+    assert measurement["board_result"] > 0
+    assert measurement["aggregator_per_board"] < 1
+
+
+def test_growth_is_sampled_at_checkpoints(traced, capfd):
+    growth = measure_growth("easy", BoardSolver.ScipyLinalgLstsq, 40, 8, 1)
+    assert [index for index, current in growth["samples"]] == list(range(5, 45, 5))
+    assert len(growth["top_growth"]) <= 5
+    assert "Growth over the second half" in capfd.readouterr().out
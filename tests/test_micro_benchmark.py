@@ -0,0 +1,33 @@
+from micro_benchmark import (
+    THRESHOLDS_PATH,
+    collect_benchmarks,
+    load_thresholds,
+    run_micro_benchmarks,
+)
+
+import json
+
+
+def test_every_benchmark_has_a_stored_threshold():
+    names = [name for name, function in collect_benchmarks()]
+    assert len(names) == len(set(names))
+    assert set(names) == set(load_thresholds(THRESHOLDS_PATH))
+
+
+def test_benchmark_slower_than_threshold_fails(tmp_path):
+    path = tmp_path / "thresholds.json"
+    assert run_micro_benchmarks("Board.reset_cells", 0.5, 1, True, str(path))
+    ratio = load_thresholds(str(path))["Board.reset_cells"]
+    assert ratio > 0
+
+    path.write_text(json.dumps({"ratios": {"Board.reset_cells": ratio * 1000}}))
+    assert run_micro_benchmarks("Board.reset_cells", 0.5, 1, False, str(path))
+    path.write_text(json.dumps({"ratios": {"Board.reset_cells": ratio / 1000}}))
+    assert not run_micro_benchmarks("Board.reset_cells", 0.5, 1, False, str(path))
+
+
+def test_thresholds_without_ratios_are_empty(tmp_path):
+    path = tmp_path / "thresholds.json"
+    path.write_text(json.dumps({"Board.reset_cells": 1e-6}))
+    assert load_thresholds(str(path)) == {}
+    assert load_thresholds(str(tmp_path / "missing.json")) == {}
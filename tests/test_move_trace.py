@@ -0,0 +1,66 @@
+from board import Board, BoardGenerationSettings, BoardState, MoveTrace, decode_moves
+from move_trace import TraceDumper, read_trace, replay, write_trace
+
+import os
+
+
+def traced_game(seed, capacity=4096):
+    board = Board()
+    board.trace = MoveTrace(capacity)
+    board.configure_and_solve(16, 16, BoardGenerationSettings(40, seed, None, True))
+    return board
+
+
+def test_ring_buffer_keeps_the_newest_moves():
+    trace = MoveTrace(4)
+    for x in range(10):
+        trace.record(0, 0, x, 0, 0.0)
+    assert trace.dropped() == 6
+    assert [move.x for move in decode_moves(trace.to_bytes())] == [6, 7, 8, 9]
+
+
+def test_replay_reproduces_the_traced_game(tmp_path):
+    for seed in range(4):
+        board = traced_game(seed)
+        path = str(tmp_path / "{0}.mstrace".format(seed))
+        write_trace(path, board, 0.5)
+
+        trace_file = read_trace(path)
+        assert trace_file.mine == bytes(board.mine)
+        assert trace_file.state == board.state
+        assert trace_file.elapsed == 0.5
+        assert trace_file.dropped == 0
+        assert trace_file.moves == board.trace.moves()
+
+        replayed = replay(trace_file)
+        assert replayed.state == board.state
+        assert replayed.opened_cells == board.opened_cells
+
+
+def test_replay_recovers_dropped_moves(tmp_path):
+    board = traced_game(1, capacity=16)
+    path = str(tmp_path / "dropped.mstrace")
+    write_trace(path, board, 0.5)
+
+    trace_file = read_trace(path)
+    assert trace_file.dropped > 0
+    assert len(trace_file.moves) == 16
+    replayed = replay(trace_file)
+    assert replayed.state == board.state
+    assert replayed.opened_cells == board.opened_cells
+
+
+def test_dumper_writes_only_lost_and_slow_boards(tmp_path):
+    dumper = TraceDumper(str(tmp_path), latency_threshold=1.0)
+    states = []
+    for seed in range(12):
+        board = Board()
+        dumper.attach(board)
+        board.configure_and_solve(9, 9, BoardGenerationSettings(10, seed, None, True))
+        path = dumper.finish(board, 0.0 if seed else 2.0)
+        assert board.trace is None
+        assert (path is not None) == (board.state == BoardState.Lost or seed == 0)
+        states.append(board.state)
+
+    assert BoardState.Lost in states
+    assert len(os.listdir(str(tmp_path))) == dumper.dumped
@@ -0,0 +1,51 @@
+from board import (
+    Board,
+    BoardGenerationSettings,
+    build_neighbor_table,
+    get_neighbor_array,
+)
+
+import gc
+import weakref
+
+import pytest
+
+
+@pytest.mark.parametrize("width, height", [(1, 1), (1, 4), (5, 1), (4, 3)])
+def test_neighbor_table_lists_adjacent_cells(width, height):
+    table = build_neighbor_table(width, height)
+    for y in range(height):
+        for x in range(width):
+            expected = {
+                (y + dy) * width + x + dx
+                for dy in (-1, 0, 1)
+                for dx in (-1, 0, 1)
+                if (dx or dy) and 0 <= x + dx < width and 0 <= y + dy < height
+            }
+            neighbors = table[y * width + x]
+            assert len(neighbors) == len(expected)
+            assert set(neighbors) == expected
+
+
+def test_neighbor_array_pads_the_neighbor_table():
+    table = build_neighbor_table(4, 3)
+    array = get_neighbor_array(4, 3)
+    assert array.shape == (12, 8)
+    for cell, neighbors in enumerate(table):
+        row = array[cell].tolist()
+        assert row == list(neighbors) + [-1] * (8 - len(neighbors))
+
+
+def test_solved_board_is_freed_without_the_cyclic_collector():
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        board = Board()
+        board.configure_and_solve(16, 16, BoardGenerationSettings(40, 3))
+        board.probability_map()
+        reference = weakref.ref(board)
+        del board
+        assert reference() is None
+    finally:
+        if gc_enabled:
+            gc.enable()
@@ -0,0 +1,57 @@
+from board import Board, BoardGenerationSettings, BoardState, CellState
+from endgame import EndgameSolver
+from no_guess import NoGuessGenerator, generate_boards
+
+
+def solved_by_exact_deduction(width, height, mines, start_position, board_mines):
+    """
+        Plays the board by opening and flagging only cells whose exact mine
+        probability is 0 or 1. Returns True if that wins the board
+    """
+    board = Board()
+    board.configure_mines(
+        width,
+        height,
+        board_mines,
+        BoardGenerationSettings(mines, None, start_position, True),
+    )
+    board.open_at(start_position[0], start_position[1])
+    exact = EndgameSolver()
+    while board.state == BoardState.Undefined:
+        if board.opened_cells == width * height - mines:
+            return True
+        probabilities = exact.probabilities(board, 10.0)
+        assert probabilities is not None
+        certain = [
+            cell
+            for cell, probability in probabilities.items()
+            if probability == 0 or probability == 1
+        ]
+        if not certain:
+            return False
+        for cell in certain:
+            # Opening a cell may have opened the cells around it already
+            if board.cell_state[cell] != CellState.Closed:
+                continue
+            if probabilities[cell] == 0:
+                board.open_cell(cell)
+            else:
+                board.flag_cell(cell)
+    return board.state == BoardState.Won
+
+
+def test_generated_boards_need_no_guess():
+    generator = NoGuessGenerator(9, 9, 10, random_seed=1)
+    for i in range(5):
+        seed, start_position, board_mines = generator.generate()
+        assert sum(board_mines) == 10
+        assert not board_mines[start_position[1] * 9 + start_position[0]]
+        assert solved_by_exact_deduction(9, 9, 10, start_position, board_mines)
+    assert generator.boards == 5
+    assert generator.attempts >= 5
+
+
+def test_generated_boards_depend_only_on_the_seed():
+    first = list(generate_boards(NoGuessGenerator(9, 9, 10), 3, random_seed=2))
+    second = list(generate_boards(NoGuessGenerator(9, 9, 10), 3, random_seed=2))
+    assert first == second
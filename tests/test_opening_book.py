@@ -0,0 +1,50 @@
+from board import Board, BoardSolver
+from opening_book import OpeningBook, build_book, rank_start_positions
+
+import random
+
+import pytest
+
+
+def test_book_round_trip(tmp_path):
+    path = tmp_path / "book.bin"
+    build_book(path, [(5, 4, 3)], BoardSolver.ScipyLinalgLstsq, 4, random_seed=1)
+    with OpeningBook(path) as book:
+        # The rankings are views of the mapping and must not outlive the book
+        games, win_rates = book.rankings[(5, 4, 3)]
+        win_rates = win_rates.copy()
+        x, y = book.start_position(5, 4, 3)
+        assert book.start_position(9, 9, 10) is None
+    assert games == 4
+    assert win_rates.shape == (4, 5)
+    assert win_rates[y, x] == win_rates.max()
+
+
+def test_invalid_book_closes_its_file(tmp_path, monkeypatch):
+    path = tmp_path / "book.bin"
+    path.write_bytes(b"\0" * 64)
+    opened = []
+    real_open = open
+
+    def recording_open(*args, **kwargs):
+        opened.append(real_open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr("builtins.open", recording_open)
+    with pytest.raises(ValueError):
+        OpeningBook(path)
+    assert opened and all(f.closed for f in opened)
+
+
+def test_start_positions_are_ranked_on_the_same_seeds(monkeypatch):
+    seeds = {}
+    configure_and_solve = Board.configure_and_solve
+
+    def recording_configure_and_solve(self, width, height, settings, solver):
+        seeds.setdefault(settings.start_position, []).append(settings.seed)
+        return configure_and_solve(self, width, height, settings, solver)
+
+    monkeypatch.setattr(Board, "configure_and_solve", recording_configure_and_solve)
+    rank_start_positions(5, 5, 3, 3, rng=random.Random(2))
+    assert len(seeds) == 9
+    assert len({tuple(position_seeds) for position_seeds in seeds.values()}) == 1
@@ -0,0 +1,43 @@
+from board import (
+    Board,
+    BoardGenerationSettings,
+    BoardSolver,
+    PORTFOLIO_FAST_SOLVERS,
+    PORTFOLIO_GUESS_SOLVER,
+    RecordingBoard,
+    clean_solution,
+    has_certain_value,
+)
+
+import numpy as np
+
+
+def recorded_systems():
+    systems = []
+    for seed in range(3):
+        board = RecordingBoard()
+        board.configure_and_solve(16, 16, BoardGenerationSettings(40, seed, None, True))
+        systems.extend(board.systems)
+    return systems
+
+
+def test_portfolio_returns_a_certain_fast_result_or_the_guess_result():
+    board = Board()
+    threshold = board.config.snap_threshold
+    systems = recorded_systems()
+    assert systems
+    for A_matrix, B_vector in systems:
+        X_vector = board.solve_system(A_matrix, B_vector, BoardSolver.Portfolio)
+        fast = [
+            clean_solution(board.solve_system(A_matrix, B_vector, solver), threshold)
+            for solver in PORTFOLIO_FAST_SOLVERS
+        ]
+        # The slow backend may win the race when it runs next to the fast ones
+        accepted = [result for result in fast if has_certain_value(result)]
+        accepted.append(
+            clean_solution(
+                board.solve_system(A_matrix, B_vector, PORTFOLIO_GUESS_SOLVER),
+                threshold,
+            )
+        )
+        assert any(np.allclose(X_vector, result) for result in accepted)
@@ -0,0 +1,57 @@
+from board import Board, BoardGenerationSettings, CellState
+from positions import read_positions, solve_position
+
+import itertools
+
+
+def brute_force_certain(board: Board):
+    """
+        Returns the closed cells that are safe and mines in every mine
+        assignment that agrees with the opened cells and the mine count
+    """
+    size = board.width * board.height
+    closed = [cell for cell in range(size) if board.cell_state[cell] == CellState.Closed]
+    remaining = board.generated_mines - board.flagged_cells
+    safe, mines = set(closed), set(closed)
+    for assignment in itertools.combinations(closed, remaining):
+        chosen = set(assignment)
+        if all(
+            sum(
+                neighbor in chosen or board.cell_state[neighbor] == CellState.Flagged
+                for neighbor in board.neighbors[cell]
+            )
+            == board.neighbor_mine_count[cell]
+            for cell in range(size)
+            if board.cell_state[cell] == CellState.Opened
+        ):
+            safe -= chosen
+            mines &= chosen
+    return safe, mines
+
+
+def sample_position(seed):
+    board = Board()
+    start_position = board.configure(
+        5, 5, BoardGenerationSettings(4, seed, None, False)
+    )
+    board.open_at(start_position[0], start_position[1])
+    return board.str_revealed()
+
+
+def test_certain_moves_match_brute_force():
+    board = Board()
+    for seed in range(30):
+        rows = sample_position(seed).split("\n")
+        result = solve_position(board, str(seed), 4, rows)
+        assert result["exact"]
+        safe, mines = brute_force_certain(board)
+        assert {x + y * 5 for x, y in result["safe"]} == safe
+        assert {x + y * 5 for x, y in result["mines"]} == mines
+
+
+def test_read_positions_numbers_positions_without_id():
+    lines = ["@ 1 first\n", "1x\n", "\n", "##\n", "@ 2\n", "##\n"]
+    assert list(read_positions(lines)) == [
+        ("first", "1", ["1x", "##"]),
+        ("1", "2", ["##"]),
+    ]
@@ -0,0 +1,84 @@
+from board import BoardSolver
+from benchmark import get_board_setup, run_benchmark, seed_sequence
+from profiler import BoardProfiler, parse_board_range
+
+import os
+import pstats
+import subprocess
+import sys
+
+import pytest
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "benchmark.py")
+
+
+def profile_boards(boards, repeats=4):
+    profiler = BoardProfiler(boards)
+    run_benchmark(
+        get_board_setup("expert"),
+        repeats,
+        BoardSolver.ScipyLinalgLstsq,
+        seed_sequence(1, repeats),
+        profiler=profiler,
+        verbose=False,
+    )
+    return profiler
+
+
+def test_parse_board_range():
+    assert parse_board_range("0:") == range(0, sys.maxsize)
+    assert parse_board_range("2:10:3") == range(2, 10, 3)
+    assert parse_board_range(":5") == range(0, 5)
+    with pytest.raises(ValueError):
+        parse_board_range("1:2:3:4")
+
+
+def test_only_the_given_boards_are_profiled():
+    assert profile_boards(range(1, 3)).profiled_boards == 2
+    assert profile_boards(range(10, 20)).stats == {}
+
+
+def test_collapsed_stacks_add_up_to_the_profiled_time():
+    profiler = profile_boards(range(0, 2))
+    phases = {name: time for name, calls, time in profiler.phase_times()}
+    assert 0 < phases["Linear systems"] <= phases["Second order"]
+
+    roots = [
+        function_stats[3]
+        for function, function_stats in profiler.stats.items()
+        if not function_stats[4] and "_lsprof" not in function[2]
+    ]
+    stacks = profiler.collapsed_stacks()
+    assert sum(stacks.values()) == pytest.approx(sum(roots), rel=0.01)
+
+
+def test_written_profile_is_readable(tmp_path):
+    profiler = profile_boards(range(0, 1))
+    paths = profiler.write(str(tmp_path / "run"), top=5)
+    assert pstats.Stats(paths[0]).total_calls > 0
+    with open(paths[1]) as f:
+        assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in f)
+    with open(paths[2]) as f:
+        assert "Linear systems" in f.read()
+
+
+def test_profile_prefix_directory_is_created(tmp_path):
+    prefix = str(tmp_path / "profiles" / "run")
+    process = subprocess.run(
+        [
+            sys.executable,
+            BENCHMARK,
+            "easy",
+            "--repeats",
+            "2",
+            "--random-seed",
+            "1",
+            "--profile",
+            prefix,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert process.returncode == 0, process.stderr
+    assert os.path.exists(prefix + "_easy_ScipyLinalgLstsq.pstats")
@@ -0,0 +1,50 @@
+from board import BoardResult, BoardSolver, BoardState
+from benchmark import summarize
+from results import ResultAggregator, wilson_interval, z_score
+
+import pytest
+
+
+def test_z_score_of_95_percent():
+    assert z_score(0.95) == pytest.approx(1.959964, abs=1e-6)
+
+
+def test_wilson_interval_of_known_proportion():
+    low, high = wilson_interval(8, 10)
+    assert low == pytest.approx(0.4902, abs=1e-4)
+    assert high == pytest.approx(0.9433, abs=1e-4)
+
+
+def test_wilson_interval_stays_within_zero_and_one():
+    assert wilson_interval(0, 10)[0] == pytest.approx(0.0)
+    assert wilson_interval(10, 10)[1] == 1.0
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+
+def test_summary_reports_intervals_around_the_estimates():
+    aggregator = ResultAggregator()
+    for seed in range(100):
+        state = BoardState.Won if seed % 4 else BoardState.Lost
+        result = BoardResult(
+            9, 9, 10, state, seed, BoardSolver.ScipyLinalgLstsq, True, 0, (0, 0), None, None
+        )
+        aggregator.add(result, (1 + seed % 10) / 1000)
+
+    summary = summarize("easy", BoardSolver.ScipyLinalgLstsq, aggregator, 1.0)
+    assert summary["boards"] == 100
+    assert summary["win_rate"] == 0.75
+    assert summary["win_rate_low"] < 0.75 < summary["win_rate_high"]
+    assert summary["mean_ms"] == pytest.approx(5.5)
+    assert summary["mean_ms_low"] < 5.5 < summary["mean_ms_high"]
+    assert summary["p50_ms"] <= summary["p90_ms"] <= summary["p99_ms"]
+    assert summary["p99_ms"] <= summary["max_ms"] == 10.0
+
+
+def test_mean_interval_is_clamped_at_zero():
+    aggregator = ResultAggregator()
+    result = BoardResult(
+        9, 9, 10, BoardState.Won, 0, BoardSolver.ScipyLinalgLstsq, True, 0, (0, 0), None, None
+    )
+    aggregator.add(result, 0.0)
+    aggregator.add(result, 1.0)
+    assert aggregator.mean_time_interval()[0] == 0.0
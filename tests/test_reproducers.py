@@ -0,0 +1,52 @@
+from board import Board, BoardGenerationSettings, BoardResult, BoardSolver, BoardState
+from benchmark import debug, get_board_setup, run_benchmark, seed_sequence
+from results import SlowestBoards, load_reproducers
+
+
+def test_slowest_boards_keeps_the_slowest_results():
+    slowest = SlowestBoards(3)
+    for seed, elapsed in enumerate([5, 1, 9, 3, 7, 7, 2]):
+        result = BoardResult(
+            9, 9, 10, BoardState.Won, seed, None, True, 0, (0, 0), None, None
+        )
+        slowest.add(result, elapsed)
+    assert [(elapsed, result.seed) for elapsed, result in slowest.boards()] == [
+        (9, 2),
+        (7, 5),
+        (7, 4),
+    ]
+
+
+def test_reproducers_solve_to_their_recorded_state(tmp_path, capfd):
+    path = str(tmp_path / "slowest.json")
+    run_benchmark(
+        get_board_setup("medium"),
+        20,
+        BoardSolver.ScipyLinalgLstsq,
+        seed_sequence(1, 20),
+        slowest_count=3,
+        reproducer_path=path,
+        verbose=False,
+    )
+
+    reproducers = load_reproducers(path)
+    assert len(reproducers) == 3
+    times = [reproducer["time"] for reproducer in reproducers]
+    assert times == sorted(times, reverse=True)
+    for reproducer in reproducers:
+        board = Board()
+        board.configure_and_solve(
+            reproducer["width"],
+            reproducer["height"],
+            BoardGenerationSettings(
+                reproducer["mines"],
+                reproducer["seed"],
+                None,
+                reproducer["force_start_area"],
+            ),
+            BoardSolver[reproducer["solver"]],
+        )
+        assert board.state.name == reproducer["state"]
+
+    debug(reproducer_path=path, index=1)
+    assert "Recorded " + reproducers[1]["state"] in capfd.readouterr().out
@@ -0,0 +1,117 @@
+from board import BoardResult, BoardSolver, BoardState
+from benchmark import get_board_setup, run_benchmark, seed_sequence
+from result_cache import ResultCache, result_key, split_backends
+import result_cache
+
+SOURCE = """
+class Board:
+    def solve_system(self, A_matrix, B_vector, solver=None):
+        shared = 1
+        if solver == BoardSolver.First:
+            X_vector = first(A_matrix)
+        elif solver == BoardSolver.Second:
+            # Comment of the second backend
+            X_vector = second(A_matrix)
+        else:
+            raise ValueError("no solver configured")
+        return X_vector
+"""
+
+
+def make_result(seed, solver=BoardSolver.ScipyLinalgLstsq):
+    return BoardResult(
+        9, 9, 10, BoardState.Lost, seed, solver, True, 3, (4, 5), None, None
+    )
+
+
+def test_split_backends_separates_each_branch():
+    shared, branches = split_backends(SOURCE)
+    assert set(branches) == {"First", "Second"}
+    assert "first(A_matrix)" in branches["First"]
+    assert "Comment of the second backend" in branches["Second"]
+    assert "first(" not in shared and "second(" not in shared
+    assert "shared = 1" in shared and "return X_vector" in shared
+
+
+def test_editing_a_backend_invalidates_only_its_boards(monkeypatch):
+    source = result_cache.read_source("board.py")
+    keys = {
+        solver: result_key(9, 9, 10, True, 1, solver)
+        for solver in (BoardSolver.ScipyLinalgLstsq, BoardSolver.NumpyLinalgLstsq)
+    }
+
+    edited = source.replace(
+        "numpy.linalg.lstsq(", "numpy.linalg.lstsq(  # edited\n", 1
+    )
+    assert edited != source
+    monkeypatch.setattr(
+        result_cache,
+        "read_source",
+        lambda name: edited if name == "board.py" else source,
+    )
+    monkeypatch.setattr(result_cache, "solver_fingerprints", {})
+    assert result_key(9, 9, 10, True, 1, BoardSolver.ScipyLinalgLstsq) == keys[
+        BoardSolver.ScipyLinalgLstsq
+    ]
+    assert result_key(9, 9, 10, True, 1, BoardSolver.NumpyLinalgLstsq) != keys[
+        BoardSolver.NumpyLinalgLstsq
+    ]
+
+
+def test_key_depends_on_every_board_parameter():
+    keys = {
+        result_key(9, 9, 10, True, 1, BoardSolver.ScipyLinalgLstsq),
+        result_key(9, 8, 10, True, 1, BoardSolver.ScipyLinalgLstsq),
+        result_key(9, 9, 11, True, 1, BoardSolver.ScipyLinalgLstsq),
+        result_key(9, 9, 10, False, 1, BoardSolver.ScipyLinalgLstsq),
+        result_key(9, 9, 10, True, 2, BoardSolver.ScipyLinalgLstsq),
+        result_key(9, 9, 10, True, 1, BoardSolver.NumpyLinalgLstsq),
+    }
+    assert len(keys) == 6
+    assert result_key(9, 9, 10, True, 1, BoardSolver.Portfolio) is None
+    assert result_key(9, 9, 10, True, None, BoardSolver.ScipyLinalgLstsq) is None
+
+
+def test_cache_returns_stored_results_and_evicts_the_least_recent(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResultCache(path, max_entries=2)
+    for seed in range(2):
+        cache.put(make_result(seed), 0.25)
+    cache.close()
+
+    cache = ResultCache(path, max_entries=2)
+    result, elapsed = cache.get(9, 9, 10, True, 1, BoardSolver.ScipyLinalgLstsq)
+    assert elapsed == 0.25
+    assert result.state == BoardState.Lost
+    assert result.second_order_calls == 3
+    assert result.largest_system == (4, 5)
+    assert cache.get(9, 9, 10, True, 1, BoardSolver.NumpyLinalgLstsq) is None
+    cache.put(make_result(2), 0.5)
+    cache.close()
+
+    # Seed 0 was not used in the last run
+    cache = ResultCache(path, max_entries=2)
+    assert cache.entries() == 2
+    assert cache.get(9, 9, 10, True, 0, BoardSolver.ScipyLinalgLstsq) is None
+    assert cache.get(9, 9, 10, True, 2, BoardSolver.ScipyLinalgLstsq) is not None
+    cache.close()
+
+
+def test_cached_run_reports_the_solved_results(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+
+    def run():
+        return run_benchmark(
+            get_board_setup("easy"),
+            10,
+            BoardSolver.ScipyLinalgLstsq,
+            seed_sequence(1, 10),
+            cache_path=path,
+            verbose=False,
+        )
+
+    solved = run()
+    cached = run()
+    assert cached.boards == solved.boards
+    assert cached.wins == solved.wins
+    assert cached.time_total == solved.time_total
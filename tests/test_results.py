@@ -0,0 +1,67 @@
+from board import BoardResult, BoardSolver, BoardState
+from results import LatencyHistogram, ResultAggregator, ResultSink
+
+import random
+import statistics
+
+
+def make_result(seed, state=BoardState.Won):
+    return BoardResult(
+        9, 9, 10, state, seed, BoardSolver.ScipyLinalgLstsq, True, 0, (0, 0), None, None
+    )
+
+
+def test_aggregator_matches_the_statistics_of_all_results():
+    rng = random.Random(1)
+    times = [rng.lognormvariate(-7, 1) for _ in range(1000)]
+    states = [rng.choice([BoardState.Won, BoardState.Lost]) for _ in times]
+    aggregator = ResultAggregator()
+    for seed, (elapsed, state) in enumerate(zip(times, states)):
+        aggregator.add(make_result(seed, state), elapsed)
+
+    assert aggregator.boards == len(times)
+    assert aggregator.wins == states.count(BoardState.Won)
+    assert aggregator.losses == states.count(BoardState.Lost)
+    assert abs(aggregator.mean_time() - statistics.mean(times)) < 1e-12
+    assert abs(aggregator.time_stdev() - statistics.stdev(times)) < 1e-9
+    assert aggregator.time_max == max(times)
+
+
+def test_histogram_percentiles_are_within_one_bucket():
+    rng = random.Random(2)
+    times = sorted(rng.lognormvariate(-7, 1) for _ in range(1000))
+    histogram = LatencyHistogram()
+    for elapsed in times:
+        histogram.add(elapsed)
+
+    # Buckets are 10 ** (1 / 50), about 4.7%, wide
+    bucket_ratio = 10 ** (1 / histogram.buckets_per_decade)
+    for q in (50, 90, 99):
+        exact = times[int(q / 100 * len(times)) - 1]
+        assert exact / bucket_ratio <= histogram.percentile(q) <= exact * bucket_ratio
+    assert histogram.percentile(100) == times[-1]
+
+
+def test_merged_histograms_count_all_values():
+    first, second, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i in range(1, 200):
+        (first if i % 2 else second).add(i * 1e-4)
+        both.add(i * 1e-4)
+    first.merge(second)
+    assert first.counts == both.counts
+    assert first.value_min == both.value_min
+    assert first.value_max == both.value_max
+
+
+def test_sink_writes_every_result(tmp_path):
+    path = tmp_path / "results.csv"
+    aggregator = ResultAggregator(ResultSink(str(path), chunk_size=3))
+    for seed in range(10):
+        aggregator.add(make_result(seed), seed / 1000)
+    aggregator.sink.close()
+
+    lines = path.read_text().splitlines()
+    assert lines[0] == "seed,width,height,mines,state,time"
+    assert lines[1:] == [
+        "{0},9,9,10,Won,{1!r}".format(seed, seed / 1000) for seed in range(10)
+    ]
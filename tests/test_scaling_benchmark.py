@@ -0,0 +1,69 @@
+from board import BoardSolver
+from scaling_benchmark import fit_power_law, mine_count, parse_size, run_sweep
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCALING_BENCHMARK = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "src", "scaling_benchmark.py"
+)
+SOLVERS = [BoardSolver.ScipyLinalgLstsq, BoardSolver.NumpyLinalgLstsq]
+
+
+def test_parse_size_and_mine_count():
+    assert parse_size("30x16") == (30, 16)
+    with pytest.raises(ValueError):
+        parse_size("30x16x99")
+    assert mine_count(30, 16, 0.206) == 99
+    # The start area stays free of mines
+    assert mine_count(3, 4, 0.9) == 3
+    assert mine_count(9, 9, 0.0) == 1
+
+
+def test_fit_power_law_recovers_exponent():
+    c, k, r_squared = fit_power_law([(x, 2.5 * x ** 1.5) for x in (10, 100, 1000)])
+    assert c == pytest.approx(2.5)
+    assert k == pytest.approx(1.5)
+    assert r_squared == pytest.approx(1.0)
+    assert fit_power_law([(10, 1.0), (10, 2.0), (0, 3.0)]) is None
+
+
+def test_solvers_share_the_seeds_of_a_point():
+    points, boards = run_sweep(
+        [(8, 8), (12, 12)], [0.12], SOLVERS, 4, random_seed=1, verbose=False
+    )
+    assert [(point["cells"], point["solver"]) for point in points] == [
+        (64, "ScipyLinalgLstsq"),
+        (64, "NumpyLinalgLstsq"),
+        (144, "ScipyLinalgLstsq"),
+        (144, "NumpyLinalgLstsq"),
+    ]
+    assert all(point["boards"] == 4 for point in points)
+    seeds = {}
+    for board in boards:
+        seeds.setdefault((board["width"], board["solver"]), []).append(board["seed"])
+    assert seeds[(8, "ScipyLinalgLstsq")] == seeds[(8, "NumpyLinalgLstsq")]
+    assert seeds[(12, "ScipyLinalgLstsq")] == seeds[(12, "NumpyLinalgLstsq")]
+
+
+def test_larger_sizes_are_skipped_after_a_slow_point():
+    points, boards = run_sweep(
+        [(8, 8), (12, 12)], [0.12], SOLVERS[:1], 2, max_mean_time=0.0, verbose=False
+    )
+    assert not points[0]["skipped"]
+    assert points[1]["skipped"] and points[1]["error"] is None
+    assert len(boards) == 2
+
+
+def test_repeats_must_be_positive():
+    process = subprocess.run(
+        [sys.executable, SCALING_BENCHMARK, "--repeats", "0"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert process.returncode == 2
+    assert "--repeats must be at least 1" in process.stderr
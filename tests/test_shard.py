@@ -0,0 +1,81 @@
+from board import BoardSolver
+from benchmark import get_board_setup, run_benchmark, seed_sequence
+from shard import merge_shards, parse_rows, run_shard, shard_range
+
+import pytest
+
+SOLVERS = [BoardSolver.ScipyLinalgLstsq]
+
+
+def run(path, shard, shard_count=2, repeats=10, random_seed=1):
+    run_shard(str(path), shard, shard_count, repeats, random_seed, ["easy"], SOLVERS)
+
+
+def board_rows(path):
+    with open(str(path)) as f:
+        return sorted(
+            (index, result.seed, result.state)
+            for setup, solver, index, result, elapsed in parse_rows(f)
+        )
+
+
+def test_shard_ranges_cover_every_board_once():
+    for repeats in (0, 1, 7, 100):
+        for shard_count in (1, 3, 8):
+            indices = [
+                index
+                for shard in range(shard_count)
+                for index in shard_range(repeats, shard, shard_count)
+            ]
+            assert indices == list(range(repeats))
+
+
+def test_merged_shards_match_a_single_run(tmp_path):
+    paths = [tmp_path / "0.csv", tmp_path / "1.csv"]
+    for shard, path in enumerate(paths):
+        run(path, shard)
+
+    aggregators = merge_shards([str(path) for path in paths])
+    merged = aggregators[("easy", "ScipyLinalgLstsq")]
+    single = run_benchmark(
+        get_board_setup("easy"), 10, SOLVERS[0], seed_sequence(1, 10), verbose=False
+    )
+    assert merged.boards == 10
+    assert merged.wins == single.wins
+    assert merged.losses == single.losses
+    assert [seed for index, seed, state in board_rows(paths[0])] == list(
+        seed_sequence(1, 10)
+    )[:5]
+
+
+def test_interrupted_shard_resumes_missing_boards(tmp_path):
+    path = tmp_path / "0.csv"
+    run(path, 0)
+    complete = board_rows(path)
+
+    # Drop the last board and leave half of the line before it
+    lines = path.read_text().splitlines(True)
+    path.write_text("".join(lines[:-2]) + lines[-2][:10])
+    run(path, 0)
+    assert board_rows(path) == complete
+
+
+def test_shard_of_another_sweep_is_rejected(tmp_path):
+    path = tmp_path / "0.csv"
+    run(path, 0)
+    with pytest.raises(ValueError):
+        run(path, 0, random_seed=2)
+
+    other = tmp_path / "1.csv"
+    run(other, 1, random_seed=2)
+    with pytest.raises(ValueError):
+        merge_shards([str(path), str(other)])
+
+
+def test_missing_shard_needs_allow_partial(tmp_path):
+    path = tmp_path / "0.csv"
+    run(path, 0)
+    with pytest.raises(ValueError):
+        merge_shards([str(path)])
+    aggregators = merge_shards([str(path)], allow_partial=True)
+    assert aggregators[("easy", "ScipyLinalgLstsq")].boards == 5
@@ -0,0 +1,66 @@
+from board import DEFAULT_SOLVER_CONFIG, BoardSolver
+from benchmark import get_board_setup, run_benchmark, seed_sequence
+from results import ResultAggregator
+from tune import pareto_front, parse_grid, run_sweep, summarize_sweep
+
+import pytest
+
+
+def test_parse_grid_builds_the_cartesian_product():
+    configs = parse_grid(["snap_threshold=0.001,0.01", "lsq_linear_method=trf,bvls"])
+    assert [(config.snap_threshold, config.lsq_linear_method) for config in configs] == [
+        (0.001, "trf"),
+        (0.001, "bvls"),
+        (0.01, "trf"),
+        (0.01, "bvls"),
+    ]
+    assert all(config.lsqr_atol == DEFAULT_SOLVER_CONFIG.lsqr_atol for config in configs)
+    assert parse_grid([]) == [DEFAULT_SOLVER_CONFIG]
+
+
+def test_parse_grid_rejects_unknown_fields_and_values():
+    with pytest.raises(ValueError):
+        parse_grid(["threshold=0.1"])
+    with pytest.raises(ValueError):
+        parse_grid(["snap_threshold=0.001,0.6"])
+    with pytest.raises(ValueError):
+        parse_grid(["lsq_linear_method=qr"])
+
+
+def test_pareto_front():
+    summaries = [
+        {"win_rate": 0.9, "mean_ms": 10.0},
+        {"win_rate": 0.8, "mean_ms": 5.0},
+        {"win_rate": 0.8, "mean_ms": 6.0},
+        {"win_rate": 0.9, "mean_ms": 10.0},
+        {"win_rate": 0.7, "mean_ms": 20.0},
+    ]
+    # Equal configurations do not beat each other
+    assert pareto_front(summaries) == [True, True, False, True, False]
+
+
+def test_failed_configurations_are_not_on_the_front():
+    configs = parse_grid(["snap_threshold=0.001,0.01"])
+    aggregators = [ResultAggregator(), ResultAggregator()]
+    summaries = summarize_sweep(configs, aggregators, [None, "ValueError: failed"])
+    assert [summary["pareto"] for summary in summaries] == [True, False]
+    assert summaries[1]["error"] == "ValueError: failed"
+
+
+def test_sweep_of_the_default_configuration_matches_a_benchmark_run():
+    seeds = list(seed_sequence(1, 30))
+    configs = parse_grid(["snap_threshold=0.0001,0.2"])
+    aggregators, errors = run_sweep(
+        "easy", BoardSolver.ScipyLinalgLstsq, configs, seeds, workers=2, warmup=1
+    )
+    assert errors == [None, None]
+    assert [aggregator.boards for aggregator in aggregators] == [30, 30]
+
+    single = run_benchmark(
+        get_board_setup("easy"),
+        30,
+        BoardSolver.ScipyLinalgLstsq,
+        iter(seeds),
+        verbose=False,
+    )
+    assert aggregators[0].wins == single.wins